@@ -0,0 +1,152 @@
+#!/usr/bin/env uv run
+
+import math
+from typing import Iterable, Literal, Self
+
+import cv2
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+import data_utils
+
+# size of plate in mm is 127.76 x 85.4
+PLATE_WIDTH = 127.76
+PLATE_HEIGHT = 85.4
+
+
+def tracked_points(data: Iterable[data_utils.ZantiksData]) -> pl.DataFrame:
+    # every tracked point from every run, without dropouts
+    return (
+        pl.concat([datum.data.select("ARENA", "X", "Y") for datum in data])
+        .drop_nulls()
+        .filter((pl.col("X") != 0.0) | (pl.col("Y") != 0.0))
+    )
+
+
+class ArenaOutlines:
+    def __init__(
+        self,
+        points: pl.DataFrame,
+        *,
+        scale: float = 4.0,
+        closing: float = 1.0,
+        min_count: int = 1,
+        method: Literal["grid"] | Literal["hull"] = "grid",
+    ):
+        # scale is grid cells per mm; closing is in mm and bridges the gaps
+        # between visited cells before the outline is traced
+        self.scale = scale
+        self.shape = (math.ceil(PLATE_HEIGHT * scale), math.ceil(PLATE_WIDTH * scale))
+        self.arena_ids: list[int] = points["ARENA"].unique().sort().to_list()
+        self.counts = self._occupancy(points)
+        occupied = self.counts >= min_count
+
+        if method == "grid":
+            self.polygons = self._trace(occupied, max(1, round(closing * scale)))
+        elif method == "hull":
+            self.polygons = self._hulls(occupied)
+        else:
+            raise ValueError(f"unknown outline method {method}")
+        self.masks = self._fill(self.polygons)
+
+    @classmethod
+    def from_data(cls, data: Iterable[data_utils.ZantiksData], **kwargs) -> Self:
+        return cls(
+            tracked_points(datum for datum in data if datum.info.is_xy), **kwargs
+        )
+
+    def bin_index(self, points: NDArray) -> tuple[NDArray, NDArray]:
+        rows = np.clip(
+            np.floor(points[:, 1] * self.scale).astype(int), 0, self.shape[0] - 1
+        )
+        cols = np.clip(
+            np.floor(points[:, 0] * self.scale).astype(int), 0, self.shape[1] - 1
+        )
+        return rows, cols
+
+    def _occupancy(self, points: pl.DataFrame) -> NDArray:
+        # (arena, row, column) visit counts for every arena in one bincount
+        arena_index = np.searchsorted(self.arena_ids, points["ARENA"].to_numpy())
+        rows, cols = self.bin_index(points.select("X", "Y").to_numpy())
+        flat = (arena_index * self.shape[0] + rows) * self.shape[1] + cols
+        return np.bincount(
+            flat, minlength=len(self.arena_ids) * self.shape[0] * self.shape[1]
+        ).reshape(len(self.arena_ids), *self.shape)
+
+    def _mosaic(self, grids: NDArray, pad: int) -> NDArray:
+        # the arenas stacked into one tall image, with enough padding between
+        # them that the morphology never joins two arenas, so opencv only runs once
+        padded = np.pad(grids, ((0, 0), (pad, pad), (pad, pad)))
+        return padded.reshape(-1, padded.shape[2])
+
+    def _trace(self, occupied: NDArray, radius: int) -> dict[int, NDArray]:
+        kernel = cv2.getStructuringElement(
+            cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1)
+        )
+        mosaic = cv2.morphologyEx(
+            self._mosaic(occupied.astype(np.uint8), radius), cv2.MORPH_CLOSE, kernel
+        )
+        contours, _ = cv2.findContours(
+            mosaic, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+
+        # the biggest outline in each arena is the arena, the rest are strays
+        tile_height = self.shape[0] + 2 * radius
+        best: dict[int, tuple[float, NDArray]] = {}
+        for contour in contours:
+            points = contour[:, 0, :]
+            tile = int(points[0, 1]) // tile_height
+            area = cv2.contourArea(contour)
+            if tile not in best or area > best[tile][0]:
+                offset = np.array((radius, tile * tile_height + radius))
+                best[tile] = (area, points - offset)
+
+        return {
+            self.arena_ids[tile]: self._to_mm(points)
+            for tile, (_, points) in sorted(best.items())
+        }
+
+    def _hulls(self, occupied: NDArray) -> dict[int, NDArray]:
+        # the hull of the visited cells, which is already far fewer points than
+        # the raw tracking
+        polygons = {}
+        for tile, arena in enumerate(self.arena_ids):
+            cells = np.flip(np.argwhere(occupied[tile]), axis=1).astype(np.int32)
+            if cells.shape[0] >= 3:
+                polygons[arena] = self._to_mm(cv2.convexHull(cells)[:, 0, :])
+        return polygons
+
+    def _to_mm(self, cells: NDArray) -> NDArray:
+        # (column, row) cells to (x, y) in mm at the cell centers
+        return (cells.astype(float) + 0.5) / self.scale
+
+    def _fill(self, polygons: dict[int, NDArray]) -> NDArray:
+        masks = np.zeros((len(self.arena_ids), *self.shape), dtype=np.uint8)
+        for tile, arena in enumerate(self.arena_ids):
+            if arena in polygons:
+                cells = np.floor(polygons[arena] * self.scale).astype(np.int32)
+                cv2.fillPoly(masks[tile], [cells], 1)
+        return masks.astype(bool)
+
+    def mask(self, arena: int) -> NDArray[bool]:
+        return self.masks[self.arena_ids.index(arena)]
+
+    def contains(self, points: NDArray, arena: int) -> NDArray[bool]:
+        return self.mask(arena)[self.bin_index(points)]
+
+    def label_image(self) -> NDArray:
+        # 1-indexed arena number per cell, 0 outside every arena
+        labels = np.zeros(self.shape, dtype=np.int16)
+        for tile, arena in enumerate(self.arena_ids):
+            labels[self.masks[tile]] = arena
+        return labels
+
+
+if __name__ == "__main__":
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("light_dark_preference_3wpf",), data_type="position"
+    )
+    outlines = ArenaOutlines.from_data(dataloader.load_all(use_genotypes=False))
+    for arena, polygon in outlines.polygons.items():
+        print(arena, polygon.shape[0], outlines.mask(arena).sum() / outlines.scale**2)
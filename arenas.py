@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+from PIL import Image
+
+
+def load_arena_image(filepath: str) -> NDArray:
+    with open(filepath, "rb") as f:
+        image = np.asarray(Image.open(f))
+
+    # images have weird signature in top left
+    # no color channels have intensity less than 8
+    cleaned_image = np.where(image < 8, 0, image)
+    return cleaned_image
+
+
+def load_camera_params(filepath: str) -> dict[str, NDArray]:
+    camera_params = {}
+    with open(filepath, "rb") as f:
+        camera_params_file = np.load(f)
+        camera_params["rvec"] = camera_params_file["rvec"]
+        camera_params["tvec"] = camera_params_file["tvec"]
+        camera_params["mtx"] = camera_params_file["mtx"]
+        camera_params["dist"] = camera_params_file["dist"]
+
+    return camera_params
+
+
+def arena_color(arena: int) -> NDArray:
+    # arena is 0-indexed here
+    # fmt: off
+    color_cycle = np.asarray(((120, 120, 248),  # blue
+                              (120, 248, 120),  # green
+                              (120, 248, 248),  # cyan
+                              (248, 120, 120),  # red
+                              (248, 120, 248),  # pink
+                              (248, 248, 120))) # yellow
+    # fmt: on
+    num_colors = 6
+    darken_by = 8
+
+    times_to_darken, color = divmod(arena, num_colors)
+    return color_cycle[color] - times_to_darken * darken_by
+
+
+def _color_codes(pixels: NDArray) -> NDArray:
+    pixels = pixels[..., :3].astype(np.int32)
+    return (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+
+
+def arena_labels(image: NDArray, num_arenas: int) -> NDArray:
+    # 1-indexed arena number per pixel, 0 for background
+    arena_codes = _color_codes(np.stack([arena_color(i) for i in range(num_arenas)]))
+    order = np.argsort(arena_codes)
+    sorted_codes = arena_codes[order]
+
+    pixel_codes = _color_codes(image)
+    idx = np.clip(np.searchsorted(sorted_codes, pixel_codes), 0, num_arenas - 1)
+    labels = np.where(sorted_codes[idx] == pixel_codes, order[idx] + 1, 0)
+    return labels.astype(np.int16)
+
+
+def color_labels(image: NDArray) -> NDArray:
+    # every distinct non-black color gets its own label, in color order
+    pixel_codes = _color_codes(image)
+    codes, labels = np.unique(pixel_codes, return_inverse=True)
+    labels = labels.reshape(pixel_codes.shape)
+    if codes[0] != 0:
+        labels += 1
+    return labels.astype(np.int16)
+
+
+def project_points(points: NDArray, camera_params: dict[str, NDArray]) -> NDArray:
+    # tracked (x, y) in mm on the z = 0 plane to (column, row) in the arena image
+    # same camera model as cv2.projectPoints, which also computes jacobians we
+    # don't need and is several times slower on millions of points
+    dist = np.ravel(camera_params["dist"])
+    if dist.shape[0] > 8:
+        return _cv2_project_points(points, camera_params)
+    k1, k2, p1, p2, k3, k4, k5, k6 = np.pad(dist, (0, 8 - dist.shape[0]))
+
+    rotation = cv2.Rodrigues(np.asarray(camera_params["rvec"], dtype=float))[0]
+    camera = points @ rotation[:, :2].T + np.ravel(camera_params["tvec"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = camera[:, 0] / camera[:, 2]
+        y = camera[:, 1] / camera[:, 2]
+
+        r2 = x * x + y * y
+        radial = (1 + r2 * (k1 + r2 * (k2 + r2 * k3))) / (
+            1 + r2 * (k4 + r2 * (k5 + r2 * k6))
+        )
+        distorted_x = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+        distorted_y = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+
+    mtx = camera_params["mtx"]
+    return np.nan_to_num(
+        np.column_stack(
+            (
+                mtx[0, 0] * distorted_x + mtx[0, 2],
+                mtx[1, 1] * distorted_y + mtx[1, 2],
+            )
+        )
+    )
+
+
+def _cv2_project_points(points: NDArray, camera_params: dict[str, NDArray]) -> NDArray:
+    points_3d = np.column_stack((points, np.zeros(points.shape[0]))).astype(np.float32)
+    projected = cv2.projectPoints(
+        points_3d,
+        camera_params["rvec"],
+        camera_params["tvec"],
+        camera_params["mtx"],
+        camera_params["dist"],
+    )[0]  # first value is the points
+    return np.nan_to_num(projected.reshape(-1, 2))
+
+
+def gather(raster: NDArray, pixel_points: NDArray, fill: int = 0) -> NDArray:
+    # points that land off the image (including lost tracking at 0, 0) get fill;
+    # a raster with leading dimensions (e.g. one layer per field) is gathered
+    # from every layer at once
+    height, width = raster.shape[-2:]
+    cols = np.floor(pixel_points[:, 0]).astype(np.int64)
+    rows = np.floor(pixel_points[:, 1]).astype(np.int64)
+    in_bounds = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height)
+    result = np.full(
+        (*raster.shape[:-2], pixel_points.shape[0]), fill, dtype=raster.dtype
+    )
+    result[..., in_bounds] = raster[..., rows[in_bounds], cols[in_bounds]]
+    return result
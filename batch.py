@@ -0,0 +1,347 @@
+#!/usr/bin/env uv run
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+
+import data_utils
+import summaries
+from cache import FileHasher, _write_atomic
+
+JOB_KINDS = ("summarize", "heatmap", "export")
+# shared with SummaryCache, so a file hashed for a job id isn't hashed again
+# when it's summarized
+FINGERPRINTS_PATH = "data/cache/summaries/fingerprints.json"
+
+
+@dataclass(frozen=True)
+class Job:
+    job_id: str
+    kind: str
+    path: str
+    config_path: str
+    assay_name: str | None
+    size: int
+
+
+def run_identity(zantiks_file: data_utils.ZantiksFile) -> tuple:
+    # the same run with the same genotype inputs, whichever config it was found in
+    return (
+        os.path.realpath(zantiks_file.path),
+        os.path.realpath(zantiks_file.genotypes_path),
+        os.path.realpath(zantiks_file.fish_used_path),
+        zantiks_file.counting_direction,
+    )
+
+
+def _job_id(kind: str, zantiks_file: data_utils.ZantiksFile, hasher: FileHasher) -> str:
+    # the same run is the same work; the contents are part of it too, so editing
+    # a run or its genotyping makes a new job instead of one the journal already
+    # has
+    identity = (
+        kind,
+        *run_identity(zantiks_file),
+        hasher.digest(zantiks_file.path),
+        hasher.digest(zantiks_file.genotypes_path),
+        hasher.digest(zantiks_file.fish_used_path),
+    )
+    return hashlib.sha256(json.dumps(identity).encode()).hexdigest()[:16]
+
+
+def discover_configs(directory: str = "configs") -> list[str]:
+    return sorted(glob.glob(f"{directory}/**/*.toml", recursive=True))
+
+
+def xy_path(path: str) -> str:
+    xy = f"{data_utils.strip_compression(path).removesuffix('.csv')}-xy.csv"
+    return data_utils.resolve_path(xy)
+
+
+def expand_config(
+    config_path: str,
+    kinds: tuple[str, ...] = JOB_KINDS,
+    hasher: FileHasher | None = None,
+) -> tuple[list[Job], list[str]]:
+    if hasher is None:
+        hasher = FileHasher(FINGERPRINTS_PATH)
+    config = data_utils.ConfigParser().parse(config_path)
+    jobs = []
+    problems = []
+    for path, analysis_name in zip(config.data.files, config.data.assay_names):
+        path = data_utils.resolve_path(config.data.files_prefix + path)
+        assay_name = data_utils.ZantiksFile.analysis_names.get(analysis_name)
+        # both the binned file and its position data are summarized, but only
+        # position data has a heatmap and only binned data goes to analyze.R
+        candidates = [("summarize", path), ("summarize", xy_path(path))]
+        candidates.append(("heatmap", xy_path(path)))
+        candidates.append(("export", path))
+
+        for kind, candidate in candidates:
+            if kind not in kinds or not os.path.exists(candidate):
+                continue
+            try:
+                zantiks_file = data_utils.ZantiksFile(
+                    candidate, config_path, assay_name
+                )
+                job_id = _job_id(kind, zantiks_file, hasher)
+            except (IndexError, KeyError, ValueError, OSError) as e:
+                problems.append(f"{config_path}: {candidate}: {e!r}")
+                continue
+            if kind == "summarize" and summaries.summary_name(zantiks_file) is None:
+                continue
+            if kind == "export" and not zantiks_file.assay_type.has_binned_data:
+                continue
+            jobs.append(
+                Job(
+                    job_id,
+                    kind,
+                    candidate,
+                    config_path,
+                    assay_name,
+                    os.path.getsize(candidate),
+                )
+            )
+
+        if not os.path.exists(path):
+            problems.append(f"{config_path}: {path} does not exist")
+
+    return jobs, problems
+
+
+def plan(
+    config_paths: list[str], kinds: tuple[str, ...] = JOB_KINDS
+) -> tuple[list[Job], list[str]]:
+    jobs: dict[str, Job] = {}
+    problems = []
+    hasher = FileHasher(FINGERPRINTS_PATH)
+    for config_path in config_paths:
+        try:
+            config_jobs, config_problems = expand_config(config_path, kinds, hasher)
+        except (KeyError, TypeError, OSError) as e:
+            problems.append(f"{config_path}: {e!r}")
+            continue
+        problems += config_problems
+        for job in config_jobs:
+            jobs.setdefault(job.job_id, job)
+    hasher.save()
+
+    # largest first so one huge run doesn't start last and hold up the batch
+    return sorted(jobs.values(), key=lambda job: job.size, reverse=True), problems
+
+
+def run_job(job: Job, summary_path: str | None = None) -> dict:
+    start = time.perf_counter()
+    zantiks_file = data_utils.ZantiksFile(job.path, job.config_path, job.assay_name)
+    if job.kind == "summarize":
+        from cache import SummaryCache
+
+        summary_cache = SummaryCache()
+        summary = summaries.summarize_run(zantiks_file, cache=summary_cache)
+        summary_cache.save()
+        # a copy outside of this machine's cache, e.g. next to a queued job
+        if summary_path is not None and summary is not None:
+            _write_atomic(
+                summary_path,
+                lambda path: summary.write_parquet(path, compression="zstd"),
+            )
+    elif job.kind == "heatmap":
+        os.environ.setdefault("MPLBACKEND", "Agg")
+        import matplotlib.pyplot as plt
+
+        import heatmap
+
+        plot = heatmap.Heatmap(
+            data_utils.ZantiksData(zantiks_file), ("WT", "HET", "HOM")
+        )
+        plot.make_map()
+        os.makedirs("data/figures", exist_ok=True)
+        plot.show_whole_map()
+        plt.close("all")
+    elif job.kind == "export":
+        import exports
+
+        exports.export_run(zantiks_file)
+    else:
+        raise ValueError(f"unknown job kind {job.kind}")
+
+    return {"seconds": time.perf_counter() - start}
+
+
+def _run_job_safely(job: Job) -> dict:
+    # errors from a bad run are recorded, not raised, so one bad run doesn't
+    # stop the rest of the batch
+    try:
+        return {"status": "done"} | run_job(job)
+    except data_utils.DATA_ERRORS as e:
+        return {
+            "status": "failed",
+            "error": repr(e),
+            "traceback": traceback.format_exc(),
+        }
+
+
+class Journal:
+    def __init__(self, path: str):
+        self.path = path
+        self.completed: set[str] = set()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut off by an interruption
+                    if record.get("status") == "done":
+                        self.completed.add(record["job_id"])
+
+    def record(self, job: Job, result: dict) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(asdict(job) | result) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if result["status"] == "done":
+            self.completed.add(job.job_id)
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        jobs: list[Job],
+        journal_path: str = "data/batch/journal.jsonl",
+        *,
+        max_workers: int | None = None,
+    ):
+        self.journal = Journal(journal_path)
+        self.pending = [job for job in jobs if job.job_id not in self.journal.completed]
+        self.skipped = len(jobs) - len(self.pending)
+        self.max_workers = max_workers
+
+    def _record(self, job: Job, result: dict, results: list[dict]) -> None:
+        self.journal.record(job, result)
+        results.append(asdict(job) | result)
+
+        message = f"{result['seconds']:.2f}s" if "seconds" in result else ""
+        print(
+            f"{result['status']:<7} {job.kind:<10} {job.path} "
+            f"{message or result.get('error', '')}"
+        )
+
+    def _run_pool(
+        self, jobs: list[Job], results: list[dict], max_workers: int | None
+    ) -> list[Job]:
+        # returns the jobs that were lost when a worker died, e.g. killed for
+        # running out of memory, which takes the whole pool down with it
+        lost = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_run_job_safely, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    lost.append(job)
+                    continue
+                self._record(job, result, results)
+        return lost
+
+    def run(self) -> list[dict]:
+        results = []
+        if not self.pending:
+            return results
+
+        lost = self._run_pool(self.pending, results, self.max_workers)
+        if lost:
+            print(f"a worker died, running {len(lost)} unfinished jobs one at a time")
+        # each in a pool of its own, so only the job that kills its worker is
+        # failed and one that only ran out of memory alongside others can finish
+        for job in sorted(lost, key=lambda job: job.size):
+            if self._run_pool([job], results, 1):
+                self._record(
+                    job,
+                    {"status": "failed", "error": "worker died (BrokenProcessPool)"},
+                    results,
+                )
+
+        return results
+
+
+def write_config_summaries(
+    config_paths: list[str], directory: str, summary_cache=None
+) -> None:
+    # every run was summarized by the batch, so these are all cache hits
+    from cache import SummaryCache
+
+    if summary_cache is None:
+        summary_cache = SummaryCache()
+    for config_path in config_paths:
+        try:
+            summary = summaries.summarize_with_wildtype(
+                config_path, cache=summary_cache
+            )
+        except (KeyError, ValueError, OSError) as e:
+            print(f"no summary for {config_path}: {e!r}")
+            continue
+        if summary is None:
+            continue
+
+        path = f"{directory}/{os.path.splitext(config_path)[0]}.csv"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        summary.write_csv(path)
+    summary_cache.save()
+
+
+def run_batch(
+    configs_directory: str = "configs",
+    *,
+    kinds: tuple[str, ...] = JOB_KINDS,
+    max_workers: int | None = None,
+    journal_path: str = "data/batch/journal.jsonl",
+    output: str = "data/batch/summaries",
+    dry_run: bool = False,
+) -> None:
+    config_paths = discover_configs(configs_directory)
+    jobs, problems = plan(config_paths, kinds)
+    for problem in problems:
+        print(f"skipping {problem}")
+
+    runner = BatchRunner(jobs, journal_path, max_workers=max_workers)
+    print(
+        f"{len(jobs)} jobs from {len(config_paths)} configs, "
+        f"{runner.skipped} already done"
+    )
+    if dry_run:
+        for job in runner.pending:
+            print(f"{job.size:>12} {job.kind:<10} {job.path}")
+        return
+
+    runner.run()
+    if "summarize" in kinds:
+        write_config_summaries(config_paths, output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every config in a batch")
+    parser.add_argument("--configs", default="configs")
+    parser.add_argument("--kind", action="append", choices=JOB_KINDS, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--journal", default="data/batch/journal.jsonl")
+    parser.add_argument("--output", default="data/batch/summaries")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    run_batch(
+        args.configs,
+        kinds=tuple(args.kind or JOB_KINDS),
+        max_workers=args.workers,
+        journal_path=args.journal,
+        output=args.output,
+        dry_run=args.dry_run,
+    )
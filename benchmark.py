@@ -0,0 +1,287 @@
+#!/usr/bin/env uv run
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable
+
+import numpy as np
+import polars as pl
+
+import cleaning
+import data_utils
+import synthetic
+
+# wall time budgets for cli commands that should feel instant, in seconds
+STARTUP_BUDGETS = {
+    ("--help",): 0.25,
+    ("catalog",): 0.75,
+}
+# none of these should be imported just to start the cli
+HEAVY_MODULES = ("cv2", "matplotlib", "scipy", "PIL")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ("git", "rev-parse", "--short", "HEAD"),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Benchmark:
+    def __init__(self, archive: synthetic.SyntheticArchive, *, repeat: int = 3):
+        self.archive = archive
+        self.repeat = repeat
+        self.results: list[dict] = []
+
+    def _time(
+        self,
+        assay: str,
+        stage: str,
+        func: Callable[[], object],
+        setup: Callable[[], object] | None = None,
+    ) -> None:
+        times = []
+        try:
+            for _ in range(self.repeat):
+                if setup is not None:
+                    setup()
+                start = time.perf_counter()
+                func()
+                times.append(time.perf_counter() - start)
+        except data_utils.DATA_ERRORS as e:
+            self.results.append({"assay": assay, "stage": stage, "error": repr(e)})
+            print(f"{assay:<28} {stage:<20} failed: {e!r}")
+            return
+
+        self.results.append(
+            {
+                "assay": assay,
+                "stage": stage,
+                "times": times,
+                "median": statistics.median(times),
+                "min": min(times),
+            }
+        )
+        print(f"{assay:<28} {stage:<20} {statistics.median(times):.4f}s")
+
+    def run(self) -> list[dict]:
+        runs = self.archive.write_all()
+
+        # all of the assay paths (arena maps, camera params, configs) are relative
+        cwd = os.getcwd()
+        os.chdir(self.archive.root)
+        try:
+            self._run_startup()
+            for run in runs:
+                self._run_binned(run)
+                self._run_position(run)
+                self._run_compression(run)
+        finally:
+            os.chdir(cwd)
+
+        return self.results
+
+    def _run_startup(self) -> None:
+        cli_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+        for command, budget in STARTUP_BUDGETS.items():
+            stage = f"cli {' '.join(command)}"
+            self._time(
+                "cli",
+                stage,
+                lambda: subprocess.run(
+                    (sys.executable, cli_path, *command),
+                    capture_output=True,
+                    check=True,
+                ),
+            )
+            result = self.results[-1]
+            if "median" in result:
+                result["budget"] = budget
+                result["over_budget"] = result["median"] > budget
+                if result["over_budget"]:
+                    print(f"{'cli':<28} {stage:<20} over its {budget}s budget")
+
+        # importing the cli itself must not drag in plotting or opencv
+        imported = subprocess.run(
+            (
+                sys.executable,
+                "-c",
+                "import sys, cli; print(' '.join(sorted(sys.modules)))",
+            ),
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(cli_path),
+        ).stdout.split()
+        heavy = [module for module in HEAVY_MODULES if module in imported]
+        self.results.append(
+            {"assay": "cli", "stage": "heavy_imports", "modules": heavy}
+        )
+        if heavy:
+            print(f"{'cli':<28} {'heavy_imports':<20} {', '.join(heavy)}")
+
+    def _run_binned(self, run: synthetic.SyntheticRun) -> None:
+        zantiks_file = data_utils.ZantiksFile(run.path, config_path=run.config_path)
+        read_binned = zantiks_file.assay_type.read_binned
+        self._time(run.assay, "ingest", lambda: read_binned(run.path))
+
+        if not zantiks_file.assay_type.has_binned_data:
+            return
+        raw = read_binned(run.path)
+        self._time(
+            run.assay, "make_tabular", lambda: zantiks_file.assay_type.make_tabular(raw)
+        )
+
+    def _run_position(self, run: synthetic.SyntheticRun) -> None:
+        zantiks_file = data_utils.ZantiksFile(run.xy_path, config_path=run.config_path)
+        self._time(run.assay, "ingest_xy", lambda: pl.read_csv(run.xy_path))
+
+        raw = pl.read_csv(run.xy_path)
+        zantiks_data = data_utils.ZantiksData(zantiks_file, use_genotypes=False)
+        self._time(run.assay, "expand_arenas", lambda: zantiks_data._expand_arenas(raw))
+
+        expanded = zantiks_data._expand_arenas(raw)
+        cleaner = cleaning.TrajectoryCleaner(max_gap=0.5, median_window=5)
+        self._time(run.assay, "clean", lambda: cleaner.clean(expanded))
+
+        def reset_data():
+            zantiks_data.data = expanded
+
+        self._time(
+            run.assay,
+            "attach_genotypes",
+            zantiks_data._attach_genotypes,
+            setup=reset_data,
+        )
+        zantiks_data.genotypes = True
+
+        # heatmap pulls in matplotlib, so it is only imported when needed
+        os.environ.setdefault("MPLBACKEND", "Agg")
+        import matplotlib.pyplot as plt
+
+        import heatmap
+
+        heatmaps = []
+
+        def new_heatmap():
+            heatmaps.append(heatmap.Heatmap(zantiks_data, ("WT", "HET", "HOM")))
+
+        self._time(
+            run.assay,
+            "heatmap_accumulate",
+            lambda: heatmaps[-1].make_map(),
+            setup=new_heatmap,
+        )
+
+        os.makedirs("data/figures", exist_ok=True)
+
+        def render():
+            heatmaps[-1].show_whole_map()
+            plt.close("all")
+
+        self._time(run.assay, "heatmap_render", render)
+
+    def _compress(self, path: str, suffix: str) -> str:
+        compressed_path = path + suffix
+        with open(path, "rb") as f, data_utils.open_data(compressed_path, "wb") as out:
+            shutil.copyfileobj(f, out)
+        return compressed_path
+
+    def _run_compression(self, run: synthetic.SyntheticRun) -> None:
+        # the same run read plain and from each compressed copy, with the bytes
+        # that had to come off disk for each
+        assay_type = data_utils.ZantiksFile.assay_types[run.assay]()
+        readers = (
+            ("read", run.path, assay_type.read_binned),
+            ("read_xy", run.xy_path, data_utils.read_position),
+        )
+        for stage, path, read in readers:
+            for suffix in ("", *data_utils.COMPRESSION_SUFFIXES):
+                variant_path = self._compress(path, suffix) if suffix else path
+                self._time(run.assay, stage + suffix, lambda: read(variant_path))
+                size = os.path.getsize(variant_path)
+                self.results[-1]["bytes"] = size
+                print(f"{run.assay:<28} {stage + suffix:<20} {size:,} bytes")
+                if suffix:
+                    os.remove(variant_path)
+
+
+def compare(results: dict, baseline: dict) -> None:
+    baseline_medians = {
+        (result["assay"], result["stage"]): result["median"]
+        for result in baseline["results"]
+        if "median" in result
+    }
+    print(
+        f"\n{'assay':<28} {'stage':<20} {'baseline':>10} {'current':>10} {'ratio':>7}"
+    )
+    for result in results["results"]:
+        key = (result["assay"], result["stage"])
+        if "median" not in result or key not in baseline_medians:
+            continue
+        ratio = result["median"] / baseline_medians[key]
+        print(
+            f"{key[0]:<28} {key[1]:<20} {baseline_medians[key]:>10.4f} "
+            f"{result['median']:>10.4f} {ratio:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each pipeline stage")
+    parser.add_argument("--root", default=None, help="where to write synthetic data")
+    parser.add_argument("--arenas", type=int, default=None)
+    parser.add_argument("--duration", type=float, default=600.0)
+    parser.add_argument("--bin-seconds", type=float, default=1.0)
+    parser.add_argument("--xy-hz", type=float, default=25.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="results json path")
+    parser.add_argument("--compare", default=None, help="results json to compare to")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    output = os.path.abspath(args.output or f"data/benchmarks/{commit}.json")
+    root = args.root or tempfile.mkdtemp(prefix="zantiks_bench_")
+    archive = synthetic.SyntheticArchive(
+        root,
+        num_arenas=args.arenas,
+        duration=args.duration,
+        bin_seconds=args.bin_seconds,
+        xy_hz=args.xy_hz,
+        seed=args.seed,
+    )
+    benchmark = Benchmark(archive, repeat=args.repeat)
+
+    results = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "numpy": np.__version__,
+        "params": vars(args) | {"root": root},
+        "results": benchmark.run(),
+    }
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nwrote {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(results, json.load(f))
@@ -0,0 +1,261 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Callable, Iterable
+
+import polars as pl
+
+import data_utils
+
+# bump this whenever a summary changes so old cached results aren't reused
+ANALYSIS_VERSION = 1
+
+
+def _write_atomic(path: str, write: Callable[[str], None]) -> None:
+    # readers (and other processes) only ever see complete files
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+def _evict(pattern: str, max_bytes: int, keep: str | None = None) -> None:
+    # least recently used first, by modification time, until the files matching
+    # pattern fit in max_bytes
+    entries = []
+    for path in glob.glob(pattern, recursive=True):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # evicted by another process
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.normpath(path) == os.path.normpath(keep):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+class FileHasher:
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.index: dict[str, list] = {}
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                self.index = json.load(f)
+        self.changed = False
+
+    def digest(self, path: str) -> str:
+        # files are only rehashed when their size or mtime changes
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self.index.get(key)
+        if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        self.index[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.changed = True
+        return digest
+
+    def save(self) -> None:
+        if not self.changed:
+            return
+
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+
+        def write(path: str) -> None:
+            with open(path, "w") as f:
+                json.dump(self.index, f)
+
+        _write_atomic(self.index_path, write)
+        self.changed = False
+
+
+class SummaryCache:
+    def __init__(self, directory: str = "data/cache/summaries"):
+        self.directory = directory
+        self.hasher = FileHasher(f"{directory}/fingerprints.json")
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, zantiks_file: data_utils.ZantiksFile, name: str, params: dict) -> str:
+        # the result only depends on these, not on where the files live
+        key_parts = {
+            "version": ANALYSIS_VERSION,
+            "summary": name,
+            "params": params,
+            "data": self.hasher.digest(zantiks_file.path),
+            "genotypes": self.hasher.digest(zantiks_file.genotypes_path),
+            "fish_used": self.hasher.digest(zantiks_file.fish_used_path),
+            "counting_direction": zantiks_file.counting_direction,
+        }
+        return hashlib.sha256(
+            json.dumps(key_parts, sort_keys=True).encode()
+        ).hexdigest()
+
+    def path(self, key: str) -> str:
+        return f"{self.directory}/{key[:2]}/{key}.parquet"
+
+    def get_or_compute(
+        self,
+        zantiks_file: data_utils.ZantiksFile,
+        name: str,
+        params: dict,
+        compute: Callable[[], pl.DataFrame],
+    ) -> pl.DataFrame:
+        path = self.path(self.key(zantiks_file, name, params))
+        if os.path.exists(path):
+            self.hits += 1
+            return pl.read_parquet(path)
+
+        self.misses += 1
+        df = compute()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, lambda path: df.write_parquet(path, compression="zstd"))
+        return df
+
+    def save(self) -> None:
+        self.hasher.save()
+
+
+# for the notebooks: any picklable result, keyed on the contents of the files
+# it was computed from, with the least recently used results evicted once the
+# cache is over max_bytes
+class DiskCache:
+    def __init__(
+        self,
+        directory: str = "data/cache/notebooks",
+        *,
+        max_bytes: int = 4 * 1024**3,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hasher = FileHasher(f"{directory}/fingerprints.json")
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, name: str, paths: Iterable[str], params: dict) -> str:
+        key_parts = {
+            "version": ANALYSIS_VERSION,
+            "name": name,
+            "files": sorted((path, self.hasher.digest(path)) for path in paths),
+            "params": params,
+        }
+        return hashlib.sha256(
+            json.dumps(key_parts, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def path(self, key: str) -> str:
+        return f"{self.directory}/{key[:2]}/{key}.pickle"
+
+    def get_or_compute(
+        self,
+        name: str,
+        compute: Callable[[], Any],
+        *,
+        paths: Iterable[str] = (),
+        **params,
+    ) -> Any:
+        path = self.path(self.key(name, paths, params))
+        self.hasher.save()
+        if os.path.exists(path):
+            self.hits += 1
+            # the modification time doubles as the last time it was used
+            os.utime(path)
+            with open(path, "rb") as f:
+                return pickle.load(f)
+
+        self.misses += 1
+        value = compute()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        def write(temp_path: str) -> None:
+            with open(temp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        _write_atomic(path, write)
+        self.evict(keep=path)
+        return value
+
+    def evict(self, keep: str | None = None) -> None:
+        _evict(f"{self.directory}/*/*.pickle", self.max_bytes, keep)
+
+
+# position csvs are converted to zstd compressed arrow the first time they are
+# scanned, so reading a few arenas later only decompresses their columns instead
+# of tokenizing the whole csv again; like DiskCache, the least recently used
+# files are evicted once the cache is over max_bytes
+class PositionCache:
+    def __init__(
+        self,
+        directory: str = "data/cache/position",
+        *,
+        max_bytes: int = 4 * 1024**3,
+        block_size: int = 64 * 1024**2,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+
+    def path(self, path: str) -> str:
+        stem = os.path.splitext(data_utils.strip_compression(path))[0]
+        return f"{self.directory}/{stem}.arrow"
+
+    def scan(self, path: str) -> pl.LazyFrame:
+        columns_path = self.path(path)
+        if os.path.exists(columns_path) and os.path.getmtime(
+            columns_path
+        ) >= os.path.getmtime(path):
+            # the modification time doubles as the last time it was used
+            os.utime(columns_path)
+            return pl.scan_ipc(columns_path)
+
+        os.makedirs(os.path.dirname(columns_path), exist_ok=True)
+        _write_atomic(columns_path, lambda temp_path: self._convert(path, temp_path))
+        _evict(f"{self.directory}/**/*.arrow", self.max_bytes, keep=columns_path)
+        return pl.scan_ipc(columns_path)
+
+    def _convert(self, path: str, temp_path: str) -> None:
+        if data_utils.strip_compression(path) == path:
+            pl.scan_csv(path).sink_ipc(temp_path, compression="zstd")
+            return
+
+        # polars can only stream a plain csv, so compressed files are parsed a
+        # block of whole rows at a time into compressed parts and then joined,
+        # without ever holding or writing out the decompressed csv
+        parts = []
+        schema = None
+        try:
+            with data_utils.open_data(path, "rb") as f:
+                header = f.readline()
+                while block := f.read(self.block_size):
+                    block += f.readline()
+                    df = pl.read_csv(header + block, schema=schema)
+                    if schema is None:
+                        # later blocks may have decimals where the first had
+                        # none, so whole numbers are read as floats throughout
+                        schema = {
+                            name: pl.Float64 if dtype.is_integer() else dtype
+                            for name, dtype in df.schema.items()
+                        }
+                        df = df.cast(schema)
+                    parts.append(f"{temp_path}.{len(parts)}")
+                    df.write_ipc(parts[-1], compression="zstd")
+            if parts:
+                pl.scan_ipc(parts).sink_ipc(temp_path, compression="zstd")
+            else:
+                pl.read_csv(header).write_ipc(temp_path, compression="zstd")
+        finally:
+            for part in parts:
+                if os.path.exists(part):
+                    os.remove(part)
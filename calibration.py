@@ -0,0 +1,121 @@
+#!/usr/bin/env uv run
+
+from typing import Iterable, Sequence
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+import arena_outline
+import arenas
+import data_utils
+
+DIRECTIONS = ("N", "NE", "E", "SE", "S", "SW", "W", "NW")
+
+# extreme points that can't be trusted because the fish can't reach the wall there
+BAD_DIRECTIONS = {
+    "light_dark_preference_3wpf": (),
+    "light_dark_preference_6dpf": (),
+    "light_dark_transition": (),
+    "mirror_biting": ("N", "E", "S", "W"),
+    "social_preference": ("N", "E", "S", "W"),
+    "startle_response": (),
+    "ymaze_4": ("N", "S"),
+    "ymaze_15": ("N", "S"),
+}
+
+
+def get_cardinals(points: NDArray, leave_out: Iterable[str] = ()) -> NDArray:
+    x, y = points[:, 0], points[:, 1]
+    scores = {
+        "N": y,
+        "NE": y - x,
+        "E": x,
+        "SE": -(y + x),
+        "S": -y,
+        "SW": -(y - x),
+        "W": -x,
+        "NW": y + x,
+    }
+    directions = [direction for direction in DIRECTIONS if direction not in leave_out]
+    return np.stack([points[np.argmin(scores[direction])] for direction in directions])
+
+
+class Calibration:
+    def __init__(
+        self,
+        data: Iterable[data_utils.ZantiksData],
+        *,
+        scale: float = 2.5,
+        bad_directions: Sequence[str] | None = None,
+    ):
+        self.data = [datum for datum in data if datum.info.is_xy]
+        if not self.data:
+            raise ValueError("calibration needs position data")
+        self.assay_type = self.data[0].info.assay_type
+        self.scale = scale
+        if bad_directions is None:
+            bad_directions = BAD_DIRECTIONS[self.assay_type.name]
+        self.bad_directions = tuple(bad_directions)
+
+        # only unique points matter for the extremes, and there are far fewer
+        points = arena_outline.tracked_points(self.data).unique().sort("ARENA")
+        self.arena_points = {
+            arena: group.select("X", "Y").to_numpy()
+            for (arena,), group in points.group_by("ARENA", maintain_order=True)
+        }
+        # stray points outside the arena walls aren't inside any outline, so
+        # they don't become extremes
+        self.outlines = arena_outline.ArenaOutlines(points, scale=scale)
+        self.arena_map = arenas.load_arena_image(self.assay_type.arena_bmp_path)
+
+    def correspondences(self) -> tuple[NDArray, NDArray]:
+        tracked_cardinals = []
+        asset_cardinals = []
+        for arena, points in self.arena_points.items():
+            in_bin = self.outlines.contains(points, arena)
+            if not np.any(in_bin):
+                continue
+            tracked_cardinals.append(
+                get_cardinals(points[in_bin], leave_out=self.bad_directions)
+            )
+
+            # argwhere gives (row, column), the tracked points are (x, y)
+            asset_points = np.flip(
+                np.argwhere(
+                    np.all(self.arena_map == arenas.arena_color(arena - 1), axis=-1)
+                ),
+                axis=1,
+            )
+            asset_cardinals.append(
+                get_cardinals(asset_points, leave_out=self.bad_directions)
+            )
+
+        return np.vstack(tracked_cardinals), np.vstack(asset_cardinals)
+
+    def calibrate(self) -> tuple[float, dict[str, NDArray]]:
+        tracked_cardinals, asset_cardinals = self.correspondences()
+        obj_points = [
+            np.column_stack(
+                (tracked_cardinals, np.zeros(tracked_cardinals.shape[0]))
+            ).astype(np.float32)
+        ]
+        image_points = [asset_cardinals.astype(np.float32)]
+        error, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(
+            obj_points, image_points, self.arena_map.shape[:2][::-1], None, None
+        )
+        return error, {"mtx": mtx, "dist": dist, "rvec": rvecs[0], "tvec": tvecs[0]}
+
+    def save(self, camera_params: dict[str, NDArray], path: str | None = None) -> str:
+        path = path or self.assay_type.camera_parameters_path
+        np.savez_compressed(path, **camera_params)
+        return path
+
+
+if __name__ == "__main__":
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("light_dark_preference_3wpf",), data_type="position"
+    )
+    calibration = Calibration(dataloader.load_all(use_genotypes=False))
+    error, camera_params = calibration.calibrate()
+    print(error, camera_params)
@@ -19,17 +19,28 @@ def _():
     from PIL import Image
     from scipy import ndimage
 
+    import arena_outline
+    import cache
     import data_utils
+    import occupancy
+
+    # heavy cells are cached on disk, so reopening the notebook or flipping
+    # back to an assay only recomputes what changed
+    notebook_cache = cache.DiskCache()
     return (
         Image,
         Iterable,
         NDArray,
+        arena_outline,
+        cache,
         cv2,
         data_utils,
         math,
         mo,
         ndimage,
+        notebook_cache,
         np,
+        occupancy,
         os,
         pl,
         plt,
@@ -46,9 +57,13 @@ def _(mo):
 
 
 @app.cell
-def _(Iterable, NDArray, alphashape, data_utils, pl, plt):
+def _(Iterable, NDArray, arena_outline, data_utils, occupancy, pl, plt):
     class MapFinder:
-        def __init__(self, data: Iterable[data_utils.ZantiksData]):
+        def __init__(
+            self,
+            data: Iterable[data_utils.ZantiksData],
+            arena_data: list[NDArray] | None = None,
+        ):
             # parameters
             self.data: Iterable[data_utils.ZantiksData] = []
             for datum in data:
@@ -57,7 +72,9 @@ def _(Iterable, NDArray, alphashape, data_utils, pl, plt):
                 else:
                     print(f"{datum} is not position data")
             self.assay_type = self.data[0].info.assay_type
-            self.arena_data = self._convert_to_arenas()
+            self.arena_data = (
+                arena_data if arena_data is not None else self._convert_to_arenas()
+            )
 
             # constant
             # self.arena_map = (
@@ -105,43 +122,51 @@ def _(Iterable, NDArray, alphashape, data_utils, pl, plt):
             return arenas
 
         def scatter(self, separate: bool, return_plots: bool = False):
+            # drawn from occupancy pyramids instead of every point, and zooming
+            # an interactive figure redraws from the level that matches
+            pyramids = [
+                occupancy.OccupancyPyramid.cached(datum.info, data=datum)
+                for datum in self.data
+            ]
             if separate:
                 if return_plots:
                     plots = []
-                for datum in self.data:
-                    plt.figure(dpi=200)
-                    plt.title(datum.info.path)
-                    plt.scatter(datum.data["X"], datum.data["Y"], s=0.5)
+                for datum, pyramid in zip(self.data, pyramids):
+                    fig, ax = plt.subplots(dpi=200)
+                    ax.set_title(datum.info.path)
+                    occupancy.PyramidView(ax, pyramid)
                     if return_plots:
-                        plots.append(plt.gca())
+                        plots.append(ax)
                     else:
                         plt.show()
 
                 if return_plots:
                     return plots
             else:
-                plt.figure(dpi=200)
-                for datum in self.data:
-                    plt.scatter(datum.data["X"], datum.data["Y"], s=0.5)
+                fig, ax = plt.subplots(dpi=200)
+                occupancy.PyramidView(ax, occupancy.OccupancyPyramid.combine(pyramids))
 
                 if return_plots:
-                    return plt.gca()
+                    return ax
                 else:
                     plt.show()
 
-        def make_shapes(self):
-            self.shapes = []
-
-            for points in self.arena_data:
-                shape = alphashape.alphashape(points, 1.0)
-                self.shapes.append(shape)
+        def make_shapes(self, **kwargs):
+            # every arena is outlined at once from a binned occupancy grid
+            points = pl.concat(
+                pl.DataFrame(points, schema=("X", "Y"), orient="row").with_columns(
+                    pl.lit(arena_idx + 1, dtype=pl.Int32).alias("ARENA")
+                )
+                for arena_idx, points in enumerate(self.arena_data)
+                if points.shape[0] > 0
+            )
+            self.outlines = arena_outline.ArenaOutlines(points, **kwargs)
+            self.shapes = list(self.outlines.polygons.values())
 
         def show_shapes(self):
-            for shape, points in zip(self.shapes, self.arena_data):
+            for shape in self.shapes:
                 fig, ax = plt.subplots()
-                # ax.scatter(points[:, 0], points[:, 1])
-                x, y = shape.exterior.xy
-                ax.fill(x, y, alpha=0.2)
+                ax.fill(shape[:, 0], shape[:, 1], alpha=0.2)
 
                 ax.set_aspect("equal")
                 plt.show()
@@ -149,7 +174,7 @@ def _(Iterable, NDArray, alphashape, data_utils, pl, plt):
 
 
 @app.cell
-def _(Image, NDArray, np, os):
+def _(Image, NDArray, notebook_cache, np, os):
     def load_arena(filepath: str) -> NDArray:
         with open(filepath, "rb") as f:
             image = np.asarray(Image.open(f))
@@ -181,12 +206,16 @@ def _(Image, NDArray, np, os):
         return np.all(asset == arena_color(arena + 1), axis=-1)
 
     arena_files = sorted(["data/arenas/" + filename for filename in filter(lambda s: s.endswith(".bmp"), os.listdir("data/arenas"))])
-    arena_images = {filename: load_arena(filename) for filename in arena_files}
+    arena_images = notebook_cache.get_or_compute(
+        "arena_images",
+        lambda: {filename: load_arena(filename) for filename in arena_files},
+        paths=arena_files,
+    )
     return arena_color, arena_files, arena_images, get_arena, load_arena
 
 
 @app.cell
-def _(MapFinder, assay_picker, data_utils):
+def _(MapFinder, assay_picker, data_utils, mo, notebook_cache):
     if assay_picker.value == "light_dark_preference_3wpf":
         bad_directions = None
     elif assay_picker.value == "light_dark_preference_6dpf":
@@ -206,18 +235,27 @@ def _(MapFinder, assay_picker, data_utils):
     dl = data_utils.DataLoader().add_by_filter(
         assay_types=(assay_picker.value,), data_type="position"
     )
-    data = dl.load_all(use_genotypes=False)
-    mf = MapFinder(data)
+    data = notebook_cache.get_or_compute(
+        "load_all",
+        lambda: dl.load_all(use_genotypes=False),
+        paths=dl.pathnames,
+        assay=assay_picker.value,
+    )
+    arena_data = notebook_cache.get_or_compute(
+        "arena_data",
+        lambda: MapFinder(data).arena_data,
+        paths=dl.pathnames,
+        assay=assay_picker.value,
+    )
+    mf = MapFinder(data, arena_data)
     scatter_plot = mf.scatter(separate=False, return_plots=True)
     scatter_plot.set_title("All Data")
-    scatter_plot.invert_yaxis()
-    scatter_plot.set_aspect("equal")
-    scatter_plot
-    return bad_directions, data, dl, mf, scatter_plot
+    mo.mpl.interactive(scatter_plot.figure)
+    return arena_data, bad_directions, data, dl, mf, scatter_plot
 
 
 @app.cell
-def _(NDArray, math, mf, ndimage, np, plt):
+def _(NDArray, assay_picker, dl, math, mf, ndimage, notebook_cache, np, plt):
     # size of plate in mm is 127.76 x 85.4 
     def bin_data(data: list[NDArray], scale: float, pad: bool = False) -> NDArray:
         if pad:
@@ -245,8 +283,21 @@ def _(NDArray, math, mf, ndimage, np, plt):
         return in_bin 
 
     size = 2.5
-    binned = bin_data(mf.arena_data, size)
-    binned_padded = bin_data(mf.arena_data, size, pad=True)
+    binned = notebook_cache.get_or_compute(
+        "bin_data",
+        lambda: bin_data(mf.arena_data, size),
+        paths=dl.pathnames,
+        assay=assay_picker.value,
+        size=size,
+    )
+    binned_padded = notebook_cache.get_or_compute(
+        "bin_data",
+        lambda: bin_data(mf.arena_data, size, pad=True),
+        paths=dl.pathnames,
+        assay=assay_picker.value,
+        size=size,
+        pad=True,
+    )
 
     plt.figure(dpi=300)
     plt.imshow(binned, cmap="binary")
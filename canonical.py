@@ -0,0 +1,260 @@
+#!/usr/bin/env uv run
+
+import os
+from typing import Iterable, Self
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+import arenas
+import data_utils
+from cleaning import DROPOUT
+from stats import GENOTYPES
+
+# every arena is resampled to the same (row, column) grid, whatever its size in
+# the arena image
+CANONICAL_SHAPE = (64, 64)
+
+
+def arena_boxes(labels: NDArray, num_arenas: int) -> NDArray:
+    # (row start, row stop, column start, column stop) of each arena in the
+    # label map, arena 1 at index 0; arenas missing from the map are empty
+    rows, cols = np.nonzero(labels)
+    arena = labels[rows, cols].astype(np.int64) - 1
+    keep = arena < num_arenas
+    rows, cols, arena = rows[keep], cols[keep], arena[keep]
+
+    boxes = np.zeros((num_arenas, 4), dtype=np.int64)
+    boxes[:, 0] = boxes[:, 2] = np.iinfo(np.int64).max
+    np.minimum.at(boxes[:, 0], arena, rows)
+    np.maximum.at(boxes[:, 1], arena, rows + 1)
+    np.minimum.at(boxes[:, 2], arena, cols)
+    np.maximum.at(boxes[:, 3], arena, cols + 1)
+    boxes[boxes[:, 1] == 0] = 0
+    return boxes
+
+
+class CanonicalOccupancy:
+    def __init__(
+        self,
+        counts: NDArray,
+        genotypes: NDArray | None = None,
+        runs: NDArray | None = None,
+    ):
+        # counts is (fish, row, column) in the canonical frame; for one run the
+        # fish are its arenas, arena 1 at index 0, and runs says where each came from
+        self.counts = counts
+        self.genotypes = genotypes
+        self.runs = (
+            runs if runs is not None else np.full(counts.shape[0], "", dtype=str)
+        )
+
+    def __repr__(self):
+        return f"CanonicalOccupancy(fish={self.num_fish}, shape={self.shape})"
+
+    @property
+    def num_fish(self) -> int:
+        return self.counts.shape[0]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.counts.shape[1:]
+
+    @classmethod
+    def from_data(
+        cls,
+        data: data_utils.ZantiksData,
+        shape: tuple[int, int] = CANONICAL_SHAPE,
+    ) -> Self:
+        if not data.info.is_xy:
+            raise ValueError(f"{data.info.filename} is binned data, not position data")
+
+        assay = data.info.assay_type
+        num_arenas = assay.total_arenas
+        boxes = arena_boxes(
+            arenas.arena_labels(
+                arenas.load_arena_image(assay.arena_bmp_path), num_arenas
+            ),
+            num_arenas,
+        )
+        camera_params = arenas.load_camera_params(assay.camera_parameters_path)
+
+        df = data.data.filter(~DROPOUT).filter(
+            pl.col("ARENA").is_between(1, num_arenas)
+        )
+        arena = df["ARENA"].to_numpy().astype(np.int64) - 1
+        pixel_points = arenas.project_points(
+            df.select("X", "Y").to_numpy().astype(float), camera_params
+        )
+
+        # each point is placed relative to its own arena's bounding box, so the
+        # same spot in every arena lands in the same cell
+        box = boxes[arena]
+        height = box[:, 1] - box[:, 0]
+        width = box[:, 3] - box[:, 2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            v = (pixel_points[:, 1] - box[:, 0]) / height
+            u = (pixel_points[:, 0] - box[:, 2]) / width
+        inside = (v >= 0) & (v < 1) & (u >= 0) & (u < 1)
+
+        # mirrored arenas are flipped left to right to match the rest
+        mirrored = np.isin(arena + 1, assay.mirrored_arenas)
+        u = np.where(mirrored, 1 - u, u)
+        rows = np.clip(np.floor(v * shape[0]), 0, shape[0] - 1).astype(np.int64)
+        cols = np.clip(np.floor(u * shape[1]), 0, shape[1] - 1).astype(np.int64)
+        flat = ((arena * shape[0] + rows) * shape[1] + cols)[inside]
+        counts = np.bincount(flat, minlength=num_arenas * shape[0] * shape[1])
+
+        genotypes = None
+        if data.genotypes:
+            arena_genotypes = (
+                data.data.group_by("ARENA").agg(pl.first("Cluster")).drop_nulls()
+            )
+            arena_genotypes = arena_genotypes.filter(
+                pl.col("ARENA").is_between(1, num_arenas)
+            )
+            clusters = arena_genotypes["Cluster"].to_numpy().astype(str)
+            # sized to the longest genotype name so none are cut short
+            genotypes = np.full(num_arenas, "", dtype=clusters.dtype)
+            genotypes[arena_genotypes["ARENA"].to_numpy() - 1] = clusters
+
+        return cls(
+            counts.reshape(num_arenas, *shape).astype(np.uint32),
+            genotypes,
+            np.full(num_arenas, data.info.path),
+        )
+
+    @classmethod
+    def cached(
+        cls,
+        zantiks_file: data_utils.ZantiksFile,
+        use_genotypes: bool = True,
+        path: str | None = None,
+    ) -> Self:
+        if path is None:
+            path = cls.cache_path(zantiks_file)
+
+        if cls._is_fresh(path, zantiks_file, use_genotypes):
+            return cls.load(path)
+
+        occupancy = cls.from_data(
+            data_utils.ZantiksData(zantiks_file, use_genotypes=use_genotypes)
+        )
+        occupancy.save(path)
+        return occupancy
+
+    @staticmethod
+    def cache_path(zantiks_file: data_utils.ZantiksFile) -> str:
+        path = data_utils.strip_compression(zantiks_file.path)
+        return f"data/cache/canonical/{os.path.splitext(path)[0]}.npz"
+
+    @staticmethod
+    def _is_fresh(
+        path: str, zantiks_file: data_utils.ZantiksFile, use_genotypes: bool
+    ) -> bool:
+        if not os.path.exists(path):
+            return False
+        # the frame comes from the arena image and camera parameters, so
+        # recalibrating an assay invalidates it too
+        sources = [
+            zantiks_file.path,
+            zantiks_file.assay_type.arena_bmp_path,
+            zantiks_file.assay_type.camera_parameters_path,
+        ]
+        if use_genotypes:
+            with np.load(path) as f:
+                if "genotypes" not in f:
+                    return False
+            sources += [zantiks_file.genotypes_path, zantiks_file.fish_used_path]
+        modified = os.path.getmtime(path)
+        return all(modified >= os.path.getmtime(source) for source in sources)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {"counts": self.counts, "runs": self.runs}
+        if self.genotypes is not None:
+            arrays["genotypes"] = self.genotypes
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Self:
+        with np.load(path) as f:
+            return cls(
+                f["counts"],
+                f["genotypes"] if "genotypes" in f else None,
+                f["runs"],
+            )
+
+    @classmethod
+    def stack(cls, runs: Iterable[Self]) -> Self:
+        # every fish of every run along one axis, so the whole archive can be
+        # reduced at once
+        runs = tuple(runs)
+        genotypes = None
+        if all(run.genotypes is not None for run in runs):
+            genotypes = np.concatenate([run.genotypes for run in runs])
+        return cls(
+            np.concatenate([run.counts for run in runs]),
+            genotypes,
+            np.concatenate([run.runs for run in runs]),
+        )
+
+    @property
+    def occupancy(self) -> NDArray:
+        # fraction of each fish's time spent in each cell, nan for fish that
+        # were never tracked
+        totals = self.counts.sum(axis=(1, 2), keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(totals > 0, self.counts / totals, np.nan)
+
+    def genotype_means(self, genotypes: Iterable[str] = GENOTYPES) -> NDArray:
+        # (genotype, row, column), as one matrix product over every fish
+        if self.genotypes is None:
+            raise ValueError("occupancy was built without genotypes")
+
+        genotypes = tuple(genotypes)
+        occupancy = self.occupancy.reshape(self.num_fish, -1)
+        tracked = ~np.isnan(occupancy[:, 0])
+        members = (self.genotypes[None, :] == np.asarray(genotypes)[:, None]) & tracked
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = (members @ np.nan_to_num(occupancy)) / members.sum(axis=1)[:, None]
+        return means.reshape(len(genotypes), *self.shape)
+
+    def difference(self, genotype: str = "HOM", reference: str = "WT") -> NDArray:
+        means = self.genotype_means((genotype, reference))
+        return means[0] - means[1]
+
+    def similarity(self) -> NDArray:
+        # cosine similarity between every pair of fish, nan for untracked fish
+        occupancy = self.occupancy.reshape(self.num_fish, -1)
+        norms = np.linalg.norm(occupancy, axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            unit = occupancy / norms
+        return unit @ unit.T
+
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("light_dark_preference_3wpf",), data_type="position"
+    )
+    archive = CanonicalOccupancy.stack(
+        CanonicalOccupancy.cached(zantiks_file)
+        for zantiks_file in dataloader.zantiks_files
+    )
+    print(archive)
+
+    fig, axs = plt.subplots(1, len(GENOTYPES) + 1, dpi=200)
+    for ax, genotype, mean in zip(axs, GENOTYPES, archive.genotype_means()):
+        ax.imshow(mean, cmap="magma")
+        ax.set_title(genotype)
+    ax = axs[-1]
+    difference = archive.difference()
+    limit = np.nanmax(np.abs(difference))
+    ax.imshow(difference, cmap="RdBu_r", vmin=-limit, vmax=limit)
+    ax.set_title("HOM - WT")
+    plt.show()
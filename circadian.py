@@ -0,0 +1,264 @@
+#!/usr/bin/env uv run
+
+from typing import Iterable
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+import data_utils
+from stitching import StitchedRun
+from tensors import ArenaTensor
+
+HOUR = 3600.0
+DAY = 24 * HOUR
+
+
+def _lights_on(tensor: ArenaTensor) -> float:
+    # seconds from the start of the run to the first time the lights come on,
+    # or to its first bright bin if they never come on during the run
+    bright = tensor.condition == "BRIGHT"
+    if not bright.any():
+        return np.nan
+    switched_on = np.flatnonzero(bright[1:] & ~bright[:-1]) + 1
+    first = switched_on[0] if switched_on.size else np.flatnonzero(bright)[0]
+    return float(tensor.time[first] - tensor.time[0])
+
+
+class CircadianRhythms:
+    def __init__(
+        self,
+        data: data_utils.ZantiksData
+        | StitchedRun
+        | Iterable[data_utils.ZantiksData | StitchedRun],
+        *,
+        min_period: float = 16 * HOUR,
+        max_period: float = 32 * HOUR,
+        day_length: float = DAY,
+        smoothing: float = HOUR,
+        oversample: int = 8,
+    ):
+        # every arena of every run is one row of a dense (fish, bin) activity
+        # matrix, so each step below works on all of them at once; a run split
+        # over several files should be passed as one StitchedRun
+        if isinstance(data, (data_utils.ZantiksData, StitchedRun)):
+            data = (data,)
+
+        self.min_period = min_period
+        self.max_period = max_period
+        self.day_length = day_length
+        self.smoothing = smoothing
+        self.oversample = oversample
+        self._combine_runs(data)
+
+    def _combine_runs(
+        self, data: Iterable[data_utils.ZantiksData | StitchedRun]
+    ) -> None:
+        tensors, runs = [], []
+        for datum in data:
+            if not isinstance(datum.info.assay_type, data_utils.Sleep):
+                raise ValueError(f"{datum.info.filename} is not sleep data")
+            tensors.append(ArenaTensor.from_zantiks_data(datum))
+            runs.append(datum.info.filename)
+
+        widths = {float(np.median(np.diff(tensor.time))) for tensor in tensors}
+        if len(widths) != 1:
+            raise ValueError(f"runs have different bin widths: {sorted(widths)}")
+        self.bin_width = widths.pop()
+
+        # bins are placed by their time, so gaps in a run stay empty instead of
+        # pulling the rest of the run earlier
+        positions = [
+            np.round((tensor.time - tensor.time[0]) / self.bin_width).astype(int)
+            for tensor in tensors
+        ]
+        num_bins = max(position[-1] for position in positions) + 1
+        num_fish = sum(tensor.num_arenas for tensor in tensors)
+        self.activity = np.full((num_fish, num_bins), np.nan)
+        self.run = np.empty(num_fish, dtype=object)
+        self.arena = np.empty(num_fish, dtype=np.int64)
+        # sized to the longest genotype name so none are cut short
+        self.genotypes = np.full(
+            num_fish,
+            "",
+            dtype=np.result_type(
+                "U1",
+                *(
+                    tensor.genotypes
+                    for tensor in tensors
+                    if tensor.genotypes is not None
+                ),
+            ),
+        )
+        self.lights_on = np.empty(num_fish)
+
+        start = 0
+        for run, tensor, position in zip(runs, tensors, positions):
+            fish = slice(start, start + tensor.num_arenas)
+            self.activity[fish, position] = tensor.activity()
+            self.run[fish] = run
+            self.arena[fish] = np.arange(1, tensor.num_arenas + 1)
+            if tensor.genotypes is not None:
+                self.genotypes[fish] = tensor.genotypes
+            self.lights_on[fish] = _lights_on(tensor)
+            start += tensor.num_arenas
+
+    def _spectrum(self) -> tuple[NDArray, NDArray, NDArray]:
+        # missing bins are filled with the fish's mean, which is 0 once the mean
+        # is taken off, and zero padding gives a finer grid of periods
+        tracked = ~np.isnan(self.activity)
+        with np.errstate(invalid="ignore"):
+            mean = np.nanmean(self.activity, axis=1, keepdims=True)
+        centered = np.where(tracked, self.activity - mean, 0.0)
+        num_fft = self.oversample * 2 ** int(np.ceil(np.log2(self.activity.shape[1])))
+        spectrum = np.fft.rfft(centered, n=num_fft, axis=1)
+        frequencies = np.fft.rfftfreq(num_fft, d=self.bin_width)
+        return frequencies, spectrum, tracked.sum(axis=1)
+
+    def periodogram(self) -> tuple[NDArray, NDArray]:
+        # periods in hours and the power at each, (fish, period)
+        frequencies, spectrum, num_tracked = self._spectrum()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            periods = 1 / frequencies / HOUR
+            power = np.abs(spectrum) ** 2 / num_tracked[:, None]
+        return periods[1:], power[:, 1:]
+
+    def _fold(self) -> NDArray:
+        # the average day of each fish starting at lights on, with one bincount
+        # for every fish and bin
+        num_fish, num_bins = self.activity.shape
+        profile_bins = round(self.day_length / self.bin_width)
+        elapsed = np.arange(num_bins) * self.bin_width
+        offset = np.nan_to_num(self.lights_on)[:, None]
+        phase_bin = ((elapsed - offset) // self.bin_width).astype(int) % profile_bins
+
+        tracked = ~np.isnan(self.activity)
+        index = (np.arange(num_fish)[:, None] * profile_bins + phase_bin)[tracked]
+        sums = np.bincount(
+            index, self.activity[tracked], minlength=num_fish * profile_bins
+        )
+        counts = np.bincount(index, minlength=num_fish * profile_bins)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            profile = (sums / counts).reshape(num_fish, profile_bins)
+            mean = np.nanmean(profile, axis=1, keepdims=True)
+        return np.where(np.isnan(profile), mean, profile)
+
+    def _onsets(self) -> tuple[NDArray, NDArray]:
+        # activity starts when the smoothed day rises above its mean and stops
+        # when it falls below again, taking the longest active stretch
+        profile = self._fold()
+        num_fish, profile_bins = profile.shape
+        window = max(round(self.smoothing / self.bin_width), 1)
+        kernel = np.zeros(profile_bins)
+        kernel[:window] = 1 / window
+        kernel = np.roll(kernel, -(window // 2))
+        smoothed = np.fft.irfft(
+            np.fft.rfft(profile, axis=1) * np.fft.rfft(kernel), n=profile_bins, axis=1
+        )
+        above = smoothed > smoothed.mean(axis=1, keepdims=True)
+
+        # two days back to back so a stretch can run past the end of the day
+        twice = np.concatenate((above, above), axis=1)
+        rises = twice & ~np.roll(twice, 1, axis=1)
+        falls = ~twice & np.roll(twice, 1, axis=1)
+        positions = np.arange(2 * profile_bins)
+        next_fall = np.minimum.accumulate(
+            np.where(falls, positions, 2 * profile_bins)[:, ::-1], axis=1
+        )[:, ::-1]
+        lengths = np.where(rises, next_fall - positions, -1)[:, :profile_bins]
+        onset = lengths.argmax(axis=1)
+        length = lengths[np.arange(num_fish), onset]
+
+        # onsets are reported either side of lights on, so anticipating the
+        # lights shows up as a negative onset
+        onset_time = onset * self.bin_width
+        onset_time = (onset_time + self.day_length / 2) % self.day_length
+        onset_time -= self.day_length / 2
+        offset_time = onset_time + length * self.bin_width
+        no_rhythm = (length <= 0) | (length >= profile_bins)
+        return (
+            np.where(no_rhythm, np.nan, onset_time / HOUR),
+            np.where(no_rhythm, np.nan, offset_time / HOUR),
+        )
+
+    def per_arena(self) -> pl.DataFrame:
+        frequencies, spectrum, num_tracked = self._spectrum()
+        num_fish = spectrum.shape[0]
+
+        # only periods that fit inside the recorded part of the run are searched
+        with np.errstate(divide="ignore"):
+            periods = 1 / frequencies
+        allowed = (
+            (periods >= self.min_period)
+            & (periods <= self.max_period)
+            & (periods[None, :] <= (num_tracked * self.bin_width)[:, None])
+        )
+        power = np.abs(spectrum) ** 2
+        peak = np.where(allowed, power, -1.0).argmax(axis=1)
+        found = allowed[np.arange(num_fish), peak]
+        peak_value = spectrum[np.arange(num_fish), peak]
+        period = np.where(found, periods[peak], np.nan)
+
+        # a cosine of amplitude A peaking at t0 has A N / 2 * exp(-2 pi i f t0)
+        # at its frequency, so the peak gives both
+        with np.errstate(divide="ignore", invalid="ignore"):
+            amplitude = 2 * np.abs(peak_value) / num_tracked
+            mean = np.nanmean(self.activity, axis=1)
+            peak_time = -np.angle(peak_value) / (2 * np.pi * frequencies[peak])
+            phase = np.mod(peak_time - self.lights_on, period)
+            rhythmicity = power[np.arange(num_fish), peak] / power[:, 1:].sum(axis=1)
+        onset, offset = self._onsets()
+
+        df = pl.DataFrame(
+            {
+                "RUN": self.run.astype(str),
+                "ARENA": self.arena,
+                "Cluster": self.genotypes,
+                "PERIOD": period / HOUR,
+                "AMPLITUDE": np.where(found, amplitude, np.nan),
+                "RELATIVE_AMPLITUDE": np.where(found, amplitude / mean, np.nan),
+                "RHYTHMICITY": np.where(found, rhythmicity, np.nan),
+                "PHASE": phase / HOUR,
+                "ONSET": onset,
+                "OFFSET": offset,
+            },
+            nan_to_null=True,
+        )
+        # arenas that were dropped for not moving have no activity at all
+        return df.filter(pl.Series(~np.isnan(mean)))
+
+    def per_genotype(self) -> pl.DataFrame:
+        # phases wrap around the day, so they're averaged as angles
+        per_arena = self.per_arena().filter(pl.col("Cluster") != "")
+        angle = 2 * np.pi * pl.col("PHASE") / pl.col("PERIOD")
+        metrics = ("PERIOD", "AMPLITUDE", "RELATIVE_AMPLITUDE", "RHYTHMICITY")
+        return (
+            per_arena.group_by("Cluster")
+            .agg(
+                pl.len().alias("N"),
+                *(pl.mean(col) for col in metrics),
+                *(pl.std(col).alias(f"{col}_SD") for col in metrics),
+                (
+                    pl.arctan2(angle.sin().mean(), angle.cos().mean())
+                    / (2 * np.pi)
+                    * pl.col("PERIOD").mean()
+                ).alias("PHASE"),
+                pl.mean("ONSET"),
+                pl.mean("OFFSET"),
+            )
+            .with_columns(pl.col("PHASE") % pl.col("PERIOD"))
+            .sort("Cluster")
+        )
+
+
+if __name__ == "__main__":
+    sleep_config = data_utils.ConfigParser().parse("configs/jip3_test/6dpf/sleep.toml")
+    sleep_files = [
+        data_utils.ZantiksFile(sleep_config.data.files_prefix + path)
+        for path in sleep_config.data.files
+    ]
+    rhythms = CircadianRhythms(
+        [data_utils.ZantiksData(sleep_file) for sleep_file in sleep_files]
+    )
+    print(rhythms.per_arena())
+    print(rhythms.per_genotype())
@@ -0,0 +1,204 @@
+#!/usr/bin/env uv run
+
+import polars as pl
+
+# zantiks writes (0, 0) when it loses track of a fish
+DROPOUT = (
+    pl.col("X").is_null()
+    | pl.col("Y").is_null()
+    | ((pl.col("X") == 0.0) & (pl.col("Y") == 0.0))
+)
+TRACKED_TIME = pl.when(pl.col("X").is_not_null()).then(pl.col("RUNTIME"))
+
+
+def _previous(expr: pl.Expr) -> pl.Expr:
+    # the last tracked value before each frame
+    return expr.shift(1).forward_fill().over("ARENA")
+
+
+def _next(expr: pl.Expr) -> pl.Expr:
+    # the first tracked value after each frame
+    return expr.shift(-1).backward_fill().over("ARENA")
+
+
+def _too_fast(x: pl.Expr, y: pl.Expr, time: pl.Expr, max_speed: float) -> pl.Expr:
+    distance = ((pl.col("X") - x) ** 2 + (pl.col("Y") - y) ** 2).sqrt()
+    return distance > max_speed * (pl.col("RUNTIME") - time).abs()
+
+
+class TrajectoryCleaner:
+    def __init__(
+        self,
+        *,
+        max_speed: float | None = 150.0,
+        max_jump: float = 1.0,
+        max_gap: float | None = None,
+        median_window: int | None = None,
+    ):
+        # max_speed is in mm/s, well over the fastest larval escape, so anything
+        # faster is the tracker jumping, for at most max_jump seconds; max_gap
+        # is in seconds and median_window in frames, and both are off unless
+        # asked for
+        self.max_speed = max_speed
+        self.max_jump = max_jump
+        self.max_gap = max_gap
+        self.median_window = median_window
+
+    def clean(self, df: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+        # every step is a window expression over all arenas at once, and the
+        # flags say which points were changed
+        lf = (
+            df.lazy()
+            .sort("ARENA", "RUNTIME")
+            .with_columns(DROPOUT.alias("DROPOUT"))
+            .with_columns(
+                pl.when(~pl.col("DROPOUT")).then(pl.col(col)).alias(col)
+                for col in ("X", "Y")
+            )
+        )
+
+        if self.max_speed is None:
+            lf = lf.with_columns(pl.lit(False).alias("JUMP"))
+        else:
+            # a point is a jump when it is too far from the tracked points on
+            # both sides, so the frame where tracking comes back isn't also
+            # thrown out; the first and last points only have one side
+            too_fast_in = _too_fast(
+                _previous(pl.col("X")),
+                _previous(pl.col("Y")),
+                _previous(TRACKED_TIME),
+                self.max_speed,
+            )
+            too_fast_out = _too_fast(
+                _next(pl.col("X")),
+                _next(pl.col("Y")),
+                _next(TRACKED_TIME),
+                self.max_speed,
+            )
+            single = (
+                too_fast_in.fill_null(too_fast_out)
+                & too_fast_out.fill_null(too_fast_in)
+            ).fill_null(False)
+
+            # a jump can also last several frames: the runs between steps that
+            # are too fast, no longer than max_jump, where the point after the
+            # run is close enough to the point before it; after such a run the
+            # next one is back on the fish, so only every other run in a row of
+            # them is a jump
+            lf = lf.with_columns(
+                too_fast_in.fill_null(False).alias("_ENTERING"),
+                *(_previous(pl.col(col)).alias(f"_FROM_{col}") for col in ("X", "Y")),
+                _previous(TRACKED_TIME).alias("_FROM_RUNTIME"),
+            ).with_columns(pl.col("_ENTERING").cum_sum().over("ARENA").alias("_RUN"))
+            runs = (
+                lf.filter(pl.col("_ENTERING"))
+                .select(
+                    "ARENA",
+                    "_RUN",
+                    (
+                        (pl.col("X").shift(-1) - pl.col("_FROM_X")) ** 2
+                        + (pl.col("Y").shift(-1) - pl.col("_FROM_Y")) ** 2
+                    )
+                    .sqrt()
+                    .le(
+                        self.max_speed
+                        * (pl.col("RUNTIME").shift(-1) - pl.col("_FROM_RUNTIME"))
+                    )
+                    .and_(
+                        pl.col("RUNTIME").shift(-1) - pl.col("RUNTIME") <= self.max_jump
+                    )
+                    .over("ARENA")
+                    .fill_null(False)
+                    .alias("_RETURNS"),
+                )
+                .with_columns(
+                    (~pl.col("_RETURNS")).cum_sum().over("ARENA").alias("_STREAK")
+                )
+                .select(
+                    "ARENA",
+                    "_RUN",
+                    (
+                        pl.col("_RETURNS")
+                        & (
+                            pl.col("_RETURNS").cum_sum().over("ARENA", "_STREAK") % 2
+                            == 1
+                        )
+                    ).alias("_EXCURSION"),
+                )
+            )
+            lf = (
+                lf.join(runs, on=("ARENA", "_RUN"), how="left", maintain_order="left")
+                .with_columns(
+                    (
+                        single
+                        | (pl.col("_EXCURSION") & pl.col("X").is_not_null()).fill_null(
+                            False
+                        )
+                    ).alias("JUMP")
+                )
+                .drop(
+                    "_ENTERING",
+                    "_FROM_X",
+                    "_FROM_Y",
+                    "_FROM_RUNTIME",
+                    "_RUN",
+                    "_EXCURSION",
+                )
+            )
+        lf = lf.with_columns(
+            pl.when(~pl.col("JUMP")).then(pl.col(col)).alias(col) for col in ("X", "Y")
+        )
+
+        interpolated = pl.lit(False)
+        if self.max_gap is not None:
+            # only gaps with tracked points on both sides are filled
+            gap = _next(TRACKED_TIME) - _previous(TRACKED_TIME)
+            interpolated = (pl.col("X").is_null() & (gap <= self.max_gap)).fill_null(
+                False
+            )
+        lf = lf.with_columns(interpolated.alias("INTERPOLATED")).with_columns(
+            pl.when(pl.col("INTERPOLATED"))
+            .then(pl.col(col).interpolate_by("RUNTIME").over("ARENA"))
+            .otherwise(pl.col(col))
+            .alias(col)
+            for col in ("X", "Y")
+        )
+
+        if self.median_window is not None:
+            lf = lf.with_columns(
+                pl.when(pl.col(col).is_not_null())
+                .then(
+                    pl.col(col)
+                    .rolling_median(self.median_window, min_samples=1, center=True)
+                    .over("ARENA")
+                )
+                .alias(col)
+                for col in ("X", "Y")
+            )
+
+        return lf.collect()
+
+    def summary(self, cleaned: pl.DataFrame) -> pl.DataFrame:
+        return (
+            cleaned.group_by("ARENA")
+            .agg(
+                pl.len().alias("FRAMES"),
+                pl.col("DROPOUT").mean().alias("DROPOUT_FRACTION"),
+                pl.col("JUMP").sum().alias("JUMPS"),
+                pl.col("INTERPOLATED").sum().alias("INTERPOLATED"),
+                pl.col("X").is_null().mean().alias("MISSING_FRACTION"),
+            )
+            .sort("ARENA")
+        )
+
+
+if __name__ == "__main__":
+    # data_utils imports this module, so only import it back when run directly
+    import data_utils
+
+    cleaner = TrajectoryCleaner(max_gap=0.5, median_window=5)
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("sleep",), data_type="position"
+    )
+    for datum in dataloader.load_all(use_genotypes=False, cleaner=cleaner):
+        print(cleaner.summary(datum.data))
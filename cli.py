@@ -0,0 +1,534 @@
+#!/usr/bin/env uv run
+
+import argparse
+import os
+import sys
+import time
+
+# only the standard library is imported up front; everything heavier is
+# imported by the subcommand that needs it so `catalog` and `--help` stay fast
+
+
+def _parse_date(date: str) -> tuple[int, int | None, int | None]:
+    # YYYY, YYYYMM or YYYYMMDD
+    if not date.isdigit() or len(date) not in (4, 6, 8):
+        raise argparse.ArgumentTypeError(f"expected YYYY[MM[DD]], got {date!r}")
+    year = int(date[:4])
+    month = int(date[4:6]) if len(date) >= 6 else None
+    day = int(date[6:8]) if len(date) == 8 else None
+    return year, month, day
+
+
+def _find_paths(args: argparse.Namespace) -> list[str]:
+    import data_utils
+
+    data_type = {"binned": "zantiks", "xy": "position"}.get(args.data_type)
+    return data_utils.DataLoader().find_paths(
+        dates=args.date,
+        assay_types=args.assay,
+        groups=args.group,
+        data_type=data_type,
+    )
+
+
+def _zantiks_files(args: argparse.Namespace) -> list:
+    import data_utils
+
+    paths = _find_paths(args)
+    if not paths:
+        sys.exit("no files match those filters")
+
+    zantiks_files = []
+    for path in paths:
+        try:
+            zantiks_files.append(data_utils.ZantiksFile(path, config_path=args.config))
+        except (IndexError, KeyError):
+            continue  # not a zantiks run, e.g. genotypes.csv
+        except (OSError, ValueError):
+            print(f"skipping {path}: not in its config", file=sys.stderr)
+    return zantiks_files
+
+
+def _cleaner(args: argparse.Namespace):
+    if not getattr(args, "clean", False):
+        return None
+
+    import cleaning
+
+    return cleaning.TrajectoryCleaner(
+        max_speed=args.max_speed,
+        max_jump=args.max_jump,
+        max_gap=args.max_gap,
+        median_window=args.median_window,
+    )
+
+
+def _load(args: argparse.Namespace, *, use_genotypes: bool = True) -> list:
+    import data_utils
+
+    cleaner = _cleaner(args)
+    data = []
+    for zantiks_file in _zantiks_files(args):
+        if not zantiks_file.is_xy and not zantiks_file.assay_type.has_binned_data:
+            print(
+                f"skipping {zantiks_file.path}: no binned data reader", file=sys.stderr
+            )
+            continue
+        data.append(
+            data_utils.ZantiksData(zantiks_file, use_genotypes, cleaner=cleaner)
+        )
+    return data
+
+
+def _filter_genotypes(df, genotypes: list[str] | None):
+    import polars as pl
+
+    if not genotypes or "Cluster" not in df.columns:
+        return df
+    return df.filter(pl.col("Cluster").is_in(genotypes))
+
+
+def _write_or_print(df, name: str, output: str | None) -> None:
+    import data_utils
+
+    name = data_utils.strip_compression(name)
+    if output is None:
+        print(name)
+        print(df)
+        return
+
+    os.makedirs(output, exist_ok=True)
+    path = f"{output}/{name.replace('/', '_').removesuffix('.csv')}.csv"
+    df.write_csv(path)
+    print(f"wrote {path}")
+
+
+def catalog(args: argparse.Namespace) -> None:
+    import polars as pl
+
+    import data_utils
+
+    rows = []
+    for path in _find_paths(args):
+        try:
+            zantiks_file = data_utils.ZantiksFile(path, config_path=args.config)
+        except (IndexError, KeyError):
+            continue  # not a zantiks run, e.g. genotypes.csv
+        except (OSError, ValueError):
+            # runs that haven't been added to a config yet are still listed
+            zantiks_file = None
+
+        filename_parts = os.path.basename(path).split("-")
+        rows.append(
+            {
+                "PATH": path,
+                "ASSAY": filename_parts[0],
+                "DATE": filename_parts[1][:8] if len(filename_parts) > 1 else None,
+                "GROUPS": "".join(zantiks_file.groups or ()) if zantiks_file else None,
+                "XY": "xy" in path or "XY" in path,
+                "CONFIGURED": zantiks_file is not None,
+            }
+        )
+
+    df = pl.DataFrame(
+        rows,
+        schema={
+            "PATH": pl.String,
+            "ASSAY": pl.String,
+            "DATE": pl.String,
+            "GROUPS": pl.String,
+            "XY": pl.Boolean,
+            "CONFIGURED": pl.Boolean,
+        },
+    )
+    if args.output:
+        df.write_csv(args.output)
+        print(f"wrote {args.output}")
+    else:
+        with pl.Config(tbl_rows=-1, fmt_str_lengths=120):
+            print(df)
+
+
+def load(args: argparse.Namespace) -> None:
+    for datum in _load(args, use_genotypes=not args.no_genotypes):
+        df = _filter_genotypes(datum.data, args.genotype)
+        _write_or_print(df, datum.info.filename, args.output)
+
+
+def summarize(args: argparse.Namespace) -> None:
+    import summaries
+    from cache import SummaryCache
+
+    summary_cache = None if args.no_cache else SummaryCache()
+    if args.pool_wildtype:
+        if args.config is None:
+            sys.exit("--pool-wildtype needs --config")
+        summary = summaries.summarize_with_wildtype(
+            args.config, cache=summary_cache, before=args.before, after=args.after
+        )
+        if summary is not None:
+            name = os.path.basename(args.config).removesuffix(".toml")
+            _write_or_print(
+                _filter_genotypes(summary, args.genotype), name, args.output
+            )
+    else:
+        for zantiks_file in _zantiks_files(args):
+            summary = summaries.summarize_run(
+                zantiks_file, cache=summary_cache, before=args.before, after=args.after
+            )
+            if summary is None:
+                print(f"no summary for {zantiks_file.filename}", file=sys.stderr)
+                continue
+
+            summary = _filter_genotypes(summary, args.genotype)
+            _write_or_print(summary, zantiks_file.filename, args.output)
+
+    if summary_cache is not None:
+        summary_cache.save()
+        print(
+            f"{summary_cache.hits} cached, {summary_cache.misses} computed",
+            file=sys.stderr,
+        )
+
+
+def plot_heatmaps(args: argparse.Namespace) -> None:
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+
+    import heatmap
+
+    if args.no_usetex:
+        mpl.rc("text", usetex=False)
+
+    args.data_type = "xy"
+    os.makedirs("data/figures", exist_ok=True)
+    for datum in _load(args):
+        genotypes = args.genotype or ("WT", "HET", "HOM")
+        plot = heatmap.Heatmap(datum, genotypes)
+        plot.make_map()
+        plot.show_whole_map(args.radius)
+        plt.close("all")
+
+
+def calibrate(args: argparse.Namespace) -> None:
+    import calibration
+
+    args.data_type = "xy"
+    if not args.assay or len(args.assay) != 1:
+        sys.exit("calibrate needs exactly one --assay")
+
+    calibrator = calibration.Calibration(
+        _load(args, use_genotypes=False), scale=args.scale
+    )
+    error, camera_params = calibrator.calibrate()
+    print(f"reprojection error: {error:.3f} px")
+    if args.dry_run:
+        print(camera_params)
+    else:
+        print(f"wrote {calibrator.save(camera_params, args.output)}")
+
+
+def batch(args: argparse.Namespace) -> None:
+    import batch
+
+    batch.run_batch(
+        args.configs,
+        kinds=tuple(args.kind or batch.JOB_KINDS),
+        max_workers=args.workers,
+        journal_path=args.journal,
+        output=args.output,
+        dry_run=args.dry_run,
+    )
+
+
+def export(args: argparse.Namespace) -> None:
+    import exports
+
+    args.data_type = "binned"
+    for zantiks_file in _zantiks_files(args):
+        if not zantiks_file.assay_type.has_binned_data:
+            print(
+                f"skipping {zantiks_file.path}: no binned data reader", file=sys.stderr
+            )
+            continue
+        try:
+            for path in exports.export_run(zantiks_file, args.output):
+                print(f"wrote {path}")
+        except OSError as e:
+            print(f"skipping {zantiks_file.path}: {e}", file=sys.stderr)
+
+
+def watch(args: argparse.Namespace) -> None:
+    import batch
+    import watch
+
+    watcher = watch.Watcher(
+        args.data,
+        args.configs,
+        settle=args.settle,
+        kinds=tuple(args.kind or batch.JOB_KINDS),
+        max_workers=args.workers,
+    )
+    if args.once:
+        watcher.poll()
+    else:
+        watcher.run(args.interval)
+
+
+def queue(args: argparse.Namespace) -> None:
+    import batch
+    import work_queue
+
+    work_queue.run_queue(
+        args.action,
+        args.queue,
+        configs_directory=args.configs,
+        kinds=tuple(args.kind or batch.JOB_KINDS),
+        workers=args.workers,
+        lease=args.lease,
+        max_attempts=args.max_attempts,
+        wait=args.wait,
+        output=args.output,
+    )
+
+
+def compare_genotypes(args: argparse.Namespace) -> None:
+    import polars as pl
+
+    import stats
+
+    results = stats.GenotypeStats(
+        pl.read_csv(args.summary),
+        metrics=args.metric,
+        resamples=args.resamples,
+        seed=args.seed,
+        max_workers=args.workers,
+    ).compare()
+    if args.output:
+        results.write_csv(args.output)
+        print(f"wrote {args.output}")
+    else:
+        with pl.Config(tbl_rows=-1, tbl_cols=-1):
+            print(results)
+
+
+def check(args: argparse.Namespace) -> None:
+    import qc
+
+    qc.run_qc(
+        _find_paths(args),
+        max_workers=args.workers,
+        max_dropout=args.max_dropout,
+        output=args.output,
+    )
+
+
+def _add_filters(parser: argparse.ArgumentParser, data_type: bool = True) -> None:
+    parser.add_argument("--assay", action="append", help="assay type, repeatable")
+    parser.add_argument(
+        "--date", action="append", type=_parse_date, help="YYYY[MM[DD]], repeatable"
+    )
+    parser.add_argument("--group", action="append", help="e.g. zantiks_a, repeatable")
+    parser.add_argument("--config", default=None, help="override the assay config")
+    if data_type:
+        parser.add_argument("--data-type", choices=("binned", "xy"), default=None)
+
+
+def _add_genotypes(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--genotype", action="append", help="e.g. WT, repeatable")
+
+
+def _add_cleaning(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--clean", action="store_true", help="drop tracking jumps from position data"
+    )
+    parser.add_argument("--max-speed", type=float, default=150.0, help="mm/s")
+    parser.add_argument(
+        "--max-jump", type=float, default=1.0, help="longest jump in seconds"
+    )
+    parser.add_argument(
+        "--max-gap", type=float, default=None, help="fill gaps up to this many seconds"
+    )
+    parser.add_argument(
+        "--median-window", type=int, default=None, help="smooth over this many frames"
+    )
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="zantiks", description="Zantiks and MicroTracker analysis"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="time each stage (see profiling.py)"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    catalog_parser = subparsers.add_parser("catalog", help="list matching runs")
+    _add_filters(catalog_parser)
+    catalog_parser.add_argument("--output", default=None, help="csv path")
+    catalog_parser.set_defaults(func=catalog)
+
+    load_parser = subparsers.add_parser("load", help="load runs into tables")
+    _add_filters(load_parser)
+    _add_genotypes(load_parser)
+    _add_cleaning(load_parser)
+    load_parser.add_argument("--no-genotypes", action="store_true")
+    load_parser.add_argument("--output", default=None, help="csv directory")
+    load_parser.set_defaults(func=load)
+
+    summarize_parser = subparsers.add_parser(
+        "summarize", help="per-arena summaries of each run"
+    )
+    _add_filters(summarize_parser)
+    _add_genotypes(summarize_parser)
+    summarize_parser.add_argument("--before", type=float, default=None)
+    summarize_parser.add_argument("--after", type=float, default=None)
+    summarize_parser.add_argument(
+        "--pool-wildtype",
+        action="store_true",
+        help="summarize --config and swap in WT fish from its wildtype_file",
+    )
+    summarize_parser.add_argument("--no-cache", action="store_true")
+    summarize_parser.add_argument("--output", default=None, help="csv directory")
+    summarize_parser.set_defaults(func=summarize)
+
+    heatmap_parser = subparsers.add_parser("heatmap", help="plot position heatmaps")
+    _add_filters(heatmap_parser, data_type=False)
+    _add_genotypes(heatmap_parser)
+    _add_cleaning(heatmap_parser)
+    heatmap_parser.add_argument("--radius", type=float, default=5)
+    heatmap_parser.add_argument("--no-usetex", action="store_true")
+    heatmap_parser.set_defaults(func=plot_heatmaps)
+
+    calibrate_parser = subparsers.add_parser(
+        "calibrate", help="fit camera parameters from position data"
+    )
+    _add_filters(calibrate_parser, data_type=False)
+    calibrate_parser.add_argument("--scale", type=float, default=2.5)
+    calibrate_parser.add_argument("--dry-run", action="store_true")
+    calibrate_parser.add_argument("--output", default=None, help="npz path")
+    calibrate_parser.set_defaults(func=calibrate)
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="run every config, skipping work that is already done"
+    )
+    batch_parser.add_argument("--configs", default="configs", help="config folder")
+    batch_parser.add_argument(
+        "--kind",
+        action="append",
+        choices=("summarize", "heatmap", "export"),
+        default=None,
+    )
+    batch_parser.add_argument("--workers", type=int, default=None)
+    batch_parser.add_argument("--journal", default="data/batch/journal.jsonl")
+    batch_parser.add_argument("--output", default="data/batch/summaries")
+    batch_parser.add_argument("--dry-run", action="store_true")
+    batch_parser.set_defaults(func=batch)
+
+    export_parser = subparsers.add_parser(
+        "export", help="write runs as arrow files for analyze.R"
+    )
+    _add_filters(export_parser, data_type=False)
+    export_parser.add_argument(
+        "--output", default="data/cache/arrow", help="export directory"
+    )
+    export_parser.set_defaults(func=export)
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="process new runs as they are copied into data/"
+    )
+    watch_parser.add_argument("--data", default="data", help="data folder")
+    watch_parser.add_argument("--configs", default="configs", help="config folder")
+    watch_parser.add_argument(
+        "--kind",
+        action="append",
+        choices=("summarize", "heatmap", "export"),
+        default=None,
+    )
+    watch_parser.add_argument("--workers", type=int, default=None)
+    watch_parser.add_argument(
+        "--interval", type=float, default=30.0, help="seconds between polls"
+    )
+    watch_parser.add_argument(
+        "--settle", type=int, default=2, help="unchanged polls before a file is read"
+    )
+    watch_parser.add_argument(
+        "--once", action="store_true", help="poll once instead of forever"
+    )
+    watch_parser.set_defaults(func=watch)
+
+    queue_parser = subparsers.add_parser(
+        "queue", help="share a batch between machines through a shared folder"
+    )
+    queue_parser.add_argument("action", choices=("submit", "work", "status", "collect"))
+    queue_parser.add_argument(
+        "--queue", default="data/queue", help="job folder every machine can see"
+    )
+    queue_parser.add_argument("--configs", default="configs", help="config folder")
+    queue_parser.add_argument(
+        "--kind",
+        action="append",
+        choices=("summarize", "heatmap", "export"),
+        default=None,
+    )
+    queue_parser.add_argument(
+        "--workers", type=int, default=1, help="worker processes on this machine"
+    )
+    queue_parser.add_argument(
+        "--lease", type=float, default=600.0, help="seconds before a job is taken over"
+    )
+    queue_parser.add_argument("--max-attempts", type=int, default=3)
+    queue_parser.add_argument(
+        "--wait", action="store_true", help="wait for jobs running elsewhere"
+    )
+    queue_parser.add_argument("--output", default="data/batch/summaries")
+    queue_parser.set_defaults(func=queue)
+
+    stats_parser = subparsers.add_parser(
+        "stats", help="compare genotypes with bootstrap CIs and permutation tests"
+    )
+    stats_parser.add_argument(
+        "summary", help="csv from summarize --output or analyze.R"
+    )
+    stats_parser.add_argument("--metric", action="append", default=None)
+    stats_parser.add_argument("--resamples", type=int, default=10000)
+    stats_parser.add_argument("--seed", type=int, default=0)
+    stats_parser.add_argument("--workers", type=int, default=None)
+    stats_parser.add_argument("--output", default=None, help="csv path")
+    stats_parser.set_defaults(func=compare_genotypes)
+
+    qc_parser = subparsers.add_parser(
+        "qc", help="check runs for truncation, dropouts and dead arenas"
+    )
+    _add_filters(qc_parser)
+    qc_parser.add_argument("--workers", type=int, default=None)
+    qc_parser.add_argument(
+        "--max-dropout", type=float, default=10.0, help="seconds of lost tracking"
+    )
+    qc_parser.add_argument("--output", default="data/qc", help="report directory")
+    qc_parser.set_defaults(func=check)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = make_parser().parse_args(argv)
+    if args.profile:
+        import profiling
+
+        profiling.enable(write_at_exit=False)
+
+    start = time.perf_counter()
+    args.func(args)
+
+    if args.profile:
+        profiling.print_summary()
+        print(f"profile written to {profiling.write_report()}", file=sys.stderr)
+        print(
+            f"{args.command} took {time.perf_counter() - start:.3f}s", file=sys.stderr
+        )
+
+
+if __name__ == "__main__":
+    main()
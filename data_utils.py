@@ -1,17 +1,82 @@
 #!/usr/bin/env uv run
 
 import glob
+import gzip
 import io
+import itertools
+import os
 import re
 import tomllib
 from abc import ABC, abstractmethod
-from typing import Iterable, Literal, Self, Sequence
+from typing import IO, Iterable, Literal, Self, Sequence
 
 import numpy as np
 import polars as pl
+import zstandard
+
+import profiling
+from cleaning import TrajectoryCleaner
 
 type VariableDate = Sequence[int | None]
 
+# raw exports can be kept compressed, and are decompressed as they are read
+COMPRESSION_SUFFIXES = (".gz", ".zst")
+
+# what reading or analyzing a bad or unfinished run can raise, for the places
+# that skip a run instead of stopping
+DATA_ERRORS = (
+    ArithmeticError,
+    EOFError,
+    IndexError,
+    KeyError,
+    OSError,
+    RuntimeError,
+    ValueError,
+    pl.exceptions.PolarsError,
+    zstandard.ZstdError,
+)
+
+# binned columns with each arena's values, as analyze.R pivots them: A1_Z1,
+# A1_Z2, ... or just A1, A2, ... with no zones
+ARENA_COLUMNS = re.compile(r"A(\d+)(_Z(\d+))?$")
+# mirror biting and social preference have distance, count and time columns per
+# zone (D.A1.Z1, C.A1.Z1, T.A1.Z1), and time in zone adds up for every arena
+TIME_IN_ZONE_COLUMNS = re.compile(r"T\.A(\d+)\.Z(\d+)$")
+
+
+def strip_compression(path: str) -> str:
+    for suffix in COMPRESSION_SUFFIXES:
+        if path.endswith(suffix):
+            return path.removesuffix(suffix)
+    return path
+
+
+def resolve_path(path: str) -> str:
+    # configs list the plain .csv, which may have been compressed since
+    if os.path.exists(path):
+        return path
+    for suffix in COMPRESSION_SUFFIXES:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+
+def open_data(path: str, mode: Literal["r", "rb", "w", "wb"] = "r") -> IO:
+    # the compressed openers default to binary
+    compressed_mode = mode if "b" in mode else f"{mode}t"
+    if path.endswith(".gz"):
+        return gzip.open(path, compressed_mode)
+    if path.endswith(".zst"):
+        return zstandard.open(path, compressed_mode)
+    return open(path, mode)
+
+
+def read_position(path: str) -> pl.DataFrame:
+    if strip_compression(path) == path:
+        return pl.read_csv(path)
+    with open_data(path, "rb") as f:
+        return pl.read_csv(f)
+
 
 class Assay(ABC):
     @property
@@ -51,9 +116,79 @@ class Assay(ABC):
     def camera_parameters_path(self) -> str:
         return f"data/camera_params/{self.name}.npz"
 
-    @abstractmethod
+    @property
+    def mirrored_arenas(self) -> tuple[int, ...]:
+        # arenas laid out as a left/right mirror image of the rest
+        return ()
+
+    @property
+    def arena_column_pattern(self) -> re.Pattern | None:
+        # None for event logs, which have a row per event and an ARENA column
+        return ARENA_COLUMNS
+
+    def read_binned(self, path: str) -> pl.DataFrame:
+        # zantiks files have a 3 line preamble and a 1 line footer
+        with open_data(path) as f:
+            with profiling.span("trim_preamble", path):
+                lines = f.readlines()
+                f = io.StringIO("".join(lines[3:-1]))
+            with profiling.span("read_csv", path):
+                return pl.read_csv(f)
+
+    @property
+    def has_binned_data(self) -> bool:
+        # only assays that define make_tabular can load their binned files;
+        # every assay can load its position data
+        return type(self).make_tabular is not Assay.make_tabular
+
     def make_tabular(self, df: pl.DataFrame) -> pl.DataFrame:
-        pass
+        raise ValueError(f"{self.name} has no binned data reader")
+
+    def arena_index(self, row: pl.Expr, column: pl.Expr) -> pl.Expr | None:
+        # arena number for a genotyping well, or None to number the used wells
+        # by counting direction
+        return None
+
+    def _unpivot_binned(
+        self, df: pl.DataFrame, value_name: str = "DISTANCE"
+    ) -> pl.DataFrame:
+        arena_columns = [
+            col for col in df.columns if self.arena_column_pattern.match(col)
+        ]
+        df = df.unpivot(
+            index=[col for col in df.columns if col not in arena_columns],
+            on=arena_columns,
+            variable_name="LOCATION_CODE",
+            value_name=value_name,
+        )
+        df = df.with_columns(
+            [
+                pl.col("LOCATION_CODE")
+                .str.extract(r"A(\d+)", 1)
+                .cast(pl.Int32)
+                .alias("ARENA"),
+                pl.col("LOCATION_CODE")
+                .str.extract(r"Z(\d+)", 1)
+                .cast(pl.Int32)
+                .fill_null(1)
+                .alias("ZONE"),
+            ]
+        )
+        df = df.drop("LOCATION_CODE")
+
+        zero_arenas = (
+            df.group_by("ARENA")
+            .agg(pl.sum(value_name).alias("TOTAL"))
+            .filter(pl.col("TOTAL") == 0)
+            .select("ARENA")
+        )
+        if not zero_arenas.is_empty():
+            zero_arena_list = zero_arenas["ARENA"].to_list()
+            result = df.filter(~pl.col("ARENA").is_in(zero_arena_list))
+        else:
+            result = df
+
+        return result
 
 
 class LightDarkPreference3wpf(Assay):
@@ -77,6 +212,12 @@ class LightDarkPreference3wpf(Assay):
     def arenas_per_group(self) -> int | None:
         return 4
 
+    @property
+    def mirrored_arenas(self) -> tuple[int, ...]:
+        # the dark side is on the other end in these, which analyze.R also
+        # accounts for by swapping their zones
+        return (5, 6, 7, 8)
+
 
 class LightDarkPreference6dpf(Assay):
     @property
@@ -99,6 +240,12 @@ class LightDarkPreference6dpf(Assay):
     def arenas_per_group(self) -> int | None:
         return 12
 
+    @property
+    def mirrored_arenas(self) -> tuple[int, ...]:
+        # the dark side is on the other end in these, which analyze.R also
+        # accounts for by swapping their zones
+        return (5, 6, 7, 8)
+
 
 class LightDarkTransition(Assay):
     @property
@@ -121,6 +268,11 @@ class LightDarkTransition(Assay):
     def arenas_per_group(self) -> int | None:
         return None
 
+    def make_tabular(self, df: pl.DataFrame) -> pl.DataFrame:
+        return self._unpivot_binned(df).select(
+            ("TIME", "BIN_NUM", "CONDITION", "ARENA", "ZONE", "DISTANCE")
+        )
+
 
 class MirrorBiting(Assay):
     @property
@@ -143,6 +295,10 @@ class MirrorBiting(Assay):
     def arenas_per_group(self) -> int | None:
         return 4
 
+    @property
+    def arena_column_pattern(self) -> re.Pattern | None:
+        return TIME_IN_ZONE_COLUMNS
+
 
 class Sleep(Assay):
     @property
@@ -166,43 +322,9 @@ class Sleep(Assay):
         return None
 
     def make_tabular(self, df: pl.DataFrame) -> pl.DataFrame:
-        pattern = re.compile(r"A(\d+)_Z(\d+)")
-        df = df.unpivot(
-            index=("TIME", "CONDITION", "BIN_NUM"),
-            on=[col for col in df.columns if re.match(pattern, col)],
-            variable_name="LOCATION_CODE",
-            value_name="DISTANCE",
-        )
-        df = df.with_columns(
-            [
-                pl.col("LOCATION_CODE")
-                .str.extract(r"A(\d+)", 1)
-                .cast(pl.Int32)
-                .alias("ARENA"),
-                pl.col("LOCATION_CODE")
-                .str.extract(r"Z(\d+)", 1)
-                .cast(pl.Int32)
-                .alias("ZONE"),
-            ]
-        )
-        df = df.drop("LOCATION_CODE")
-
-        zero_arenas = (
-            df.group_by("ARENA")
-            .agg(pl.sum("DISTANCE").alias("TOTAL_DISTANCE"))
-            .filter(pl.col("TOTAL_DISTANCE") == 0)
-            .select("ARENA")
-        )
-        if not zero_arenas.is_empty():
-            zero_arena_list = zero_arenas["ARENA"].to_list()
-            result = df.filter(~pl.col("ARENA").is_in(zero_arena_list))
-        else:
-            result = df
-
-        result = result.select(
+        return self._unpivot_binned(df).select(
             ("TIME", "BIN_NUM", "CONDITION", "ARENA", "ZONE", "DISTANCE")
         )
-        return result
 
 
 class SocialPreference(Assay):
@@ -226,6 +348,10 @@ class SocialPreference(Assay):
     def arenas_per_group(self) -> int | None:
         return 4
 
+    @property
+    def arena_column_pattern(self) -> re.Pattern | None:
+        return TIME_IN_ZONE_COLUMNS
+
 
 class StartleResponse(Assay):
     @property
@@ -248,6 +374,16 @@ class StartleResponse(Assay):
     def arenas_per_group(self) -> int | None:
         return None
 
+    def make_tabular(self, df: pl.DataFrame) -> pl.DataFrame:
+        # only one zone per arena, and PHASE marks the stimuli instead of CONDITION
+        df = self._unpivot_binned(df)
+        return df.select(
+            *(col for col in df.columns if col not in ("ARENA", "ZONE", "DISTANCE")),
+            "ARENA",
+            "ZONE",
+            "DISTANCE",
+        )
+
 
 class Ymaze15(Assay):
     @property
@@ -270,6 +406,11 @@ class Ymaze15(Assay):
     def arenas_per_group(self) -> int | None:
         return 12
 
+    @property
+    def arena_column_pattern(self) -> re.Pattern | None:
+        # zone entries and exits, one row each
+        return None
+
 
 class Ymaze4(Assay):
     @property
@@ -292,6 +433,150 @@ class Ymaze4(Assay):
     def arenas_per_group(self) -> int | None:
         return 4
 
+    @property
+    def arena_column_pattern(self) -> re.Pattern | None:
+        # zone entries and exits, one row each
+        return None
+
+
+class DevelopmentalDelay(Assay):
+    @property
+    def name(self) -> str:
+        return "developmental_delay"
+
+    @property
+    def pretty_name(self) -> str:
+        return "Developmental Delay"
+
+    @property
+    def age(self) -> str:
+        return "6dpf"
+
+    @property
+    def config_path(self) -> str:
+        return "configs/jip3_test/developmental_delay.toml"
+
+    @property
+    def total_arenas(self) -> int:
+        return 96
+
+    @property
+    def arenas_per_group(self) -> int | None:
+        return None
+
+    def make_tabular(self, df: pl.DataFrame) -> pl.DataFrame:
+        df = self._unpivot_binned(df, value_name="PIXEL_DIFFERENCE")
+        return df.select(
+            *(
+                col
+                for col in df.columns
+                if col not in ("ARENA", "ZONE", "PIXEL_DIFFERENCE")
+            ),
+            "ARENA",
+            "PIXEL_DIFFERENCE",
+        )
+
+    def arena_index(self, row: pl.Expr, column: pl.Expr) -> pl.Expr | None:
+        # the plate is split into four 4x6 quadrants, each numbered across then
+        # down, in the order top left, top right, bottom left, bottom right
+        row_num = row.replace_strict({letter: i for i, letter in enumerate("ABCDEFGH")})
+        return (
+            (row_num // 4) * 48
+            + ((column - 1) // 6) * 24
+            + (row_num % 4) * 6
+            + (column - 1) % 6
+            + 1
+        )
+
+
+class MicroTracker(Assay):
+    @property
+    def name(self) -> str:
+        return "microtracker"
+
+    @property
+    def pretty_name(self) -> str:
+        return "MicroTracker"
+
+    @property
+    def age(self) -> str:
+        return "6dpf"
+
+    @property
+    def config_path(self) -> str:
+        return "configs/test/mt_zantiks.toml"
+
+    @property
+    def total_arenas(self) -> int:
+        return 96
+
+    @property
+    def arenas_per_group(self) -> int | None:
+        return None
+
+    def read_binned(self, path: str) -> pl.DataFrame:
+        if path.endswith(".xlsx"):
+            return self._read_xlsx(path)
+
+        # the export has a report above the table, so only read the 97 lines
+        # (header and one per well) after the "Well Activity" marker
+        with open_data(path) as f:
+            with profiling.span("find_well_activity", path):
+                for line in f:
+                    if "Well Activity" in line:
+                        break
+                else:
+                    raise ValueError(f"{path} has no Well Activity table")
+                table = "".join(itertools.islice(f, 97))
+        with profiling.span("read_csv", path):
+            return pl.read_csv(io.StringIO(table))
+
+    def _read_xlsx(self, path: str) -> pl.DataFrame:
+        # imported here, it adds about 100 ms to every import of this module
+        import openpyxl
+
+        # read only mode streams rows instead of loading the whole workbook
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(
+                min_row=26, max_row=26 + 96, values_only=True
+            )
+            header = [str(cell) for cell in next(rows)]
+            return pl.DataFrame(
+                [row for row in rows if row[0] is not None],
+                schema=header,
+                orient="row",
+            )
+        finally:
+            workbook.close()
+
+    def make_tabular(self, df: pl.DataFrame) -> pl.DataFrame:
+        # activity is reported for every 30 minutes, with the minute as the name
+        bin_columns = [col for col in df.columns if col.isdigit()]
+        df = (
+            df.with_columns(
+                pl.col("Well").str.extract(r"([A-H])").alias("row"),
+                pl.col("Well").str.extract(r"([0-9]+)").cast(int).alias("column"),
+            )
+            .sort("row", "column")
+            .with_row_index("ARENA", offset=1)
+        )
+        return (
+            df.unpivot(
+                index=["ARENA", "Well"],
+                on=bin_columns,
+                variable_name="MINUTE",
+                value_name="ACTIVITY",
+            )
+            .select(
+                pl.col("MINUTE").cast(pl.Int32),
+                pl.col("ARENA").cast(pl.Int32),
+                pl.col("Well").alias("WELL"),
+                pl.col("ACTIVITY").cast(pl.Float64),
+            )
+            .sort("ARENA", "MINUTE")
+        )
+
 
 class ConfigParser(dict):
     __getattr__ = dict.__getitem__
@@ -313,9 +598,11 @@ class ConfigParser(dict):
 
 class ZantiksFile:
     assay_types = {
+        "developmental_delay": DevelopmentalDelay,
         "light_dark_preference_3wpf": LightDarkPreference3wpf,
         "light_dark_preference_6dpf": LightDarkPreference6dpf,
         "light_dark_transition": LightDarkTransition,
+        "microtracker": MicroTracker,
         "mirror_biting": MirrorBiting,
         "sleep": Sleep,
         "social_preference": SocialPreference,
@@ -323,24 +610,50 @@ class ZantiksFile:
         "ymaze_15": Ymaze15,
         "ymaze_4": Ymaze4,
     }
+    # assay_names used in configs (and by analyze.R) that name one assay type
+    analysis_names = {
+        "developmental delay": "developmental_delay",
+        "light/dark preference 3wpf": "light_dark_preference_3wpf",
+        "light/dark preference 6dpf": "light_dark_preference_6dpf",
+        "light/dark transition": "light_dark_transition",
+        "microtracker": "microtracker",
+        "mirror biting": "mirror_biting",
+        "sleep": "sleep",
+        "social preference": "social_preference",
+        "startle response/pre-pulse inhibition": "startle_response",
+        "y-maze 15": "ymaze_15",
+        "y-maze 4": "ymaze_4",
+    }
 
-    def __init__(self, path: str):
+    def __init__(
+        self,
+        path: str,
+        config_path: str | None = None,
+        assay_name: str | None = None,
+    ):
         self.path = path
         parts = path.split("/")
         self.filename = parts[-1]
-        filename_parts = self.filename.split("-")
-        self.basename = (
-            parts[-2] + "/" + filename_parts[0] + "-" + filename_parts[1][:12]
-        )
+        filename_parts = strip_compression(self.filename).split("-")
         self.groups = self._parse_groups(parts[-2])
         if not all(char in {"A", "B", "C", "D"} for char in self.groups):
             self.groups = None
-        self.assay_type: Assay = self.assay_types[filename_parts[0]]()
-        self.year = filename_parts[1][:4]
-        self.month = filename_parts[1][4:6]
-        self.day = filename_parts[1][6:8]
+        # microtracker exports aren't named <assay>-<timestamp>, so their assay
+        # has to be given
+        self.assay_type: Assay = self.assay_types[assay_name or filename_parts[0]]()
+        if len(filename_parts) > 1:
+            self.basename = (
+                parts[-2] + "/" + filename_parts[0] + "-" + filename_parts[1][:12]
+            )
+            self.year = filename_parts[1][:4]
+            self.month = filename_parts[1][4:6]
+            self.day = filename_parts[1][6:8]
+        else:
+            self.basename = strip_compression(self.filename)
+            self.year = self.month = self.day = None
 
         self.is_xy = "xy" in self.filename or "XY" in self.filename
+        self.config_path = config_path or self.assay_type.config_path
         self._parse_config()
 
     def __repr__(self):
@@ -353,7 +666,7 @@ class ZantiksFile:
             return tuple(groups.upper())
 
     def _parse_config(self):
-        with open(self.assay_type.config_path, "rb") as f:
+        with open(self.config_path, "rb") as f:
             config = tomllib.load(f)
 
         file_idx = tuple(
@@ -367,23 +680,88 @@ class ZantiksFile:
             config["fish_used"]["files_prefix"] + config["fish_used"]["files"][file_idx]
         )
 
+    def genotype_table(self) -> pl.DataFrame:
+        # fish used data
+        with open(self.fish_used_path, "r") as f:
+            fish_used_data = f.readlines()
+        fish_used_data = np.asarray([line.split() for line in fish_used_data])
+        label_matrix = np.asarray(
+            [
+                "".join((letter, number))
+                for letter in ("A", "B", "C", "D", "E", "F", "G", "H")
+                for number in (
+                    "01",
+                    "02",
+                    "03",
+                    "04",
+                    "05",
+                    "06",
+                    "07",
+                    "08",
+                    "09",
+                    "10",
+                    "11",
+                    "12",
+                )
+            ]
+        ).reshape((8, 12))
+        wells_used = label_matrix[(fish_used_data == "x") | (fish_used_data == "X")]
+
+        # genotype data
+        with open(self.genotypes_path, "r") as f:
+            genotype_data = pl.read_csv(f, columns=("Well", "Cluster"))
+        genotype_data = genotype_data.with_columns(
+            pl.col("Well").str.extract(r"([A-H])").alias("row"),
+            pl.col("Well").str.extract(r"([0-9]+)").cast(int).alias("column"),
+        )
+        genotype_data = genotype_data.filter(pl.col("Well").is_in(wells_used))
+
+        arena_index = self.assay_type.arena_index(pl.col("row"), pl.col("column"))
+        if arena_index is not None:
+            return genotype_data.select(
+                arena_index.cast(pl.UInt32).alias("index"), "Cluster"
+            ).sort("index")
+
+        if self.counting_direction == "across":
+            genotype_data = genotype_data.sort("row", "column")
+        else:
+            genotype_data = genotype_data.sort("column", "row")
+
+        return genotype_data.with_row_index(offset=1).select("index", "Cluster")
+
 
 class ZantiksData:
-    def __init__(self, zantiks_file: ZantiksFile, use_genotypes: bool = True):
+    def __init__(
+        self,
+        zantiks_file: ZantiksFile,
+        use_genotypes: bool = True,
+        *,
+        cleaner: TrajectoryCleaner | None = None,
+    ):
         self.info = zantiks_file
+        if not zantiks_file.is_xy and not zantiks_file.assay_type.has_binned_data:
+            raise ValueError(
+                f"{zantiks_file.assay_type.name} has no binned data reader"
+            )
 
-        with open(zantiks_file.path, "r") as f:
-            if not zantiks_file.is_xy:
-                lines = f.readlines()
-                f = io.StringIO("".join(lines[3:-1]))
-            data = pl.read_csv(f)
         if zantiks_file.is_xy:
-            self.data = self._expand_arenas(data)
+            with profiling.span("read_csv", zantiks_file.filename):
+                data = read_position(zantiks_file.path)
         else:
-            self.data = zantiks_file.assay_type.make_tabular(data)
+            data = zantiks_file.assay_type.read_binned(zantiks_file.path)
+        if zantiks_file.is_xy:
+            with profiling.span("expand_arenas", zantiks_file.filename):
+                self.data = self._expand_arenas(data)
+            if cleaner is not None:
+                with profiling.span("clean", zantiks_file.filename):
+                    self.data = cleaner.clean(self.data)
+        else:
+            with profiling.span("make_tabular", zantiks_file.filename):
+                self.data = zantiks_file.assay_type.make_tabular(data)
 
         if use_genotypes:
-            self._attach_genotypes()
+            with profiling.span("attach_genotypes", zantiks_file.filename):
+                self._attach_genotypes()
             self.genotypes = True
         else:
             self.genotypes = None
@@ -392,11 +770,9 @@ class ZantiksData:
         return "\n" + str(self.genotypes) + "\n" + str(self.data)
 
     def _expand_zones_and_arenas(self, df: pl.DataFrame) -> pl.DataFrame:
-        pattern = re.compile(r"T\.A(\d+)\.Z(\d+)")
-
         long_df = df.unpivot(
             index=["TIME", "BIN_NUMBER"],
-            on=[col for col in df.columns if re.match(pattern, col)],
+            on=[col for col in df.columns if TIME_IN_ZONE_COLUMNS.match(col)],
             variable_name="ZONE_CODE",
             value_name="TIME_IN_ZONE",
         )
@@ -471,50 +847,11 @@ class ZantiksData:
         return result
 
     def _attach_genotypes(self) -> None:
-        # fish used data
-        with open(self.info.fish_used_path, "r") as f:
-            fish_used_data = f.readlines()
-        fish_used_data = np.asarray([line.split() for line in fish_used_data])
-        label_matrix = np.asarray(
-            [
-                "".join((letter, number))
-                for letter in ("A", "B", "C", "D", "E", "F", "G", "H")
-                for number in (
-                    "01",
-                    "02",
-                    "03",
-                    "04",
-                    "05",
-                    "06",
-                    "07",
-                    "08",
-                    "09",
-                    "10",
-                    "11",
-                    "12",
-                )
-            ]
-        ).reshape((8, 12))
-        wells_used = label_matrix[(fish_used_data == "x") | (fish_used_data == "X")]
-
-        # genotype data
-        with open(self.info.genotypes_path, "r") as f:
-            genotype_data = pl.read_csv(f, columns=("Well", "Cluster"))
-        genotype_data = genotype_data.with_columns(
-            pl.col("Well").str.extract(r"([A-H])").alias("row"),
-            pl.col("Well").str.extract(r"([0-9]+)").cast(int).alias("column"),
-        )
-        genotype_data = genotype_data.filter(pl.col("Well").is_in(wells_used))
-        if self.info.counting_direction == "across":
-            genotype_data = genotype_data.sort("row", "column")
-        else:
-            genotype_data = genotype_data.sort("column", "row")
-
-        genotype_data = genotype_data.with_row_index(offset=1).select(
-            "index", "Cluster"
-        )
         self.data = self.data.join(
-            genotype_data, left_on="ARENA", right_on="index", maintain_order="left"
+            self.info.genotype_table(),
+            left_on="ARENA",
+            right_on="index",
+            maintain_order="left",
         )
 
     def get_genotype(self, genotype: str | Iterable[str]) -> pl.DataFrame:
@@ -540,6 +877,25 @@ class DataLoader:
         groups: Iterable[str] | None = None,
         data_type: Literal["zantiks"] | Literal["position"] | None = None,
     ) -> Self:
+        self.add_by_name(
+            self.find_paths(
+                dates=dates,
+                assay_types=assay_types,
+                groups=groups,
+                data_type=data_type,
+            )
+        )
+
+        return self
+
+    def find_paths(
+        self,
+        *,
+        dates: Iterable[VariableDate] | None = None,
+        assay_types: Iterable[str] | None = None,
+        groups: Iterable[str] | None = None,
+        data_type: Literal["zantiks"] | Literal["position"] | None = None,
+    ) -> list[str]:
         pathglob = "**/"
 
         if groups:
@@ -564,17 +920,20 @@ class DataLoader:
 
         if pathglob[-1] != "*":
             pathglob += "*"
-        pathglob += ".csv"
+        pathglob += ".csv*"
 
-        matching_paths = glob.glob(pathglob, recursive=True)
+        with profiling.span("DataLoader.glob"):
+            matching_paths = [
+                path
+                for path in glob.glob(pathglob, recursive=True)
+                if strip_compression(path).endswith(".csv")
+            ]
         if data_type == "zantiks":
             matching_paths = [path for path in matching_paths if "xy" not in path]
         elif data_type == "position":
             matching_paths = [path for path in matching_paths if "xy" in path]
 
-        self.add_by_name(matching_paths)
-
-        return self
+        return sorted(matching_paths)
 
     def _iterable_glob(self, strings: Iterable[str]) -> str:
         if len(tuple(strings)) == 1:
@@ -597,8 +956,10 @@ class DataLoader:
 
     def load_all(self, *args, **kwargs) -> list[ZantiksData]:
         data = []
-        for zantiks_file in self.zantiks_files:
-            data.append(ZantiksData(zantiks_file, *args, **kwargs))
+        with profiling.span("DataLoader.load_all"):
+            for zantiks_file in self.zantiks_files:
+                with profiling.span("ZantiksData", zantiks_file.filename):
+                    data.append(ZantiksData(zantiks_file, *args, **kwargs))
 
         return data
 
@@ -6,6 +6,7 @@ app = marimo.App(width="medium", css_file="data/marimo.css")
 
 @app.cell
 def _():
+    import cache
     import data_utils
     import marimo as mo
     import matplotlib.pyplot as plt
@@ -13,7 +14,9 @@ def _():
     import os
     from PIL import Image
     from numpy.typing import NDArray
-    return Image, NDArray, data_utils, mo, np, os, plt
+
+    notebook_cache = cache.DiskCache()
+    return Image, NDArray, cache, data_utils, mo, notebook_cache, np, os, plt
 
 
 @app.cell
@@ -31,9 +34,13 @@ def _(Image, NDArray, np):
 
 
 @app.cell
-def _(load_arena, os):
+def _(load_arena, notebook_cache, os):
     arena_files = sorted(["data/arenas/" + filename for filename in filter(lambda s: s.endswith(".bmp"), os.listdir("data/arenas"))])
-    arena_images = {filename: load_arena(filename) for filename in arena_files}
+    arena_images = notebook_cache.get_or_compute(
+        "arena_images",
+        lambda: {filename: load_arena(filename) for filename in arena_files},
+        paths=arena_files,
+    )
     return arena_files, arena_images
 
 
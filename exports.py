@@ -0,0 +1,128 @@
+#!/usr/bin/env uv run
+
+import argparse
+import os
+
+import polars as pl
+import polars.selectors as cs
+
+import data_utils
+from cache import _write_atomic
+
+# analyze.R looks for exports here, so keep the two in sync
+EXPORT_DIRECTORY = "data/cache/arrow"
+
+# the col_types analyze.R gives read_csv for each assay, so the exports already
+# have the types it wants and it can use the memory mapped columns as they are
+COLUMN_TYPES = {
+    "developmental_delay": "di" + "d" * 96,
+    "light_dark_preference_3wpf": "dic" + "d" * 24,
+    "light_dark_preference_6dpf": "dic" + "d" * 24,
+    "light_dark_transition": "dci" + "d" * 96,
+    "mirror_biting": "di" + "d" * 60 + "i" * 60 + "d" * 60,
+    "sleep": "dci" + "d" * 96,
+    "social_preference": "di" + "d" * 50,
+    "startle_response": "ddc" + "d" * 48,
+    "ymaze_15": "dccici",
+    "ymaze_4": "dccici",
+}
+R_TYPES = {"d": pl.Float64(), "i": pl.Int32(), "c": pl.String()}
+
+
+def export_path(path: str, directory: str = EXPORT_DIRECTORY, kind: str = "") -> str:
+    # the export for a run mirrors where the run lives, like the tensor cache
+    stem = data_utils.strip_compression(path).removesuffix(".csv")
+    return f"{directory}/{stem}{kind}.arrow"
+
+
+def is_fresh(export: str, *source_paths: str) -> bool:
+    if not os.path.exists(export):
+        return False
+    modified = os.path.getmtime(export)
+    return all(modified >= os.path.getmtime(path) for path in source_paths)
+
+
+def _r_schema(columns: list[str], assay_name: str) -> dict[str, pl.DataType]:
+    # columns past the end of col_types are kept as doubles
+    column_types = COLUMN_TYPES[assay_name].ljust(len(columns), "d")
+    return {col: R_TYPES[t] for col, t in zip(columns, column_types)}
+
+
+def _has_r_schema(path: str, assay_name: str) -> bool:
+    # exports from before they had R's column types are written again
+    schema = pl.read_ipc_schema(path)
+    return schema == _r_schema(list(schema), assay_name)
+
+
+def _write_ipc(df: pl.DataFrame, path: str) -> None:
+    # uncompressed so R can memory map the columns instead of copying them
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, lambda temp_path: df.write_ipc(temp_path, compression=None))
+
+
+def export_binned(
+    zantiks_file: data_utils.ZantiksFile, directory: str = EXPORT_DIRECTORY
+) -> str:
+    # the table exactly as analyze.R reads it from the csv, preamble and footer
+    # already gone
+    path = export_path(zantiks_file.path, directory)
+    assay_name = zantiks_file.assay_type.name
+    if not is_fresh(path, zantiks_file.path) or not _has_r_schema(path, assay_name):
+        df = zantiks_file.assay_type.read_binned(zantiks_file.path)
+        _write_ipc(df.cast(_r_schema(df.columns, assay_name)), path)
+    return path
+
+
+def export_tabular(
+    zantiks_file: data_utils.ZantiksFile, directory: str = EXPORT_DIRECTORY
+) -> str:
+    # the long table with genotypes attached, for anything that wants the
+    # loader's output without python
+    path = export_path(zantiks_file.path, directory, ".tabular")
+    sources = (
+        zantiks_file.path,
+        zantiks_file.genotypes_path,
+        zantiks_file.fish_used_path,
+    )
+    if not is_fresh(path, *sources):
+        data = data_utils.ZantiksData(zantiks_file)
+        df = data.data.with_columns(
+            cs.categorical().cast(pl.String),
+            cs.integer().cast(pl.Int64),
+            cs.float().cast(pl.Float64),
+        )
+        _write_ipc(df, path)
+    return path
+
+
+def export_run(
+    zantiks_file: data_utils.ZantiksFile, directory: str = EXPORT_DIRECTORY
+) -> list[str]:
+    paths = [export_tabular(zantiks_file, directory)]
+    # analyze.R only reads the zantiks binned files this way
+    if not zantiks_file.is_xy and zantiks_file.assay_type.name != "microtracker":
+        paths.append(export_binned(zantiks_file, directory))
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export runs as arrow files")
+    parser.add_argument("--assay", action="append")
+    parser.add_argument("--output", default=EXPORT_DIRECTORY)
+    args = parser.parse_args()
+
+    for path in data_utils.DataLoader().find_paths(
+        assay_types=args.assay, data_type="zantiks"
+    ):
+        try:
+            zantiks_file = data_utils.ZantiksFile(path)
+        except (IndexError, KeyError):
+            continue  # not a zantiks run, e.g. genotypes.csv
+        if not zantiks_file.is_xy and not zantiks_file.assay_type.has_binned_data:
+            print(f"skipping {path}: no binned data reader")
+            continue
+        try:
+            for export in export_run(zantiks_file, args.output):
+                print(export)
+        except OSError as e:
+            print(f"skipping {path}: {e}")
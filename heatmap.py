@@ -1,18 +1,17 @@
 #!/usr/bin/env uv run
-import math
 import os
 from typing import Iterable
 
-import cv2
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 import polars as pl
 from numpy.typing import NDArray
-from PIL import Image
 from scipy import ndimage
 
+import arenas
 import data_utils
+import profiling
 
 mpl.rc("text", usetex=True)
 
@@ -27,78 +26,41 @@ class Heatmap:
         self.xy_data = data.get_genotype(genotypes)
         self.arena_ids = self.xy_data["ARENA"].unique().sort()
 
-        self.arena_map = self._load_image(data.info.assay_type.arena_bmp_path)
-        self.arena_mask = np.zeros(
-            (self.arena_map.shape[0], self.arena_map.shape[1])
-        ).astype(bool)
-        for arena in self.arena_ids:
-            self.arena_mask = self.arena_mask | self.get_arena_coords(arena - 1)
-
-        self.camera_params = self._load_camera_params(
-            data.info.assay_type.camera_parameters_path
-        )
+        with profiling.span("Heatmap.load_assets", self.info.filename):
+            self.arena_map = arenas.load_arena_image(
+                data.info.assay_type.arena_bmp_path
+            )
+            self.arena_mask = np.zeros(
+                (self.arena_map.shape[0], self.arena_map.shape[1])
+            ).astype(bool)
+            for arena in self.arena_ids:
+                self.arena_mask = self.arena_mask | self.get_arena_coords(arena - 1)
+
+            self.camera_params = arenas.load_camera_params(
+                data.info.assay_type.camera_parameters_path
+            )
 
         self.map = np.zeros_like(self.arena_mask).astype(float)
 
-    def _load_image(self, filepath: str) -> NDArray:
-        with open(filepath, "rb") as f:
-            image = np.asarray(Image.open(f))
-
-        cleaned_image = np.where(image < 8, 0, image)
-        return cleaned_image
-
-    def _load_camera_params(self, filepath: str):
-        camera_params = {}
-        with open(filepath, "rb") as f:
-            camera_params_file = np.load(f)
-            camera_params["rvec"] = camera_params_file["rvec"]
-            camera_params["tvec"] = camera_params_file["tvec"]
-            camera_params["mtx"] = camera_params_file["mtx"]
-            camera_params["dist"] = camera_params_file["dist"]
-
-        return camera_params
-
-    def _arena_color(self, arena: int) -> NDArray:
-        # fmt: off
-        color_cycle = np.asarray(((120, 120, 248),  # blue
-                                  (120, 248, 120),  # green
-                                  (120, 248, 248),  # cyan
-                                  (248, 120, 120),  # red
-                                  (248, 120, 248),  # pink
-                                  (248, 248, 120))) # yellow
-        # fmt: on
-        num_colors = 6
-        darken_by = 8
-
-        times_to_darken, color = divmod(arena, num_colors)
-        return color_cycle[color] - times_to_darken * darken_by
-
     def get_arena_coords(self, arena: int) -> NDArray[bool]:
-        return np.all(self.arena_map == self._arena_color(arena), axis=-1)
+        return np.all(self.arena_map == arenas.arena_color(arena), axis=-1)
 
     def make_map(self, *, show: bool = False, show_by_arena: bool = False) -> None:
-        for arena_id in self.arena_ids:
-            dirty_arena_points = (
-                self.xy_data.filter(pl.col("ARENA") == arena_id)
-                .select("X", "Y")
-                .to_numpy()
-                .astype(float)
-            )
-            dirty_3d_points = np.column_stack(
-                (dirty_arena_points, np.zeros(dirty_arena_points.shape[0]))
-            ).astype(np.float32)
-            arena_points = np.nan_to_num(
-                np.squeeze(
-                    cv2.projectPoints(
-                        dirty_3d_points,
-                        self.camera_params["rvec"],
-                        self.camera_params["tvec"],
-                        self.camera_params["mtx"],
-                        self.camera_params["dist"],
-                    )[0]  # first value is the points
-                )
-            )
-            self._process_arena(arena_points)
+        with profiling.span("Heatmap.make_map", self.info.filename):
+            for arena_id in self.arena_ids:
+                with profiling.span("filter_arena"):
+                    dirty_arena_points = (
+                        self.xy_data.filter(pl.col("ARENA") == arena_id)
+                        .select("X", "Y")
+                        .to_numpy()
+                        .astype(float)
+                    )
+                with profiling.span("project_points"):
+                    arena_points = arenas.project_points(
+                        dirty_arena_points, self.camera_params
+                    )
+                with profiling.span("accumulate"):
+                    self._process_arena(arena_points)
 
         if show:
             if show_by_arena:
@@ -108,10 +70,22 @@ class Heatmap:
                 self.show_whole_map()
 
     def _process_arena(self, arena_data: NDArray) -> NDArray:
-        for x, y in arena_data:
-            if x <= 0.0 and y <= 0.0 or x > self.map.shape[1] or y > self.map.shape[0]:
-                continue
-            self.map[math.floor(y), math.floor(x)] += 1
+        # dropouts project to (0, 0), and anything off the image is skipped
+        x, y = arena_data[:, 0], arena_data[:, 1]
+        keep = (
+            np.isfinite(x)
+            & np.isfinite(y)
+            & ~((x <= 0.0) & (y <= 0.0))
+            & (x >= 0.0)
+            & (x < self.map.shape[1])
+            & (y >= 0.0)
+            & (y < self.map.shape[0])
+        )
+        np.add.at(
+            self.map,
+            (np.floor(y[keep]).astype(int), np.floor(x[keep]).astype(int)),
+            1,
+        )
 
         return self.map
 
@@ -120,7 +94,8 @@ class Heatmap:
         masked_plot = np.ma.masked_array(self.map, mask=arena_coords)
         masked_plot[np.logical_not(arena_coords)] = 0.0
         plot_buffer = self.map.copy()
-        plot_buffer = ndimage.gaussian_filter(plot_buffer, sum_radius)
+        with profiling.span("gaussian_filter", self.info.filename):
+            plot_buffer = ndimage.gaussian_filter(plot_buffer, sum_radius)
 
         row_min, row_max, col_min, col_max = self._find_crop_coords(arena_coords)
         cropped_plot_buffer = plot_buffer[row_min:row_max, col_min:col_max]
@@ -137,15 +112,17 @@ class Heatmap:
         if self.info.day is not None:
             save_title += f"_{self.info.month}-{self.info.day}-{self.info.year}"
 
-        plt.figure(dpi=100)
-        plt.imshow(cropped_plot_buffer, cmap="viridis")
-        plt.imshow(cropped_masked_plot, cmap="binary")
-        plt.axis("off")
-        plt.savefig(
-            f"{directory}/{save_title}.png",
-            dpi=500,
-            bbox_inches="tight",
-        )
+        with profiling.span("render", self.info.filename):
+            plt.figure(dpi=100)
+            plt.imshow(cropped_plot_buffer, cmap="viridis")
+            plt.imshow(cropped_masked_plot, cmap="binary")
+            plt.axis("off")
+        with profiling.span("savefig", self.info.filename):
+            plt.savefig(
+                f"{directory}/{save_title}.png",
+                dpi=500,
+                bbox_inches="tight",
+            )
         plt.show()
 
     def _find_crop_coords(
@@ -191,7 +168,8 @@ class Heatmap:
         masked_plot = np.ma.masked_array(self.map, mask=self.arena_mask)
         masked_plot[np.logical_not(self.arena_mask)] = 0.0
         plot_buffer = self.map.copy()
-        plot_buffer = ndimage.gaussian_filter(plot_buffer, sum_radius)
+        with profiling.span("gaussian_filter", self.info.filename):
+            plot_buffer = ndimage.gaussian_filter(plot_buffer, sum_radius)
 
         plot_title = f"\\textbf{{{self.info.assay_type.pretty_name}}}"
         save_title = self.info.assay_type.name
@@ -202,23 +180,25 @@ class Heatmap:
             plot_title += f" {self.info.month}-{self.info.day}-{self.info.year}"
             save_title += f"_{self.info.month}-{self.info.day}-{self.info.year}"
 
-        plt.figure(dpi=100)
-        plt.title(plot_title)
-        im = plt.imshow(plot_buffer, cmap="viridis")
-        plt.imshow(masked_plot, cmap="binary")
-        plt.colorbar(
-            im, label="Frequency", orientation="vertical", shrink=0.805, aspect=13
-        )
-        plt.xticks([])
-        plt.yticks([])
-        plt.gca().set_xticklabels([])
-        plt.gca().set_yticklabels([])
-        plt.box(on=True)
-        plt.savefig(
-            f"data/figures/{save_title}.png",
-            dpi=500,
-            bbox_inches="tight",
-        )
+        with profiling.span("render", self.info.filename):
+            plt.figure(dpi=100)
+            plt.title(plot_title)
+            im = plt.imshow(plot_buffer, cmap="viridis")
+            plt.imshow(masked_plot, cmap="binary")
+            plt.colorbar(
+                im, label="Frequency", orientation="vertical", shrink=0.805, aspect=13
+            )
+            plt.xticks([])
+            plt.yticks([])
+            plt.gca().set_xticklabels([])
+            plt.gca().set_yticklabels([])
+            plt.box(on=True)
+        with profiling.span("savefig", self.info.filename):
+            plt.savefig(
+                f"data/figures/{save_title}.png",
+                dpi=500,
+                bbox_inches="tight",
+            )
         plt.show()
 
     def _format_groups(self) -> str | None:
@@ -0,0 +1,171 @@
+#!/usr/bin/env uv run
+
+import math
+import os
+from typing import Iterator
+
+import polars as pl
+
+import data_utils
+from cache import PositionCache
+from cleaning import DROPOUT, TrajectoryCleaner
+
+
+def compute_kinematics(
+    df: pl.DataFrame | pl.LazyFrame,
+    *,
+    freeze_speed: float = 1.0,
+    min_step: float = 0.05,
+) -> pl.DataFrame:
+    # steps touching a dropout are null instead of jumping to or from (0, 0)
+    lf = (
+        df.lazy()
+        .sort("ARENA", "RUNTIME")
+        .with_columns(
+            pl.when(DROPOUT).then(None).otherwise(pl.col("X")).alias("X"),
+            pl.when(DROPOUT).then(None).otherwise(pl.col("Y")).alias("Y"),
+        )
+        .filter(pl.col("X").is_not_null().any().over("ARENA"))
+        .with_columns(
+            pl.col("RUNTIME").diff().over("ARENA").alias("DT"),
+            pl.col("X").diff().over("ARENA").alias("DX"),
+            pl.col("Y").diff().over("ARENA").alias("DY"),
+        )
+        .with_columns(
+            (pl.col("DX") ** 2 + pl.col("DY") ** 2).sqrt().alias("DISTANCE"),
+        )
+        .with_columns(
+            (pl.col("DISTANCE") / pl.col("DT")).alias("SPEED"),
+            # heading is meaningless when the fish is sitting still
+            pl.when(pl.col("DISTANCE") > min_step)
+            .then(pl.arctan2(pl.col("DY"), pl.col("DX")))
+            .alias("HEADING"),
+        )
+        .with_columns(
+            (pl.col("SPEED").diff().over("ARENA") / pl.col("DT")).alias("ACCELERATION"),
+            # wrap to [-pi, pi) so a turn across the +x axis isn't a full circle
+            (
+                (pl.col("HEADING").diff().over("ARENA") + math.pi) % (2 * math.pi)
+                - math.pi
+            ).alias("TURN_ANGLE"),
+            (pl.col("SPEED") < freeze_speed).alias("FREEZING"),
+        )
+    )
+
+    return lf.select(
+        "RUNTIME",
+        "ARENA",
+        "X",
+        "Y",
+        "DISTANCE",
+        "SPEED",
+        "ACCELERATION",
+        "TURN_ANGLE",
+        "FREEZING",
+        *(col for col in lf.collect_schema().names() if col == "Cluster"),
+    ).collect()
+
+
+def freezing_bouts(kinematics: pl.DataFrame, min_duration: float = 2.0) -> pl.DataFrame:
+    # null speeds (dropouts) break a bout instead of extending it
+    return (
+        kinematics.with_columns(
+            pl.col("FREEZING").fill_null(False),
+        )
+        .with_columns(pl.col("FREEZING").rle_id().over("ARENA").alias("BOUT"))
+        .filter(pl.col("FREEZING"))
+        .group_by("ARENA", "BOUT")
+        .agg(
+            pl.col("RUNTIME").min().alias("START"),
+            pl.col("RUNTIME").max().alias("END"),
+            *([pl.col("Cluster").first()] if "Cluster" in kinematics.columns else []),
+        )
+        .with_columns((pl.col("END") - pl.col("START")).alias("DURATION"))
+        .filter(pl.col("DURATION") >= min_duration)
+        .sort("ARENA", "START")
+        .drop("BOUT")
+    )
+
+
+class ChunkedKinematics:
+    def __init__(
+        self,
+        zantiks_file: data_utils.ZantiksFile,
+        *,
+        arenas_per_chunk: int = 8,
+        use_genotypes: bool = True,
+        freeze_speed: float = 1.0,
+        min_step: float = 0.05,
+        cleaner: TrajectoryCleaner | None = None,
+    ):
+        if not zantiks_file.is_xy:
+            raise ValueError(f"{zantiks_file.filename} is not position data")
+
+        self.info = zantiks_file
+        self.arenas_per_chunk = arenas_per_chunk
+        self.freeze_speed = freeze_speed
+        self.min_step = min_step
+        self.cleaner = cleaner
+        self.genotypes = zantiks_file.genotype_table() if use_genotypes else None
+
+        self.scan = PositionCache().scan(zantiks_file.path)
+        self.arena_ids = sorted(
+            int(col[3:])
+            for col in self.scan.collect_schema().names()
+            if col.startswith("X_A")
+        )
+
+    def chunks(self) -> Iterator[pl.DataFrame]:
+        for start in range(0, len(self.arena_ids), self.arenas_per_chunk):
+            chunk_arenas = self.arena_ids[start : start + self.arenas_per_chunk]
+            # the run was converted to arrow once, so only the columns for
+            # these arenas are read and decompressed
+            wide = self.scan.select(
+                "RUNTIME",
+                *(f"X_A{arena}" for arena in chunk_arenas),
+                *(f"Y_A{arena}" for arena in chunk_arenas),
+            ).collect()
+            long_df = pl.concat(
+                [
+                    wide.select(
+                        "RUNTIME",
+                        ARENA=pl.lit(arena, dtype=pl.Int32),
+                        X=pl.col(f"X_A{arena}").cast(pl.Float64),
+                        Y=pl.col(f"Y_A{arena}").cast(pl.Float64),
+                    )
+                    for arena in chunk_arenas
+                ]
+            )
+            if self.cleaner is not None:
+                long_df = self.cleaner.clean(long_df)
+            if self.genotypes is not None:
+                long_df = long_df.join(
+                    self.genotypes,
+                    left_on="ARENA",
+                    right_on="index",
+                    maintain_order="left",
+                )
+
+            yield compute_kinematics(
+                long_df, freeze_speed=self.freeze_speed, min_step=self.min_step
+            )
+
+    def compute(self) -> pl.DataFrame:
+        return pl.concat(self.chunks())
+
+    def sink(self, directory: str) -> None:
+        # one parquet part per chunk so the full table never sits in memory,
+        # read it back with pl.scan_parquet(f"{directory}/*.parquet")
+        os.makedirs(directory, exist_ok=True)
+        for i, chunk in enumerate(self.chunks()):
+            chunk.write_parquet(f"{directory}/part-{i:03d}.parquet", compression="zstd")
+
+
+if __name__ == "__main__":
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("sleep",), data_type="position"
+    )
+    for zantiks_file in dataloader.zantiks_files:
+        kinematics = ChunkedKinematics(zantiks_file).compute()
+        print(kinematics)
+        print(freezing_bouts(kinematics))
@@ -0,0 +1,234 @@
+#!/usr/bin/env uv run
+
+import math
+import os
+from typing import Iterable, Self
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+import data_utils
+from arena_outline import PLATE_HEIGHT, PLATE_WIDTH
+from cleaning import DROPOUT
+
+# the finest level has 8 cells per mm and every level above it halves that,
+# down to 1 cell per 4 mm
+BASE_SCALE = 8.0
+NUM_LEVELS = 6
+
+
+def _pool(counts: NDArray) -> NDArray:
+    # sums each 2x2 block of cells, padding odd edges with empty cells
+    height, width = counts.shape[-2:]
+    padded = np.pad(counts, ((0, 0), (0, height % 2), (0, width % 2)))
+    return padded.reshape(
+        padded.shape[0], padded.shape[1] // 2, 2, padded.shape[2] // 2, 2
+    ).sum(axis=(2, 4))
+
+
+class OccupancyPyramid:
+    def __init__(
+        self,
+        counts: NDArray,
+        num_levels: int = NUM_LEVELS,
+        runs: tuple[str, ...] = (),
+    ):
+        # counts is (arena, row, column) at BASE_SCALE, arena 1 at index 0, and
+        # runs are the paths that were binned into it
+        self.runs = runs
+        self.levels = [counts]
+        for _ in range(num_levels - 1):
+            self.levels.append(_pool(self.levels[-1]))
+
+    @property
+    def num_arenas(self) -> int:
+        return self.levels[0].shape[0]
+
+    def scale(self, level: int) -> float:
+        return BASE_SCALE / 2**level
+
+    @classmethod
+    def from_data(cls, data: data_utils.ZantiksData, **kwargs) -> Self:
+        # every point of every arena is binned with one bincount
+        shape = (
+            math.ceil(PLATE_HEIGHT * BASE_SCALE),
+            math.ceil(PLATE_WIDTH * BASE_SCALE),
+        )
+        num_arenas = data.info.assay_type.total_arenas
+        points = (
+            data.data.filter(~DROPOUT)
+            .filter(pl.col("ARENA").is_between(1, num_arenas))
+            .select("ARENA", "X", "Y")
+            .to_numpy()
+        )
+        rows = np.clip(np.floor(points[:, 2] * BASE_SCALE).astype(int), 0, shape[0] - 1)
+        cols = np.clip(np.floor(points[:, 1] * BASE_SCALE).astype(int), 0, shape[1] - 1)
+        flat = ((points[:, 0].astype(int) - 1) * shape[0] + rows) * shape[1] + cols
+        counts = np.bincount(flat, minlength=num_arenas * shape[0] * shape[1])
+        return cls(
+            counts.reshape(num_arenas, *shape).astype(np.uint32),
+            runs=(data.info.path,),
+            **kwargs,
+        )
+
+    @classmethod
+    def cached(
+        cls,
+        zantiks_file: data_utils.ZantiksFile,
+        path: str | None = None,
+        data: data_utils.ZantiksData | None = None,
+    ) -> Self:
+        # data can be passed in when it's already loaded
+        if path is None:
+            path = cls.cache_path(zantiks_file)
+
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(
+            zantiks_file.path
+        ):
+            return cls.load(path)
+
+        if data is None:
+            data = data_utils.ZantiksData(zantiks_file, use_genotypes=False)
+        pyramid = cls.from_data(data)
+        pyramid.save(path)
+        return pyramid
+
+    @staticmethod
+    def cache_path(zantiks_file: data_utils.ZantiksFile) -> str:
+        path = data_utils.strip_compression(zantiks_file.path)
+        return f"data/cache/occupancy/{os.path.splitext(path)[0]}.npz"
+
+    def save(self, path: str) -> None:
+        # only the visited cells of the finest level are stored, the coarser
+        # levels are quicker to pool again than to read
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        counts = self.levels[0]
+        index = np.flatnonzero(counts)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temp_path,
+            shape=np.asarray(counts.shape),
+            index=index,
+            counts=counts.flat[index],
+            runs=np.asarray(self.runs, dtype=str),
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> Self:
+        with np.load(path) as f:
+            counts = np.zeros(tuple(f["shape"]), dtype=f["counts"].dtype)
+            counts.flat[f["index"]] = f["counts"]
+            runs = tuple(f["runs"].tolist()) if "runs" in f else ()
+        return cls(counts, runs=runs, **kwargs)
+
+    @classmethod
+    def combine(cls, pyramids: Iterable[Self]) -> Self:
+        # runs share the plate grid, so an assay is just the sum of its runs
+        pyramids = iter(pyramids)
+        first = next(pyramids)
+        total = first.levels[0].astype(np.uint64)
+        runs = first.runs
+        for pyramid in pyramids:
+            total[: pyramid.num_arenas] += pyramid.levels[0][: total.shape[0]]
+            runs += pyramid.runs
+        return cls(total, num_levels=len(first.levels), runs=runs)
+
+    def level_for(self, span: float, pixels: int) -> int:
+        # the coarsest level that still has a cell for every pixel across the
+        # view, so zoomed out views sum far fewer cells
+        for level in reversed(range(len(self.levels))):
+            if span * self.scale(level) >= pixels:
+                return level
+        return 0
+
+    def view(
+        self,
+        xlim: tuple[float, float] = (0.0, PLATE_WIDTH),
+        ylim: tuple[float, float] = (0.0, PLATE_HEIGHT),
+        *,
+        pixels: int = 512,
+        arenas: Iterable[int] | None = None,
+    ) -> tuple[NDArray, tuple[float, float, float, float]]:
+        # the counts inside the limits and their imshow extent in mm
+        xlim, ylim = sorted(xlim), sorted(ylim)
+        level = self.level_for(max(xlim[1] - xlim[0], ylim[1] - ylim[0]), pixels)
+        scale = self.scale(level)
+        counts = self.levels[level]
+        if arenas is not None:
+            counts = counts[[arena - 1 for arena in arenas]]
+
+        height, width = counts.shape[1:]
+        row_start = min(max(math.floor(ylim[0] * scale), 0), height)
+        row_stop = min(max(math.ceil(ylim[1] * scale), row_start + 1), height)
+        col_start = min(max(math.floor(xlim[0] * scale), 0), width)
+        col_stop = min(max(math.ceil(xlim[1] * scale), col_start + 1), width)
+        image = counts[:, row_start:row_stop, col_start:col_stop].sum(axis=0)
+        # y points down in the tracking, the same as rows in an image
+        extent = (
+            col_start / scale,
+            col_stop / scale,
+            row_stop / scale,
+            row_start / scale,
+        )
+        return image, extent
+
+
+class PyramidView:
+    def __init__(
+        self,
+        ax,
+        pyramid: OccupancyPyramid,
+        *,
+        arenas: Iterable[int] | None = None,
+        cmap: str = "magma",
+    ):
+        # redraws from the level that matches the zoom whenever the limits change
+        # in an interactive figure
+        from matplotlib.colors import LogNorm
+
+        self.ax = ax
+        self.pyramid = pyramid
+        self.arenas = None if arenas is None else tuple(arenas)
+        image, extent = self._view((0.0, PLATE_WIDTH), (PLATE_HEIGHT, 0.0))
+        self.image = ax.imshow(
+            np.ma.masked_equal(image, 0),
+            extent=extent,
+            cmap=cmap,
+            norm=LogNorm(),
+            interpolation="nearest",
+        )
+        ax.set_xlim(0.0, PLATE_WIDTH)
+        ax.set_ylim(PLATE_HEIGHT, 0.0)
+        ax.set_aspect("equal")
+        # matplotlib only keeps weak references to bound methods, so the
+        # lambdas keep the view alive for as long as the axes
+        ax.callbacks.connect("xlim_changed", lambda ax: self._update(ax))
+        ax.callbacks.connect("ylim_changed", lambda ax: self._update(ax))
+
+    def _view(self, xlim, ylim) -> tuple[NDArray, tuple]:
+        pixels = int(max(self.ax.bbox.width, self.ax.bbox.height))
+        return self.pyramid.view(xlim, ylim, pixels=pixels, arenas=self.arenas)
+
+    def _update(self, ax) -> None:
+        image, extent = self._view(ax.get_xlim(), ax.get_ylim())
+        self.image.set_data(np.ma.masked_equal(image, 0))
+        self.image.set_extent(extent)
+
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("light_dark_preference_3wpf",), data_type="position"
+    )
+    pyramid = OccupancyPyramid.combine(
+        OccupancyPyramid.cached(zantiks_file)
+        for zantiks_file in dataloader.zantiks_files
+    )
+    for level, counts in enumerate(pyramid.levels):
+        print(level, pyramid.scale(level), counts.shape)
+    fig, ax = plt.subplots(dpi=200)
+    PyramidView(ax, pyramid)
+    plt.show()
@@ -0,0 +1,174 @@
+#!/usr/bin/env uv run
+
+import math
+from typing import Iterable
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+import data_utils
+from tensors import ArenaTensor
+
+
+def _nanmean(values: NDArray, axis: int, keepdims: bool = False) -> NDArray:
+    # np.nanmean warns on every arena that was dropped for not moving
+    count = np.sum(~np.isnan(values), axis=axis, keepdims=keepdims)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nansum(values, axis=axis, keepdims=keepdims) / count
+
+
+class PeriEvent:
+    def __init__(
+        self,
+        data: data_utils.ZantiksData,
+        *,
+        before: float,
+        after: float,
+        marker_column: str | None = None,
+        onsets: str | Iterable[str] | None = None,
+    ):
+        # startle runs mark stimuli with PHASE, light/dark transitions with CONDITION
+        if marker_column is None:
+            marker_column = "PHASE" if "PHASE" in data.data.columns else "CONDITION"
+        if isinstance(onsets, str):
+            onsets = (onsets,)
+        if before <= 0 or after <= 0:
+            raise ValueError(
+                f"before and after must be positive, not {before}, {after}"
+            )
+
+        self.info = data.info
+        self.tensor = ArenaTensor.from_zantiks_data(
+            data, condition_column=marker_column
+        )
+        time = self.tensor.time
+        markers = self.tensor.condition
+        self.bin_width = float(np.median(np.diff(time)))
+
+        # an event is the first bin after the marker changes
+        event_idx = np.flatnonzero(markers[1:] != markers[:-1]) + 1
+        if onsets is not None:
+            event_idx = event_idx[np.isin(markers[event_idx], tuple(onsets))]
+        self.event_times = time[event_idx]
+        self.transitions = np.char.add(
+            np.char.add(markers[event_idx - 1], "->"), markers[event_idx]
+        )
+
+        # at least one bin on each side, even when a window is shorter than a
+        # bin (a 5 s startle window on 60 s bins)
+        num_before = max(1, math.ceil(before / self.bin_width - 1e-9))
+        num_after = max(1, math.ceil(after / self.bin_width - 1e-9))
+        self.offsets = np.arange(-num_before, num_after) * self.bin_width
+        self.responses = self._extract_windows(time, self.tensor.activity())
+
+    def _extract_windows(self, time: NDArray, activity: NDArray) -> NDArray:
+        # (arena, event, offset); samples that fall outside the run or on a
+        # missing bin are nan
+        sample_times = self.event_times[:, None] + self.offsets[None, :]
+        idx = np.searchsorted(time, sample_times - self.bin_width / 2)
+        clipped_idx = np.clip(idx, 0, time.shape[0] - 1)
+        valid = (idx < time.shape[0]) & (
+            np.abs(time[clipped_idx] - sample_times) < self.bin_width / 2
+        )
+        return np.where(valid[None, ...], activity[:, clipped_idx], np.nan)
+
+    def baseline(self) -> NDArray:
+        return _nanmean(self.responses[..., self.offsets < 0], axis=-1)
+
+    def normalized(self) -> NDArray:
+        return self.responses - self.baseline()[..., None]
+
+    def peaks(self) -> tuple[NDArray, NDArray]:
+        post_offsets = self.offsets[self.offsets >= 0]
+        post = self.normalized()[..., self.offsets >= 0]
+        missing = np.all(np.isnan(post), axis=-1)
+        peak_idx = np.argmax(np.where(np.isnan(post), -np.inf, post), axis=-1)
+
+        peak = np.take_along_axis(post, peak_idx[..., None], axis=-1)[..., 0]
+        peak_latency = np.where(missing, np.nan, post_offsets[peak_idx])
+        return peak, peak_latency
+
+    def _arena_frame(self) -> pl.DataFrame:
+        arenas = pl.DataFrame(
+            {"ARENA": np.arange(1, self.tensor.num_arenas + 1, dtype=np.int32)}
+        )
+        if self.tensor.genotypes is not None:
+            arenas = arenas.with_columns(
+                pl.Series("Cluster", self.tensor.genotypes).replace("", None)
+            )
+        return arenas
+
+    def summary(self) -> pl.DataFrame:
+        num_arenas, num_events = self.responses.shape[:2]
+        peak, peak_latency = self.peaks()
+        mean_response = _nanmean(self.normalized()[..., self.offsets >= 0], axis=-1)
+
+        df = pl.DataFrame(
+            {
+                "ARENA": np.repeat(
+                    np.arange(1, num_arenas + 1, dtype=np.int32), num_events
+                ),
+                "EVENT": np.tile(np.arange(num_events, dtype=np.int32), num_arenas),
+                "TRANSITION": np.tile(self.transitions, num_arenas),
+                "EVENT_TIME": np.tile(self.event_times, num_arenas),
+                "BASELINE": self.baseline().ravel(),
+                "PEAK": peak.ravel(),
+                "PEAK_LATENCY": peak_latency.ravel(),
+                "MEAN_RESPONSE": mean_response.ravel(),
+            }
+        )
+        # arenas dropped for not moving have no baseline at all
+        return (
+            df.join(self._arena_frame(), on="ARENA", how="left")
+            .fill_nan(None)
+            .filter(pl.col("BASELINE").is_not_null().any().over("ARENA"))
+        )
+
+    def habituation(self) -> pl.DataFrame:
+        peak = self.peaks()[0]
+        results = []
+        for transition in np.unique(self.transitions):
+            # repeats of the same stimulus in order, fit peak ~ repeat number
+            repeats = peak[:, self.transitions == transition]
+            valid = ~np.isnan(repeats)
+            repeat_num = np.where(valid, np.arange(repeats.shape[1]), np.nan)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                centered_x = repeat_num - _nanmean(repeat_num, axis=1, keepdims=True)
+                centered_y = repeats - _nanmean(repeats, axis=1, keepdims=True)
+                slope = np.nansum(centered_x * centered_y, axis=1) / np.nansum(
+                    centered_x**2, axis=1
+                )
+                ratio = repeats[:, -1] / repeats[:, 0]
+
+            results.append(
+                pl.DataFrame(
+                    {
+                        "ARENA": np.arange(1, peak.shape[0] + 1, dtype=np.int32),
+                        "TRANSITION": np.full(peak.shape[0], transition),
+                        "REPEATS": valid.sum(axis=1),
+                        "FIRST_PEAK": repeats[:, 0],
+                        "LAST_PEAK": repeats[:, -1],
+                        "HABITUATION_RATIO": ratio,
+                        "HABITUATION_SLOPE": slope,
+                    }
+                )
+            )
+
+        return (
+            pl.concat(results)
+            .join(self._arena_frame(), on="ARENA", how="left")
+            .fill_nan(None)
+            .filter(pl.col("REPEATS") > 0)
+            .sort("ARENA", "TRANSITION")
+        )
+
+
+if __name__ == "__main__":
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("light_dark_transition",), data_type="zantiks"
+    )
+    for zantiks_data in dataloader.load_all():
+        peri_event = PeriEvent(zantiks_data, before=30, after=60)
+        print(peri_event.summary())
+        print(peri_event.habituation())
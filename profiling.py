@@ -0,0 +1,217 @@
+import atexit
+import contextlib
+import csv
+import functools
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# set ZANTIKS_PROFILE=1 (or call enable()) to record spans, otherwise every span
+# is a shared no-op context manager
+ENV_VAR = "ZANTIKS_PROFILE"
+DIRECTORY_ENV_VAR = "ZANTIKS_PROFILE_DIR"
+
+_NULL_SPAN = contextlib.nullcontext()
+_enabled = False
+_trace_memory = False
+_records: list[dict] = []
+_stack: list["_Span"] = []
+
+
+class _Span:
+    __slots__ = ("name", "label", "path", "start", "saved_peak", "child_peak")
+
+    def __init__(self, name: str, label: str | None):
+        self.name = name
+        self.label = label
+
+    def __enter__(self):
+        parent_path = _stack[-1].path if _stack else ""
+        self.path = f"{parent_path};{self.name}" if parent_path else self.name
+        self.child_peak = 0
+        if _trace_memory:
+            # tracemalloc has one global peak, so save the parent's and restart it
+            self.saved_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        _stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        _stack.pop()
+
+        peak = 0
+        if _trace_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            if _stack:
+                parent = _stack[-1]
+                parent.child_peak = max(parent.child_peak, self.saved_peak, peak)
+
+        _records.append(
+            {
+                "path": self.path,
+                "name": self.name,
+                "label": self.label or "",
+                "depth": len(_stack),
+                "seconds": seconds,
+                "peak_traced_mb": peak / 2**20,
+                "max_rss_mb": _max_rss_mb(),
+            }
+        )
+        return False
+
+
+def _max_rss_mb() -> float:
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos reports bytes
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+def enable(*, trace_memory: bool = True, write_at_exit: bool = True) -> None:
+    global _enabled, _trace_memory
+    if _enabled:
+        return
+
+    _enabled = True
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if write_at_exit:
+        atexit.register(_write_at_exit)
+
+
+def disable() -> None:
+    global _enabled, _trace_memory
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_memory = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, label: str | None = None):
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, label)
+
+
+def profiled(name: str | None = None):
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, None):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def records() -> list[dict]:
+    return list(_records)
+
+
+def reset() -> None:
+    _records.clear()
+
+
+def summarize(span_records: list[dict] | None = None) -> list[dict]:
+    span_records = _records if span_records is None else span_records
+
+    totals: dict[str, dict] = {}
+    for record in span_records:
+        total = totals.setdefault(
+            record["path"],
+            {
+                "path": record["path"],
+                "calls": 0,
+                "seconds": 0.0,
+                "child_seconds": 0.0,
+                "peak_traced_mb": 0.0,
+                "max_rss_mb": 0.0,
+            },
+        )
+        total["calls"] += 1
+        total["seconds"] += record["seconds"]
+        total["peak_traced_mb"] = max(total["peak_traced_mb"], record["peak_traced_mb"])
+        total["max_rss_mb"] = max(total["max_rss_mb"], record["max_rss_mb"])
+
+    for path, total in totals.items():
+        parent_path = path.rpartition(";")[0]
+        if parent_path in totals:
+            totals[parent_path]["child_seconds"] += total["seconds"]
+
+    summary = []
+    for total in totals.values():
+        total["self_seconds"] = max(total["seconds"] - total.pop("child_seconds"), 0.0)
+        summary.append(total)
+
+    return sorted(summary, key=lambda total: total["path"])
+
+
+def write_report(directory: str | None = None) -> str:
+    if directory is None:
+        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        directory = os.environ.get(
+            DIRECTORY_ENV_VAR, f"data/profiles/{timestamp}-{os.getpid()}"
+        )
+    os.makedirs(directory, exist_ok=True)
+
+    with open(f"{directory}/spans.json", "w") as f:
+        json.dump(_records, f, indent=2)
+
+    summary = summarize()
+    with open(f"{directory}/summary.csv", "w", newline="") as f:
+        writer = csv.DictWriter(
+            f,
+            fieldnames=(
+                "path",
+                "calls",
+                "seconds",
+                "self_seconds",
+                "peak_traced_mb",
+                "max_rss_mb",
+            ),
+        )
+        writer.writeheader()
+        writer.writerows(summary)
+
+    # collapsed stacks in microseconds of self time, for flamegraph.pl/speedscope
+    with open(f"{directory}/flame.txt", "w") as f:
+        for total in summary:
+            f.write(f"{total['path']} {round(total['self_seconds'] * 1e6)}\n")
+
+    return directory
+
+
+def print_summary() -> None:
+    print(f"{'seconds':>10} {'self':>10} {'calls':>6} {'peak MB':>8}  span")
+    for total in summarize():
+        depth = total["path"].count(";")
+        name = total["path"].rpartition(";")[2]
+        print(
+            f"{total['seconds']:>10.4f} {total['self_seconds']:>10.4f} "
+            f"{total['calls']:>6} {total['peak_traced_mb']:>8.1f}  {'  ' * depth}{name}"
+        )
+
+
+def _write_at_exit() -> None:
+    if _records:
+        directory = write_report()
+        print(f"profile written to {directory}", file=sys.stderr)
+
+
+if os.environ.get(ENV_VAR, "") not in ("", "0"):
+    enable()
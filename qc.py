@@ -0,0 +1,296 @@
+#!/usr/bin/env uv run
+
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+import data_utils
+
+XY_PATTERN = re.compile(r"X_A(\d+)$")
+# the footer is the last line, so only this much of the end of a file is read
+TAIL_SIZE = 64 * 1024
+
+
+def _is_data_row(line: str, num_fields: int) -> bool:
+    fields = line.split(",")
+    if len(fields) != num_fields:
+        return False
+    try:
+        float(fields[0])
+    except ValueError:
+        return False
+    return True
+
+
+def _longest_runs(mask: NDArray[bool]) -> NDArray:
+    # longest run of True in each column of a (rows, columns) mask, without
+    # looping over columns: each row's run length is its distance from the last
+    # False row above it
+    if mask.shape[0] == 0:
+        return np.zeros(mask.shape[1], dtype=int)
+    idx = np.arange(mask.shape[0])[:, None]
+    last_false = np.maximum.accumulate(np.where(mask, -1, idx), axis=0)
+    return (idx - last_false).max(axis=0)
+
+
+def _ends_with_footer(columns: bytes, tail: bytes) -> bool:
+    # a file cut off mid-write ends on a data row, or part of one
+    if not tail.endswith(b"\n"):
+        return False
+    last_line = tail[tail.rfind(b"\n", 0, len(tail) - 1) + 1 :]
+    return not _is_data_row(last_line.decode().rstrip("\r\n"), columns.count(b",") + 1)
+
+
+def _read_tail(f: IO[bytes], path: str) -> bytes:
+    # plain files seek straight to the end, compressed ones are streamed
+    # through keeping only the end
+    if data_utils.strip_compression(path) == path:
+        f.seek(max(f.tell(), os.fstat(f.fileno()).st_size - TAIL_SIZE))
+        return f.read()
+    tail = b""
+    while block := f.read(1 << 20):
+        tail = (tail + block)[-TAIL_SIZE:]
+    return tail
+
+
+def has_footer(path: str) -> bool:
+    # the three line preamble and the column names, then the end of the file
+    with data_utils.open_data(path, "rb") as f:
+        header = [f.readline() for _ in range(4)]
+        tail = _read_tail(f, path)
+    return bool(tail) and _ends_with_footer(header[3], tail)
+
+
+def _arena_totals(df: pl.DataFrame, assay: data_utils.Assay) -> dict[int, float]:
+    # the same arena columns the loader and analyze.R take for this assay, or
+    # the number of events in each arena for event logs
+    pattern = assay.arena_column_pattern
+    if pattern is None:
+        events = df.group_by("ARENA").len().sort("ARENA")
+        return dict(zip(events["ARENA"], events["len"].cast(pl.Float64)))
+
+    arena_columns: dict[int, list[str]] = {}
+    for col in df.columns:
+        match = pattern.match(col)
+        if match:
+            arena_columns.setdefault(int(match[1]), []).append(col)
+    if not arena_columns:
+        return {}
+    totals = df.select(
+        pl.sum_horizontal(pl.col(cols).sum()).alias(str(arena))
+        for arena, cols in sorted(arena_columns.items())
+    ).row(0)
+    return dict(zip(sorted(arena_columns), totals))
+
+
+def check_binned(path: str, assay: data_utils.Assay) -> tuple[dict, pl.DataFrame]:
+    with data_utils.open_data(path, "rb") as f:
+        header = [f.readline() for _ in range(4)]
+        body = f.read()
+    columns = header[3]
+
+    # the footer, or a row cut off mid-write, isn't parsed
+    has_footer = bool(body) and _ends_with_footer(columns, body[-TAIL_SIZE:])
+    last_line = body.rfind(b"\n", 0, len(body) - 1) + 1
+    if has_footer or not _is_data_row(
+        body[last_line:].decode().rstrip("\r\n"), columns.count(b",") + 1
+    ):
+        body = body[:last_line]
+    df = pl.read_csv(columns + body)
+
+    arena_totals = _arena_totals(df, assay)
+    arena_ids = list(arena_totals)
+    totals = list(arena_totals.values())
+
+    per_arena = pl.DataFrame(
+        {
+            "ARENA": arena_ids,
+            "TOTAL": totals,
+            "ZERO_MOVEMENT": [total == 0 for total in totals],
+            "DROPOUT_FRACTION": [None] * len(arena_ids),
+            "LONGEST_DROPOUT": [None] * len(arena_ids),
+        },
+        schema={
+            "ARENA": pl.Int32,
+            "TOTAL": pl.Float64,
+            "ZERO_MOVEMENT": pl.Boolean,
+            "DROPOUT_FRACTION": pl.Float64,
+            "LONGEST_DROPOUT": pl.Float64,
+        },
+    )
+    time_column = "TIME" if "TIME" in df.columns else df.columns[0]
+    return {
+        "ROWS": df.height,
+        "HAS_FOOTER": has_footer,
+        "DURATION": _duration(df[time_column].to_numpy()),
+    }, per_arena
+
+
+def check_position(path: str) -> tuple[dict, pl.DataFrame]:
+    df = data_utils.read_position(path)
+    arena_ids = sorted(
+        int(match[1]) for col in df.columns if (match := XY_PATTERN.match(col))
+    )
+    runtime = df["RUNTIME"].to_numpy()
+
+    # (frame, arena) matrices, so every arena is checked at once
+    x = df.select(pl.col(f"X_A{arena}") for arena in arena_ids).to_numpy()
+    y = df.select(pl.col(f"Y_A{arena}") for arena in arena_ids).to_numpy()
+    x, y = x.astype(float), y.astype(float)
+    dropout = np.isnan(x) | np.isnan(y) | ((x == 0.0) & (y == 0.0))
+
+    frame_interval = float(np.median(np.diff(runtime))) if runtime.shape[0] > 1 else 0.0
+    # an arena that never tracked anything has an empty range, so it didn't move
+    moved = np.zeros(len(arena_ids), dtype=bool)
+    for coords in (x, y):
+        moved |= np.where(dropout, -np.inf, coords).max(axis=0, initial=-np.inf) > (
+            np.where(dropout, np.inf, coords).min(axis=0, initial=np.inf)
+        )
+
+    per_arena = pl.DataFrame(
+        {
+            "ARENA": arena_ids,
+            "TOTAL": (~dropout).sum(axis=0).astype(float),
+            "ZERO_MOVEMENT": ~moved,
+            "DROPOUT_FRACTION": dropout.mean(axis=0) if df.height else np.nan,
+            "LONGEST_DROPOUT": _longest_runs(dropout) * frame_interval,
+        },
+        schema={
+            "ARENA": pl.Int32,
+            "TOTAL": pl.Float64,
+            "ZERO_MOVEMENT": pl.Boolean,
+            "DROPOUT_FRACTION": pl.Float64,
+            "LONGEST_DROPOUT": pl.Float64,
+        },
+    )
+    return {
+        "ROWS": df.height,
+        "HAS_FOOTER": None,
+        "DURATION": _duration(runtime),
+    }, per_arena
+
+
+def _duration(time: NDArray) -> float | None:
+    if time.shape[0] == 0:
+        return None
+    return float(time[-1] - time[0])
+
+
+def assay_type_of(path: str) -> type[data_utils.Assay] | None:
+    # qc doesn't need genotypes, so runs that aren't in a config yet are checked
+    # too, and only the filename is parsed
+    filename = os.path.basename(path)
+    return data_utils.ZantiksFile.assay_types.get(filename.split("-")[0])
+
+
+def check_file(path: str) -> tuple[dict, pl.DataFrame | None]:
+    run = {"PATH": path}
+    filename = os.path.basename(path)
+    assay_type = assay_type_of(path)
+    is_xy = "xy" in filename or "XY" in filename
+    run |= {
+        "ASSAY": assay_type().name,
+        "XY": is_xy,
+        "ARENAS_EXPECTED": assay_type().total_arenas,
+    }
+    try:
+        stats, per_arena = (
+            check_position(path) if is_xy else check_binned(path, assay_type())
+        )
+    except data_utils.DATA_ERRORS as e:
+        return run | {"ERROR": repr(e)}, None
+
+    run |= stats | {
+        "ARENAS_FOUND": per_arena.height,
+        "ZERO_MOVEMENT_ARENAS": int(per_arena["ZERO_MOVEMENT"].sum()),
+        "MAX_DROPOUT_FRACTION": per_arena["DROPOUT_FRACTION"].max(),
+        "LONGEST_DROPOUT": per_arena["LONGEST_DROPOUT"].max(),
+    }
+    return run, per_arena.with_columns(pl.lit(path).alias("PATH"))
+
+
+def scan(
+    paths: list[str],
+    *,
+    max_workers: int | None = None,
+    max_dropout: float = 10.0,
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    paths = [path for path in paths if assay_type_of(path) is not None]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(check_file, paths, chunksize=4))
+
+    runs = pl.DataFrame(
+        [run for run, _ in results],
+        schema={
+            "PATH": pl.String,
+            "ASSAY": pl.String,
+            "XY": pl.Boolean,
+            "ROWS": pl.Int64,
+            "DURATION": pl.Float64,
+            "HAS_FOOTER": pl.Boolean,
+            "ARENAS_EXPECTED": pl.Int64,
+            "ARENAS_FOUND": pl.Int64,
+            "ZERO_MOVEMENT_ARENAS": pl.Int64,
+            "MAX_DROPOUT_FRACTION": pl.Float64,
+            "LONGEST_DROPOUT": pl.Float64,
+            "ERROR": pl.String,
+        },
+    ).with_columns(
+        (
+            pl.col("ERROR").is_null()
+            & (pl.col("HAS_FOOTER") | pl.col("XY"))
+            & (pl.col("ARENAS_FOUND") == pl.col("ARENAS_EXPECTED"))
+            & (pl.col("ZERO_MOVEMENT_ARENAS") == 0)
+            & (pl.col("LONGEST_DROPOUT").fill_null(0.0) <= max_dropout)
+        ).alias("OK")
+    )
+
+    arena_frames = [per_arena for _, per_arena in results if per_arena is not None]
+    arenas = (
+        pl.concat(arena_frames).select("PATH", pl.exclude("PATH"))
+        if arena_frames
+        else pl.DataFrame()
+    )
+    return runs, arenas
+
+
+def run_qc(
+    paths: list[str],
+    *,
+    max_workers: int | None = None,
+    max_dropout: float = 10.0,
+    output: str = "data/qc",
+) -> pl.DataFrame:
+    runs, arenas = scan(paths, max_workers=max_workers, max_dropout=max_dropout)
+
+    os.makedirs(output, exist_ok=True)
+    runs.write_csv(f"{output}/runs.csv")
+    arenas.write_csv(f"{output}/arenas.csv")
+    failed = runs.filter(~pl.col("OK"))
+    print(f"{failed.height} of {runs.height} runs need a look, see {output}/runs.csv")
+    if failed.height:
+        with pl.Config(tbl_rows=-1, fmt_str_lengths=80):
+            print(failed)
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check every run for problems")
+    parser.add_argument("--assay", action="append")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-dropout", type=float, default=10.0)
+    parser.add_argument("--output", default="data/qc")
+    args = parser.parse_args()
+
+    run_qc(
+        data_utils.DataLoader().find_paths(assay_types=args.assay),
+        max_workers=args.workers,
+        max_dropout=args.max_dropout,
+        output=args.output,
+    )
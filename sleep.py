@@ -11,15 +11,30 @@ def _():
     import polars as pl
     import seaborn as sns
 
+    import cache
+    import circadian
     import data_utils
-    return data_utils, mo, pl, plt, sns
+    import stitching
+
+    notebook_cache = cache.DiskCache()
+    return cache, circadian, data_utils, mo, notebook_cache, pl, plt, sns, stitching
 
 
 @app.cell
-def _(data_utils):
+def _(data_utils, notebook_cache):
     sleep_config = data_utils.ConfigParser().parse("configs/jip3_test/6dpf/sleep.toml")
     sleep_files = [data_utils.ZantiksFile(sleep_config.data.files_prefix + path) for path in sleep_config.data.files]
-    sleep_data = [data_utils.ZantiksData(sleep_file) for sleep_file in sleep_files]
+    # genotyping changes invalidate the cache too, not just the runs
+    sleep_data = notebook_cache.get_or_compute(
+        "sleep_data",
+        lambda: [data_utils.ZantiksData(sleep_file) for sleep_file in sleep_files],
+        paths=[
+            path
+            for sleep_file in sleep_files
+            for path in (sleep_file.path, sleep_file.genotypes_path, sleep_file.fish_used_path)
+        ],
+        counting_directions=[sleep_file.counting_direction for sleep_file in sleep_files],
+    )
     return sleep_config, sleep_data, sleep_files
 
 
@@ -52,13 +67,25 @@ def _(make_plot, sleep_data):
     return (sleep_datum,)
 
 
-app._unparsable_cell(
-    r"""
+@app.cell
+def _(data_utils, make_plot, sleep_data, stitching):
     def make_combined_plot(data: list[data_utils.ZantiksData]) -> None:
-    
-    """,
-    name="_"
-)
+        # runs split over several files are stitched into one timeline per
+        # plate, so the hours carry on across files
+        for stitched_run in stitching.StitchedRun.group(data):
+            make_plot(stitched_run.data, " + ".join(stitched_run.filenames))
+
+    make_combined_plot(sleep_data)
+    return (make_combined_plot,)
+
+
+@app.cell
+def _(circadian, sleep_data, stitching):
+    # period, amplitude, phase after lights on and activity onset/offset, in
+    # hours; files of one plate are stitched so a split run is one row per fish
+    rhythms = circadian.CircadianRhythms(stitching.StitchedRun.group(sleep_data))
+    rhythms.per_genotype()
+    return (rhythms,)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+#!/usr/bin/env uv run
+
+from typing import Iterable
+
+import polars as pl
+
+import data_utils
+from stitching import StitchedRun
+
+
+class SleepBouts:
+    def __init__(
+        self,
+        data: data_utils.ZantiksData
+        | StitchedRun
+        | Iterable[data_utils.ZantiksData | StitchedRun],
+        *,
+        inactivity_threshold: float = 0.0,
+        min_bout: float = 60.0,
+    ):
+        if isinstance(data, (data_utils.ZantiksData, StitchedRun)):
+            data = (data,)
+
+        self.inactivity_threshold = inactivity_threshold
+        self.min_bout = min_bout
+        self.activity = self._combine_runs(data)
+        self.bins = self._mark_bouts(self.activity)
+        self.bouts = self._collect_bouts(self.bins)
+
+    def _combine_runs(
+        self, data: Iterable[data_utils.ZantiksData | StitchedRun]
+    ) -> pl.DataFrame:
+        runs = []
+        for datum in data:
+            if not isinstance(datum.info.assay_type, data_utils.Sleep):
+                raise ValueError(f"{datum.info.filename} is not sleep data")
+
+            genotype = ("Cluster",) if "Cluster" in datum.data.columns else ()
+            runs.append(
+                datum.data.group_by("BIN_NUM", "ARENA")
+                .agg(
+                    pl.first("TIME"),
+                    pl.first("CONDITION"),
+                    *(pl.first(col) for col in genotype),
+                    pl.sum("DISTANCE"),
+                )
+                .with_columns(pl.lit(datum.info.filename).alias("RUN"))
+            )
+
+        return pl.concat(runs, how="diagonal").sort("RUN", "ARENA", "BIN_NUM")
+
+    def _mark_bouts(self, activity: pl.DataFrame) -> pl.DataFrame:
+        by_arena = ("RUN", "ARENA")
+        return (
+            activity.with_columns(
+                (pl.col("DISTANCE") <= self.inactivity_threshold).alias("INACTIVE"),
+                pl.col("TIME").diff().median().over("RUN").alias("BIN_WIDTH"),
+                (pl.col("TIME") - pl.col("TIME").min().over("RUN")).alias("ELAPSED"),
+            )
+            # bouts are split at lights on/off so each one has a single condition
+            .with_columns(
+                pl.struct("INACTIVE", "CONDITION")
+                .rle_id()
+                .over(by_arena)
+                .alias("RUN_ID")
+            )
+            .with_columns(
+                (pl.len().over(*by_arena, "RUN_ID") * pl.col("BIN_WIDTH")).alias(
+                    "RUN_LENGTH"
+                )
+            )
+            .with_columns(
+                (pl.col("INACTIVE") & (pl.col("RUN_LENGTH") >= self.min_bout)).alias(
+                    "ASLEEP"
+                ),
+                (pl.col("ELAPSED") // 3600).cast(pl.Int32).alias("HOUR"),
+            )
+        )
+
+    def _collect_bouts(self, bins: pl.DataFrame) -> pl.DataFrame:
+        genotype = ("Cluster",) if "Cluster" in bins.columns else ()
+        return (
+            bins.filter(pl.col("ASLEEP"))
+            .group_by("RUN", "ARENA", "RUN_ID")
+            .agg(
+                pl.first("CONDITION"),
+                *(pl.first(col) for col in genotype),
+                pl.min("ELAPSED").alias("START"),
+                pl.first("HOUR"),
+                pl.first("RUN_LENGTH").alias("DURATION"),
+            )
+            .drop("RUN_ID")
+            .sort("RUN", "ARENA", "START")
+        )
+
+    def per_arena(self) -> pl.DataFrame:
+        genotype = ("Cluster",) if "Cluster" in self.bins.columns else ()
+        by_condition = ("RUN", "ARENA", *genotype, "CONDITION")
+
+        # every arena/condition pair shows up, even ones that never slept
+        condition_starts = self.bins.group_by(by_condition).agg(
+            pl.min("ELAPSED").alias("CONDITION_START"),
+            (pl.len() * pl.first("BIN_WIDTH")).alias("CONDITION_LENGTH"),
+        )
+        bout_stats = self.bouts.group_by(by_condition).agg(
+            pl.len().alias("BOUT_COUNT"),
+            pl.sum("DURATION").alias("TOTAL_SLEEP"),
+            pl.mean("DURATION").alias("MEAN_BOUT_LENGTH"),
+            pl.min("START").alias("FIRST_BOUT"),
+        )
+
+        return (
+            condition_starts.join(bout_stats, on=by_condition, how="left")
+            .with_columns(
+                pl.col("BOUT_COUNT").fill_null(0),
+                pl.col("TOTAL_SLEEP").fill_null(0.0),
+                (pl.col("FIRST_BOUT") - pl.col("CONDITION_START")).alias("LATENCY"),
+            )
+            .with_columns(
+                (pl.col("TOTAL_SLEEP") / pl.col("CONDITION_LENGTH") * 100).alias(
+                    "PERCENT_ASLEEP"
+                )
+            )
+            .select(
+                *by_condition,
+                "BOUT_COUNT",
+                "TOTAL_SLEEP",
+                "MEAN_BOUT_LENGTH",
+                "LATENCY",
+                "PERCENT_ASLEEP",
+            )
+            .sort("RUN", "ARENA", "CONDITION")
+        )
+
+    def per_hour(self) -> pl.DataFrame:
+        genotype = ("Cluster",) if "Cluster" in self.bins.columns else ()
+        by_hour = ("RUN", "ARENA", *genotype, "HOUR")
+
+        sleep_time = self.bins.group_by(by_hour).agg(
+            pl.first("CONDITION"),
+            (pl.col("ASLEEP").sum() * pl.first("BIN_WIDTH")).alias("TOTAL_SLEEP"),
+            pl.sum("DISTANCE"),
+        )
+        bout_counts = self.bouts.group_by(by_hour).agg(pl.len().alias("BOUT_COUNT"))
+
+        return (
+            sleep_time.join(bout_counts, on=by_hour, how="left")
+            .with_columns(pl.col("BOUT_COUNT").fill_null(0))
+            .sort("RUN", "ARENA", "HOUR")
+        )
+
+
+if __name__ == "__main__":
+    sleep_config = data_utils.ConfigParser().parse("configs/jip3_test/6dpf/sleep.toml")
+    sleep_files = [
+        data_utils.ZantiksFile(sleep_config.data.files_prefix + path)
+        for path in sleep_config.data.files
+    ]
+    sleep_bouts = SleepBouts(
+        [data_utils.ZantiksData(sleep_file) for sleep_file in sleep_files]
+    )
+    print(sleep_bouts.per_arena())
+    print(sleep_bouts.per_hour())
@@ -0,0 +1,275 @@
+#!/usr/bin/env uv run
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+GENOTYPES = ("WT", "HET", "HOM")
+# columns that identify a fish rather than measure it
+ID_COLUMNS = (
+    "ARENA",
+    "index",
+    "WELL",
+    "MINUTE",
+    "BIN_NUM",
+    "Cluster",
+    "genotype",
+    "RUN",
+)
+# columns that split a fish's rows into conditions, events or hours; each level
+# gets its own comparison instead of being averaged together
+LEVEL_COLUMNS = ("CONDITION", "TRANSITION", "HOUR", "EVENT", "EVENT_TIME")
+# resamples are drawn in fixed size chunks, each with its own seed, so the
+# results are the same however many workers there are
+CHUNK_SIZE = 1000
+
+
+def _permutation_differences(
+    values: NDArray, in_a: NDArray[bool], strata: list[NDArray], resamples: int, rng
+) -> NDArray:
+    # genotype labels are only shuffled within a clutch, so differences between
+    # clutches can't show up as a genotype effect
+    order = np.tile(np.arange(values.shape[0]), (resamples, 1))
+    for stratum in strata:
+        order[:, stratum] = rng.permuted(order[:, stratum], axis=1)
+
+    shuffled = in_a[order]
+    num_a = in_a.sum()
+    sum_a = shuffled @ values
+    return sum_a / num_a - (values.sum() - sum_a) / (values.shape[0] - num_a)
+
+
+def _bootstrap_differences(
+    values: NDArray, in_a: NDArray[bool], strata: list[NDArray], resamples: int, rng
+) -> NDArray:
+    # fish are resampled within each genotype and clutch, so every resample has
+    # the same design as the experiment
+    sums = np.zeros((2, resamples))
+    for stratum in strata:
+        for i, members in enumerate((stratum[in_a[stratum]], stratum[~in_a[stratum]])):
+            if members.shape[0] == 0:
+                continue
+            picks = rng.integers(0, members.shape[0], (resamples, members.shape[0]))
+            sums[i] += values[members][picks].sum(axis=1)
+
+    num_a = in_a.sum()
+    return sums[0] / num_a - sums[1] / (values.shape[0] - num_a)
+
+
+def _resample(
+    task: tuple[NDArray, NDArray[bool], list[NDArray], int, np.random.SeedSequence],
+) -> tuple[NDArray, NDArray]:
+    values, in_a, strata, resamples, seed = task
+    rng = np.random.default_rng(seed)
+    return (
+        _permutation_differences(values, in_a, strata, resamples, rng),
+        _bootstrap_differences(values, in_a, strata, resamples, rng),
+    )
+
+
+def _hedges_g(a: NDArray, b: NDArray) -> float:
+    num_a, num_b = a.shape[0], b.shape[0]
+    if num_a < 2 or num_b < 2:
+        return float("nan")
+    pooled = np.sqrt(
+        ((num_a - 1) * a.var(ddof=1) + (num_b - 1) * b.var(ddof=1))
+        / (num_a + num_b - 2)
+    )
+    if pooled == 0.0:
+        return float("nan")
+    # small sample correction on top of cohen's d
+    return float((a.mean() - b.mean()) / pooled * (1 - 3 / (4 * (num_a + num_b) - 9)))
+
+
+class GenotypeStats:
+    def __init__(
+        self,
+        summary: pl.DataFrame,
+        *,
+        metrics: list[str] | None = None,
+        genotype_column: str | None = None,
+        clutch_column: str | None = None,
+        resamples: int = 10000,
+        confidence: float = 0.95,
+        seed: int = 0,
+        max_workers: int | None = None,
+    ):
+        # takes python summaries (Cluster, FILE) as well as analyze.R output
+        # (genotype, clutch)
+        self.genotype_column = genotype_column or (
+            "Cluster" if "Cluster" in summary.columns else "genotype"
+        )
+        self.clutch_column = clutch_column or next(
+            (col for col in ("clutch", "Clutch", "FILE") if col in summary.columns),
+            None,
+        )
+        self.levels = [col for col in LEVEL_COLUMNS if col in summary.columns]
+        self.metrics = metrics or [
+            col
+            for col, dtype in summary.schema.items()
+            if dtype.is_numeric()
+            and col not in ID_COLUMNS
+            and col not in self.levels
+            and col != self.clutch_column
+        ]
+        self.resamples = resamples
+        self.confidence = confidence
+        self.seed = seed
+        self.max_workers = max_workers
+        self.fish = self._per_fish(summary)
+
+    def _per_fish(self, summary: pl.DataFrame) -> pl.DataFrame:
+        # repeated rows of a fish within a level (several bouts, several runs of
+        # one clutch) are averaged so each fish is counted once per level; an
+        # arena is only the same fish within one run
+        clutch = pl.col(self.clutch_column) if self.clutch_column else pl.lit("")
+        summary = summary.with_columns(clutch.cast(pl.String).alias("_CLUTCH"))
+        if "ARENA" in summary.columns:
+            run = ("RUN",) if "RUN" in summary.columns else ()
+            fish = ("_CLUTCH", *run, "ARENA")
+            summary = (
+                summary.group_by(*fish, self.genotype_column, *self.levels)
+                .agg(pl.mean(self.metrics))
+                .sort(*self.levels, *fish)
+            )
+        return summary.filter(pl.col(self.genotype_column).is_in(GENOTYPES))
+
+    def _level_groups(self) -> list[tuple[dict, pl.DataFrame]]:
+        if not self.levels:
+            return [({}, self.fish)]
+        groups = self.fish.partition_by(self.levels, as_dict=True)
+        # missing levels (e.g. no TRANSITION in some rows) sort last
+        order = sorted(groups, key=lambda key: [(v is None, v) for v in key])
+        return [(dict(zip(self.levels, key)), groups[key]) for key in order]
+
+    def _comparisons(self, fish: pl.DataFrame) -> list[tuple[str, str]]:
+        present = set(fish[self.genotype_column])
+        return [
+            (a, b)
+            for b, a in itertools.combinations(GENOTYPES, 2)
+            if a in present and b in present
+        ]
+
+    def compare(self) -> pl.DataFrame:
+        cases = []
+        tasks = []
+        root_seed = np.random.SeedSequence(self.seed)
+        for level, group in self._level_groups():
+            for metric, (a, b) in itertools.product(
+                self.metrics, self._comparisons(group)
+            ):
+                fish = group.filter(
+                    pl.col(self.genotype_column).is_in((a, b))
+                    & pl.col(metric).is_finite()
+                )
+                values = fish[metric].cast(pl.Float64).to_numpy()
+                in_a = (fish[self.genotype_column] == a).to_numpy()
+                clutches = fish["_CLUTCH"].to_numpy()
+                strata = [np.flatnonzero(clutches == c) for c in np.unique(clutches)]
+
+                chunks = [
+                    min(CHUNK_SIZE, self.resamples - start)
+                    for start in range(0, self.resamples, CHUNK_SIZE)
+                ]
+                if in_a.all() or not in_a.any():
+                    chunks = []  # nothing to compare, reported with just the counts
+                cases.append((level, metric, a, b, values, in_a, len(chunks)))
+                tasks += [
+                    (values, in_a, strata, size, root_seed.spawn(1)[0])
+                    for size in chunks
+                ]
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            results = iter(executor.map(_resample, tasks))
+            rows = []
+            for level, metric, a, b, values, in_a, num_chunks in cases:
+                chunk_results = [next(results) for _ in range(num_chunks)]
+                if not chunk_results:
+                    row = self._row(metric, a, b, values, in_a, None, None)
+                else:
+                    permuted = np.concatenate([r[0] for r in chunk_results])
+                    bootstrapped = np.concatenate([r[1] for r in chunk_results])
+                    row = self._row(metric, a, b, values, in_a, permuted, bootstrapped)
+                rows.append(level | row)
+
+        return pl.DataFrame(
+            rows,
+            schema={col: self.fish.schema[col] for col in self.levels}
+            | {
+                "METRIC": pl.String,
+                "COMPARISON": pl.String,
+                "N_A": pl.Int64,
+                "N_B": pl.Int64,
+                "MEAN_A": pl.Float64,
+                "MEAN_B": pl.Float64,
+                "DIFFERENCE": pl.Float64,
+                "HEDGES_G": pl.Float64,
+                "CI_LOW": pl.Float64,
+                "CI_HIGH": pl.Float64,
+                "P_VALUE": pl.Float64,
+            },
+        )
+
+    def _row(
+        self,
+        metric: str,
+        a: str,
+        b: str,
+        values: NDArray,
+        in_a: NDArray[bool],
+        permuted: NDArray | None,
+        bootstrapped: NDArray | None,
+    ) -> dict:
+        values_a, values_b = values[in_a], values[~in_a]
+        row = {
+            "METRIC": metric,
+            "COMPARISON": f"{a} vs {b}",
+            "N_A": values_a.shape[0],
+            "N_B": values_b.shape[0],
+        }
+        if permuted is None or bootstrapped is None:
+            return row
+
+        difference = values_a.mean() - values_b.mean()
+        tail = (1 - self.confidence) / 2
+        # ties with the observed difference count as extreme, allowing for
+        # rounding, and the +1 counts the observed labelling as a permutation
+        extreme = np.sum(np.abs(permuted) >= np.abs(difference) - 1e-12)
+        return row | {
+            "MEAN_A": values_a.mean(),
+            "MEAN_B": values_b.mean(),
+            "DIFFERENCE": difference,
+            "HEDGES_G": _hedges_g(values_a, values_b),
+            "CI_LOW": np.quantile(bootstrapped, tail),
+            "CI_HIGH": np.quantile(bootstrapped, 1 - tail),
+            "P_VALUE": (extreme + 1) / (permuted.shape[0] + 1),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare genotypes in a summary")
+    parser.add_argument("summary", help="csv from cli.py summarize or analyze.R")
+    parser.add_argument("--metric", action="append", default=None)
+    parser.add_argument("--resamples", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="csv path")
+    args = parser.parse_args()
+
+    results = GenotypeStats(
+        pl.read_csv(args.summary),
+        metrics=args.metric,
+        resamples=args.resamples,
+        seed=args.seed,
+        max_workers=args.workers,
+    ).compare()
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        results.write_csv(args.output)
+    with pl.Config(tbl_rows=-1, tbl_cols=-1):
+        print(results)
@@ -0,0 +1,162 @@
+#!/usr/bin/env uv run
+
+import datetime
+import os
+from functools import cached_property
+from typing import Iterable, Self
+
+import polars as pl
+
+import data_utils
+
+
+def run_start(zantiks_file: data_utils.ZantiksFile) -> datetime.datetime | None:
+    # zantiks names runs <assay>-YYYYMMDDTHHMMSS, other exports aren't dated
+    parts = data_utils.strip_compression(zantiks_file.filename).split("-")
+    if len(parts) < 2:
+        return None
+    try:
+        return datetime.datetime.strptime(parts[1][:15], "%Y%m%dT%H%M%S")
+    except ValueError:
+        return None
+
+
+def plate_key(zantiks_file: data_utils.ZantiksFile) -> tuple:
+    # the same fish in the same wells, however many files the run was split into
+    return (
+        zantiks_file.assay_type.name,
+        zantiks_file.groups,
+        zantiks_file.is_xy,
+        os.path.realpath(zantiks_file.genotypes_path),
+        os.path.realpath(zantiks_file.fish_used_path),
+        zantiks_file.counting_direction,
+    )
+
+
+def _time_column(df: pl.DataFrame) -> str:
+    return "TIME" if "TIME" in df.columns else "RUNTIME"
+
+
+def _bin_width(df: pl.DataFrame) -> float:
+    # every arena has a row per bin, so the width is the step between times
+    steps = df[_time_column(df)].unique().sort().diff().drop_nulls()
+    return float(steps.median()) if steps.len() else 0.0
+
+
+def _sort_key(datum: data_utils.ZantiksData) -> tuple:
+    return run_start(datum.info) or datetime.datetime.min, datum.info.path
+
+
+class StitchedRun:
+    def __init__(self, data: Iterable[data_utils.ZantiksData]):
+        # consecutive files of one plate as a single run; the columns of each
+        # file are chained, not copied, and only TIME and BIN_NUM are shifted
+        self.segments = sorted(data, key=_sort_key)
+        self.info = self.segments[0].info
+        # the segments share a plate_key, so genotypes are attached to all or none
+        self.genotypes = (
+            True if all(datum.genotypes for datum in self.segments) else None
+        )
+        self.time_offsets, self.bin_offsets = self._offsets()
+
+    def _offsets(self) -> tuple[list[float], list[int]]:
+        time_offsets: list[float] = []
+        bin_offsets: list[int] = []
+        first_start = run_start(self.info)
+        end_time = end_bin = None
+        for datum in self.segments:
+            df = datum.data
+            time = df[_time_column(df)]
+            width = _bin_width(df)
+
+            # each file carries on from where the last one stopped, or from
+            # when it was started if the clock says there was a gap
+            offset = 0.0
+            if end_time is not None:
+                offset = end_time + width - time.min()
+            start = run_start(datum.info)
+            if first_start is not None and start is not None:
+                offset = max(offset, (start - first_start).total_seconds())
+            time_offsets.append(offset)
+            end_time = time.max() + offset
+
+            bin_offset = 0
+            if "BIN_NUM" in df.columns:
+                bin_offset = round(offset / width) if width else 0
+                if end_bin is not None:
+                    bin_offset = max(bin_offset, end_bin + 1 - df["BIN_NUM"].min())
+                end_bin = df["BIN_NUM"].max() + bin_offset
+            bin_offsets.append(bin_offset)
+
+        return time_offsets, bin_offsets
+
+    @classmethod
+    def group(
+        cls, data: Iterable[data_utils.ZantiksData], *, max_gap: float = 3600.0
+    ) -> list[Self]:
+        # files of a plate are one run while each starts within max_gap seconds
+        # of the end of the one before
+        plates: dict[tuple, list[data_utils.ZantiksData]] = {}
+        for datum in data:
+            plates.setdefault(plate_key(datum.info), []).append(datum)
+
+        runs = []
+        for segments in plates.values():
+            segments.sort(key=_sort_key)
+            current = [segments[0]]
+            for datum in segments[1:]:
+                if cls._gap(current[-1], datum) > max_gap:
+                    runs.append(cls(current))
+                    current = []
+                current.append(datum)
+            runs.append(cls(current))
+        return runs
+
+    @staticmethod
+    def _gap(before: data_utils.ZantiksData, after: data_utils.ZantiksData) -> float:
+        start_before, start_after = run_start(before.info), run_start(after.info)
+        if start_before is None or start_after is None:
+            return 0.0
+        time = before.data[_time_column(before.data)]
+        duration = time.max() - time.min() + _bin_width(before.data)
+        return (start_after - start_before).total_seconds() - duration
+
+    @property
+    def lazy(self) -> pl.LazyFrame:
+        frames = []
+        for segment, (datum, time_offset, bin_offset) in enumerate(
+            zip(self.segments, self.time_offsets, self.bin_offsets)
+        ):
+            time_column = _time_column(datum.data)
+            shifted = [
+                pl.col(time_column) + time_offset,
+                pl.lit(segment, dtype=pl.Int32).alias("SEGMENT"),
+            ]
+            if "BIN_NUM" in datum.data.columns:
+                shifted.append(pl.col("BIN_NUM") + bin_offset)
+            frames.append(datum.data.lazy().with_columns(shifted))
+        # rechunk=False keeps each file's columns where they are
+        return pl.concat(frames, how="vertical", rechunk=False)
+
+    @cached_property
+    def data(self) -> pl.DataFrame:
+        # the same shape as ZantiksData.data, so with info and genotypes a
+        # stitched run can be passed to ArenaTensor and SleepBouts
+        return self.lazy.collect()
+
+    @property
+    def filenames(self) -> list[str]:
+        return [datum.info.filename for datum in self.segments]
+
+
+if __name__ == "__main__":
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("sleep",), data_type="zantiks"
+    )
+    for run in StitchedRun.group(dataloader.load_all()):
+        print(run.filenames, run.time_offsets, run.bin_offsets)
+        print(
+            run.lazy.group_by("CONDITION")
+            .agg(pl.sum("DISTANCE"), pl.min("TIME"), pl.max("TIME"))
+            .collect()
+        )
@@ -0,0 +1,192 @@
+#!/usr/bin/env uv run
+
+import sys
+
+import polars as pl
+
+import data_utils
+from cache import SummaryCache
+
+# seconds before/after each event for the peri-event summaries
+PERI_EVENT_WINDOWS = {
+    "light_dark_transition": (30.0, 60.0),
+    "startle_response": (5.0, 10.0),
+}
+
+
+def summary_name(zantiks_file: data_utils.ZantiksFile) -> str | None:
+    if zantiks_file.is_xy:
+        return "kinematics"
+    if isinstance(zantiks_file.assay_type, data_utils.MicroTracker):
+        return "microtracker"
+    if isinstance(zantiks_file.assay_type, data_utils.DevelopmentalDelay):
+        return "developmental_delay"
+    if isinstance(zantiks_file.assay_type, data_utils.Sleep):
+        return "sleep_bouts"
+    if zantiks_file.assay_type.name in PERI_EVENT_WINDOWS:
+        return "peri_event"
+    return None
+
+
+def _summary_params(
+    zantiks_file: data_utils.ZantiksFile,
+    name: str,
+    before: float | None,
+    after: float | None,
+) -> dict:
+    if name != "peri_event":
+        return {}
+
+    default_before, default_after = PERI_EVENT_WINDOWS[zantiks_file.assay_type.name]
+    return {
+        "before": default_before if before is None else before,
+        "after": default_after if after is None else after,
+    }
+
+
+def _compute_summary(
+    zantiks_file: data_utils.ZantiksFile, name: str, params: dict
+) -> pl.DataFrame:
+    if name == "kinematics":
+        import kinematics
+
+        # a few arenas at a time, so a long position file is never in memory
+        # all at once
+        return pl.concat(
+            chunk.group_by("ARENA", "Cluster").agg(
+                pl.sum("DISTANCE").alias("TOTAL_DISTANCE"),
+                pl.mean("SPEED").alias("MEAN_SPEED"),
+                pl.mean("FREEZING").alias("FRACTION_FREEZING"),
+            )
+            for chunk in kinematics.ChunkedKinematics(zantiks_file).chunks()
+        ).sort("ARENA")
+
+    datum = data_utils.ZantiksData(zantiks_file)
+    if name == "sleep_bouts":
+        import sleep_bouts
+
+        return sleep_bouts.SleepBouts(datum).per_arena()
+    elif name == "microtracker":
+        return (
+            datum.data.group_by("ARENA", "WELL", "Cluster")
+            .agg(pl.mean("ACTIVITY").alias("AVERAGE_ACTIVITY"))
+            .sort("ARENA")
+        )
+    elif name == "developmental_delay":
+        return (
+            datum.data.group_by("ARENA", "Cluster")
+            .agg(pl.sum("PIXEL_DIFFERENCE"))
+            .sort("ARENA")
+        )
+    elif name == "peri_event":
+        import peri_event
+
+        return peri_event.PeriEvent(datum, **params).summary()
+
+    raise ValueError(f"unknown summary {name}")
+
+
+def summarize_run(
+    zantiks_file: data_utils.ZantiksFile,
+    *,
+    cache: SummaryCache | None = None,
+    before: float | None = None,
+    after: float | None = None,
+) -> pl.DataFrame | None:
+    name = summary_name(zantiks_file)
+    if name is None:
+        return None
+
+    params = _summary_params(zantiks_file, name, before, after)
+    if cache is None:
+        return _compute_summary(zantiks_file, name, params)
+    return cache.get_or_compute(
+        zantiks_file, name, params, lambda: _compute_summary(zantiks_file, name, params)
+    )
+
+
+def config_files(config_path: str) -> list[data_utils.ZantiksFile]:
+    config = data_utils.ConfigParser().parse(config_path)
+    return [
+        data_utils.ZantiksFile(
+            data_utils.resolve_path(config.data.files_prefix + path),
+            config_path,
+            data_utils.ZantiksFile.analysis_names.get(analysis_name),
+        )
+        for path, analysis_name in zip(config.data.files, config.data.assay_names)
+    ]
+
+
+def summarize_config(
+    config_path: str,
+    *,
+    cache: SummaryCache | None = None,
+    before: float | None = None,
+    after: float | None = None,
+) -> pl.DataFrame | None:
+    # None for configs of assays without a summary yet (light/dark preference,
+    # mirror biting, social preference, y-maze), which are skipped
+    summaries = []
+    skipped = set()
+    for zantiks_file in config_files(config_path):
+        summary = summarize_run(zantiks_file, cache=cache, before=before, after=after)
+        if summary is None:
+            skipped.add(zantiks_file.assay_type.pretty_name)
+            continue
+        summaries.append(summary.with_columns(pl.lit(zantiks_file.path).alias("FILE")))
+
+    if not summaries:
+        print(
+            f"skipping {config_path}: no summary for {', '.join(sorted(skipped))}",
+            file=sys.stderr,
+        )
+        return None
+    return pl.concat(summaries, how="diagonal_relaxed")
+
+
+def pool_wildtype(
+    summary: pl.DataFrame, wildtype_summary: pl.DataFrame
+) -> pl.DataFrame:
+    # same as analyze.R: every WT fish comes from the wild type config instead,
+    # which already includes the WT fish from the experimental runs
+    return pl.concat(
+        (
+            summary.filter(pl.col("Cluster") != "WT"),
+            wildtype_summary.filter(pl.col("Cluster") == "WT"),
+        ),
+        how="diagonal_relaxed",
+    )
+
+
+def summarize_with_wildtype(
+    config_path: str,
+    *,
+    cache: SummaryCache | None = None,
+    before: float | None = None,
+    after: float | None = None,
+) -> pl.DataFrame | None:
+    summary = summarize_config(config_path, cache=cache, before=before, after=after)
+    if summary is None:
+        return None
+
+    config = data_utils.ConfigParser().parse(config_path)
+    wildtype_path = config.data.get("wildtype_file", "")
+    if wildtype_path:
+        wildtype_summary = summarize_config(
+            wildtype_path, cache=cache, before=before, after=after
+        )
+        if wildtype_summary is not None:
+            summary = pool_wildtype(summary, wildtype_summary)
+
+    return summary.filter(pl.col("Cluster").is_in(("WT", "HET", "HOM")))
+
+
+if __name__ == "__main__":
+    summary_cache = SummaryCache()
+    print(
+        summarize_with_wildtype(
+            "configs/jip3_test/6dpf/light_dark_transition.toml", cache=summary_cache
+        )
+    )
+    summary_cache.save()
+    print(f"{summary_cache.hits} cached, {summary_cache.misses} computed")
@@ -0,0 +1,276 @@
+#!/usr/bin/env uv run
+
+import argparse
+import math
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+from PIL import Image
+
+import arenas
+import data_utils
+
+# size of plate in mm is 127.76 x 85.4
+PLATE_WIDTH = 127.76
+PLATE_HEIGHT = 85.4
+PIXELS_PER_MM = 10
+
+# names analyze.R uses for each assay, except the two that aren't recorded by
+# a zantiks camera and can't be synthesized
+ANALYSIS_NAMES = {
+    assay_name: analysis_name
+    for analysis_name, assay_name in data_utils.ZantiksFile.analysis_names.items()
+    if assay_name not in ("developmental_delay", "microtracker")
+}
+
+
+@dataclass
+class SyntheticRun:
+    assay: str
+    path: str
+    xy_path: str
+    config_path: str
+
+
+class SyntheticArchive:
+    def __init__(
+        self,
+        root: str,
+        *,
+        num_arenas: int | None = None,
+        duration: float = 3600.0,
+        bin_seconds: float = 60.0,
+        xy_hz: float = 25.0,
+        dropout_rate: float = 0.01,
+        date: str = "20250101T090000",
+        seed: int = 0,
+    ):
+        self.root = root
+        self.num_arenas = num_arenas
+        self.duration = duration
+        self.bin_seconds = bin_seconds
+        self.xy_hz = xy_hz
+        self.dropout_rate = dropout_rate
+        self.date = date
+        self.rng = np.random.default_rng(seed)
+
+    def write_all(self) -> list[SyntheticRun]:
+        # only the assays that are tracked on a zantiks plate
+        return [self.write_assay(assay_name) for assay_name in ANALYSIS_NAMES]
+
+    def write_assay(self, assay_name: str, group: str = "zantiks_a") -> SyntheticRun:
+        assay = data_utils.ZantiksFile.assay_types[assay_name]()
+        num_arenas = min(self.num_arenas or assay.total_arenas, assay.total_arenas)
+        year, month, day = self.date[:4], self.date[4:6], self.date[6:8]
+
+        day_directory = f"data/{year}/{month}/{day}"
+        run_directory = f"{day_directory}/{assay_name}/{group}"
+        os.makedirs(f"{self.root}/{run_directory}", exist_ok=True)
+        run_path = f"{run_directory}/{assay_name}-{self.date}.csv"
+        xy_path = f"{run_directory}/{assay_name}-{self.date}-xy.csv"
+
+        self._write_binned(f"{self.root}/{run_path}", assay, num_arenas)
+        self._write_xy(f"{self.root}/{xy_path}", assay, num_arenas)
+        self._write_genotypes(f"{self.root}/{day_directory}/genotypes.csv")
+        self._write_fish_used(
+            f"{self.root}/{day_directory}/fish_used_{num_arenas}.txt", num_arenas
+        )
+        self._write_arena_assets(assay)
+
+        config_path = f"configs/synthetic/{assay_name}.toml"
+        self._write_config(
+            f"{self.root}/{config_path}",
+            assay_name,
+            run_path,
+            f"{day_directory}/genotypes.csv",
+            f"{day_directory}/fish_used_{num_arenas}.txt",
+        )
+        return SyntheticRun(assay_name, run_path, xy_path, config_path)
+
+    def _layout(self, total_arenas: int) -> tuple[int, int]:
+        # arenas are laid out in a grid with the same aspect ratio as the plate
+        cols = math.ceil(math.sqrt(total_arenas * PLATE_WIDTH / PLATE_HEIGHT))
+        rows = math.ceil(total_arenas / cols)
+        return rows, cols
+
+    def _arena_boxes(self, total_arenas: int) -> NDArray:
+        # (x_min, y_min, x_max, y_max) in mm, with a 1 mm wall between arenas
+        rows, cols = self._layout(total_arenas)
+        width, height = PLATE_WIDTH / cols, PLATE_HEIGHT / rows
+        row, col = np.divmod(np.arange(total_arenas), cols)
+        return np.column_stack(
+            (
+                col * width + 1,
+                row * height + 1,
+                (col + 1) * width - 1,
+                (row + 1) * height - 1,
+            )
+        )
+
+    def _write_binned(
+        self, path: str, assay: data_utils.Assay, num_arenas: int
+    ) -> None:
+        num_bins = int(self.duration // self.bin_seconds)
+        time = np.arange(num_bins) * self.bin_seconds
+        bin_num = np.arange(1, num_bins + 1)
+
+        # fish rest in about a quarter of bins, more when it is dark
+        cycle = self._condition_cycle(assay)
+        condition = np.where((time // cycle) % 2 == 0, "BRIGHT", "DARK")
+        resting = (
+            self.rng.random((num_bins, num_arenas, 2))
+            < np.where(condition == "DARK", 0.5, 0.25)[:, None, None]
+        )
+        distance = self.rng.gamma(
+            2.0, 0.01 * self.bin_seconds, (num_bins, num_arenas, 2)
+        )
+        distance = np.round(np.where(resting, 0.0, distance), 3)
+
+        columns = {"TIME": time}
+        if isinstance(assay, data_utils.StartleResponse):
+            phase = np.full(num_bins, "REST", dtype="U8")
+            phase[(bin_num % 20) == 10] = "PREPULSE"
+            phase[(bin_num % 20) == 11] = "STARTLE"
+            columns |= {"BIN_NUM": bin_num, "PHASE": phase}
+            columns |= {
+                f"A{arena + 1}": distance[:, arena].sum(axis=-1)
+                for arena in range(num_arenas)
+            }
+        else:
+            columns |= {"CONDITION": condition, "BIN_NUM": bin_num}
+            columns |= {
+                f"A{arena + 1}_Z{zone + 1}": distance[:, arena, zone]
+                for arena in range(num_arenas)
+                for zone in range(2)
+            }
+
+        with open(path, "w") as f:
+            f.write(f"Zantiks synthetic data,{assay.name}\n")
+            f.write(f"Started,{self.date}\n")
+            f.write(f"Arenas,{num_arenas}\n")
+            pl.DataFrame(columns).write_csv(f)
+            f.write("END\n")
+
+    def _condition_cycle(self, assay: data_utils.Assay) -> float:
+        if isinstance(assay, data_utils.Sleep):
+            return 12 * 3600.0
+        return 600.0
+
+    def _write_xy(self, path: str, assay: data_utils.Assay, num_arenas: int) -> None:
+        num_frames = int(self.duration * self.xy_hz)
+        boxes = self._arena_boxes(assay.total_arenas)[:num_arenas]
+        size = boxes[:, 2:] - boxes[:, :2]
+
+        # random walk folded back into each arena so fish bounce off the walls
+        steps = self.rng.normal(0.0, 0.3, (num_frames, num_arenas, 2))
+        walk = np.cumsum(steps, axis=0) + self.rng.random((num_arenas, 2)) * size
+        walk = np.abs(np.mod(walk, 2 * size) - size)
+        positions = np.round(boxes[:, :2] + walk, 2)
+
+        # lost tracking shows up as (0, 0)
+        lost = self.rng.random((num_frames, num_arenas)) < self.dropout_rate
+        positions[lost] = 0.0
+
+        columns = {"RUNTIME": np.round(np.arange(num_frames) / self.xy_hz, 3)}
+        for arena in range(num_arenas):
+            columns[f"X_A{arena + 1}"] = positions[:, arena, 0]
+            columns[f"Y_A{arena + 1}"] = positions[:, arena, 1]
+        pl.DataFrame(columns).write_csv(path)
+
+    def _write_genotypes(self, path: str) -> None:
+        wells = [f"{row}{col:02d}" for row in "ABCDEFGH" for col in range(1, 13)]
+        pl.DataFrame(
+            {
+                "Well": wells,
+                "Cluster": self.rng.choice(("WT", "HET", "HOM"), len(wells)),
+                "Clutch": self.rng.choice((1, 2), len(wells)),
+            }
+        ).write_csv(path)
+
+    def _write_fish_used(self, path: str, num_arenas: int) -> None:
+        # arenas are counted down the plate, then right
+        used = np.zeros(96, dtype=bool)
+        used[:num_arenas] = True
+        used = used.reshape((12, 8)).T
+        with open(path, "w") as f:
+            for row in used:
+                f.write(" ".join("x" if well else "O" for well in row) + "\n")
+
+    def _write_arena_assets(self, assay: data_utils.Assay) -> None:
+        os.makedirs(f"{self.root}/data/arenas", exist_ok=True)
+        os.makedirs(f"{self.root}/data/camera_params", exist_ok=True)
+
+        image = np.zeros(
+            (
+                math.ceil(PLATE_HEIGHT * PIXELS_PER_MM),
+                math.ceil(PLATE_WIDTH * PIXELS_PER_MM),
+                3,
+            ),
+            dtype=np.uint8,
+        )
+        boxes = np.round(self._arena_boxes(assay.total_arenas) * PIXELS_PER_MM)
+        for arena, (x_min, y_min, x_max, y_max) in enumerate(boxes.astype(int)):
+            image[y_min:y_max, x_min:x_max] = arenas.arena_color(arena)
+        Image.fromarray(image).save(f"{self.root}/{assay.arena_bmp_path}")
+
+        # a camera looking straight down, so mm map directly onto pixels
+        np.savez_compressed(
+            f"{self.root}/{assay.camera_parameters_path}",
+            mtx=np.asarray(
+                ((PIXELS_PER_MM, 0.0, 0.0), (0.0, PIXELS_PER_MM, 0.0), (0.0, 0.0, 1.0))
+            ),
+            dist=np.zeros((1, 5)),
+            rvec=np.zeros((3, 1)),
+            tvec=np.asarray(((0.0,), (0.0,), (1.0,))),
+        )
+
+    def _write_config(
+        self,
+        path: str,
+        assay_name: str,
+        run_path: str,
+        genotypes_path: str,
+        fish_used_path: str,
+    ) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(
+                "[data]\n"
+                'files_prefix = ""\n'
+                f'files = ["{run_path}"]\n'
+                f'assay_names = ["{ANALYSIS_NAMES[assay_name]}"]\n'
+                "\n"
+                "[genotypes]\n"
+                'files_prefix = ""\n'
+                f'files = ["{genotypes_path}"]\n'
+                'counting_directions = ["down"]\n'
+                "\n"
+                "[fish_used]\n"
+                'files_prefix = ""\n'
+                f'files = ["{fish_used_path}"]\n'
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic Zantiks runs")
+    parser.add_argument("root")
+    parser.add_argument("--arenas", type=int, default=None)
+    parser.add_argument("--duration", type=float, default=3600.0)
+    parser.add_argument("--bin-seconds", type=float, default=60.0)
+    parser.add_argument("--xy-hz", type=float, default=25.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    archive = SyntheticArchive(
+        args.root,
+        num_arenas=args.arenas,
+        duration=args.duration,
+        bin_seconds=args.bin_seconds,
+        xy_hz=args.xy_hz,
+        seed=args.seed,
+    )
+    for run in archive.write_all():
+        print(run)
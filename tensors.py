@@ -0,0 +1,220 @@
+#!/usr/bin/env uv run
+
+import os
+from typing import Iterable, Self
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+import data_utils
+
+
+class ArenaTensor:
+    # arena and zone numbers are 1-indexed in the data, so index i holds arena i + 1
+    def __init__(
+        self,
+        values: NDArray,
+        time: NDArray,
+        bin_num: NDArray,
+        condition: NDArray,
+        genotypes: NDArray | None = None,
+    ):
+        self.values = values
+        self.time = time
+        self.bin_num = bin_num
+        self.condition = condition
+        self.genotypes = genotypes
+
+    def __repr__(self):
+        return f"ArenaTensor(arenas={self.num_arenas}, zones={self.num_zones}, bins={self.num_bins})"
+
+    @property
+    def num_arenas(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def num_zones(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def num_bins(self) -> int:
+        return self.values.shape[2]
+
+    @classmethod
+    def from_zantiks_data(
+        cls,
+        data: data_utils.ZantiksData,
+        value_column: str = "DISTANCE",
+        condition_column: str = "CONDITION",
+    ) -> Self:
+        if data.info.is_xy:
+            raise ValueError(f"{data.info.filename} is position data, not binned data")
+
+        bin_column = "BIN_NUM" if "BIN_NUM" in data.data.columns else "TIME"
+        df = data.data.with_columns(
+            (pl.col(bin_column).rank("dense") - 1).cast(pl.Int64).alias("BIN_IDX")
+        )
+        num_zones = df["ZONE"].max()
+        num_bins = df["BIN_IDX"].max() + 1
+
+        # every arena gets a slot, even ones that were dropped for not moving, so
+        # runs of the same assay always line up
+        values = np.full(
+            (data.info.assay_type.total_arenas, num_zones, num_bins), np.nan
+        )
+        values[
+            df["ARENA"].to_numpy() - 1,
+            df["ZONE"].to_numpy() - 1,
+            df["BIN_IDX"].to_numpy(),
+        ] = df[value_column].to_numpy()
+
+        bins = (
+            df.group_by("BIN_IDX")
+            .agg(
+                pl.first("TIME"),
+                pl.first(bin_column).alias("BIN_NUM"),
+                pl.first(condition_column).alias("CONDITION"),
+            )
+            .sort("BIN_IDX")
+        )
+
+        genotypes = None
+        if data.genotypes:
+            arena_genotypes = df.group_by("ARENA").agg(pl.first("Cluster")).drop_nulls()
+            clusters = arena_genotypes["Cluster"].to_numpy().astype(str)
+            # sized to the longest genotype name so none are cut short
+            genotypes = np.full(
+                data.info.assay_type.total_arenas, "", dtype=clusters.dtype
+            )
+            genotypes[arena_genotypes["ARENA"].to_numpy() - 1] = clusters
+
+        return cls(
+            values,
+            bins["TIME"].to_numpy(),
+            bins["BIN_NUM"].to_numpy(),
+            bins["CONDITION"].to_numpy().astype(str),
+            genotypes,
+        )
+
+    @classmethod
+    def cached(
+        cls,
+        zantiks_file: data_utils.ZantiksFile,
+        use_genotypes: bool = True,
+        directory: str | None = None,
+    ) -> Self:
+        if directory is None:
+            directory = cls.cache_path(zantiks_file)
+
+        if cls._is_fresh(directory, zantiks_file, use_genotypes):
+            return cls.load(directory)
+
+        tensor = cls.from_zantiks_data(
+            data_utils.ZantiksData(zantiks_file, use_genotypes=use_genotypes)
+        )
+        tensor.save(directory)
+        return tensor
+
+    @staticmethod
+    def cache_path(zantiks_file: data_utils.ZantiksFile) -> str:
+        path = data_utils.strip_compression(zantiks_file.path)
+        return f"data/cache/tensors/{os.path.splitext(path)[0]}"
+
+    @staticmethod
+    def _is_fresh(
+        directory: str, zantiks_file: data_utils.ZantiksFile, use_genotypes: bool
+    ) -> bool:
+        values_path = f"{directory}/values.npy"
+        if not os.path.exists(values_path):
+            return False
+        # regenotyping or changing the wells in use moves fish between genotypes
+        sources = [zantiks_file.path]
+        if use_genotypes:
+            if not os.path.exists(f"{directory}/genotypes.npy"):
+                return False
+            sources += [zantiks_file.genotypes_path, zantiks_file.fish_used_path]
+        modified = os.path.getmtime(values_path)
+        return all(modified >= os.path.getmtime(source) for source in sources)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        np.save(f"{directory}/time.npy", self.time)
+        np.save(f"{directory}/bin_num.npy", self.bin_num)
+        np.save(f"{directory}/condition.npy", self.condition)
+        if self.genotypes is not None:
+            np.save(f"{directory}/genotypes.npy", self.genotypes)
+        # written last so a partially written cache is never considered fresh
+        np.save(f"{directory}/values.npy", self.values)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> Self:
+        mmap_mode = "r" if mmap else None
+        genotypes_path = f"{directory}/genotypes.npy"
+        return cls(
+            np.load(f"{directory}/values.npy", mmap_mode=mmap_mode),
+            np.load(f"{directory}/time.npy"),
+            np.load(f"{directory}/bin_num.npy"),
+            np.load(f"{directory}/condition.npy"),
+            np.load(genotypes_path) if os.path.exists(genotypes_path) else None,
+        )
+
+    @staticmethod
+    def stack(tensors: Iterable["ArenaTensor"]) -> NDArray:
+        tensors = tuple(tensors)
+        num_bins = max(tensor.num_bins for tensor in tensors)
+        # runs can be different lengths, so pad the end of shorter runs
+        stacked = np.full(
+            (len(tensors), *tensors[0].values.shape[:2], num_bins), np.nan
+        )
+        for i, tensor in enumerate(tensors):
+            stacked[i, ..., : tensor.num_bins] = tensor.values
+
+        return stacked
+
+    def activity(self) -> NDArray:
+        # arenas with no data stay nan instead of summing to 0
+        return np.where(
+            np.all(np.isnan(self.values), axis=1),
+            np.nan,
+            np.nansum(self.values, axis=1),
+        )
+
+    def hour_index(self) -> NDArray:
+        return ((self.time - self.time[0]) // 3600).astype(int)
+
+    def hourly_sums(self) -> NDArray:
+        hours = self.hour_index()
+        hour_starts = np.flatnonzero(np.diff(hours, prepend=-1))
+        return np.add.reduceat(self.activity(), hour_starts, axis=-1)
+
+    def rolling_activity(self, window: int) -> NDArray:
+        activity = self.activity()
+        cumulative = np.cumsum(np.nan_to_num(activity), axis=-1)
+        cumulative = np.concatenate(
+            (np.zeros((activity.shape[0], 1)), cumulative), axis=-1
+        )
+        rolled = (cumulative[:, window:] - cumulative[:, :-window]) / window
+        rolled[np.isnan(activity[:, window - 1 :])] = np.nan
+        return rolled
+
+    def genotype_mask(self, genotype: str | Iterable[str]) -> NDArray[bool]:
+        if self.genotypes is None:
+            raise ValueError("tensor was built without genotypes")
+
+        if isinstance(genotype, str):
+            genotype = (genotype,)
+
+        return np.isin(self.genotypes, tuple(genotype))
+
+    def genotype_mean(self, genotype: str | Iterable[str]) -> NDArray:
+        return np.nanmean(self.activity()[self.genotype_mask(genotype)], axis=0)
+
+
+if __name__ == "__main__":
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("sleep",), data_type="zantiks"
+    )
+    for zantiks_file in dataloader.zantiks_files:
+        tensor = ArenaTensor.cached(zantiks_file)
+        print(tensor, tensor.genotype_mean("HOM"))
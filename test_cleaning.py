@@ -0,0 +1,48 @@
+#!/usr/bin/env uv run
+
+import polars as pl
+
+from cleaning import TrajectoryCleaner
+
+
+def _track(x: list[float]) -> pl.DataFrame:
+    # one arena at 10 fps moving along the x axis
+    return pl.DataFrame(
+        {
+            "ARENA": [1] * len(x),
+            "RUNTIME": [i / 10 for i in range(len(x))],
+            "X": x,
+            "Y": [5.0] * len(x),
+        }
+    )
+
+
+def test_single_frame_jump() -> None:
+    cleaned = TrajectoryCleaner().clean(_track([1.0, 1.5, 80.0, 2.5, 3.0]))
+    assert cleaned["JUMP"].to_list() == [False, False, True, False, False]
+
+
+def test_two_frame_jump() -> None:
+    cleaned = TrajectoryCleaner().clean(_track([1.0, 1.5, 80.0, 80.5, 2.5, 3.0]))
+    assert cleaned["JUMP"].to_list() == [False, False, True, True, False, False]
+    assert cleaned["X"].null_count() == 2
+
+
+def test_repeated_jumps() -> None:
+    # the fish between two excursions is kept
+    x = [1.0, 1.5, 80.0, 80.5, 2.5, 3.0, 80.0, 80.5, 4.0, 4.5]
+    cleaned = TrajectoryCleaner().clean(_track(x))
+    assert cleaned["JUMP"].arg_true().to_list() == [2, 3, 6, 7]
+
+
+def test_fast_movement_kept() -> None:
+    # 100 mm/s is under max_speed
+    cleaned = TrajectoryCleaner().clean(_track([1.0, 11.0, 21.0, 31.0]))
+    assert not cleaned["JUMP"].any()
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} ok")
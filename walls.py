@@ -0,0 +1,265 @@
+#!/usr/bin/env uv run
+
+import os
+from typing import Iterable, Self
+
+import cv2
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+import arenas
+import data_utils
+from arena_outline import PLATE_HEIGHT, PLATE_WIDTH
+
+# sides of an arena in the arena image; for mirrored arenas left and right are
+# swapped so a side means the same wall in every arena, like in canonical.py
+EDGES = ("left", "right", "top", "bottom")
+# a fish within this many mm of a wall is touching it
+CONTACT_DISTANCE = 2.0
+
+
+def _edge_pixels(mask: NDArray[bool], edge: str) -> NDArray[bool]:
+    # boundary pixels that face the given side and are on that half of the arena
+    padded = np.pad(mask, 1)
+    neighbor = {
+        "left": padded[1:-1, :-2],
+        "right": padded[1:-1, 2:],
+        "top": padded[:-2, 1:-1],
+        "bottom": padded[2:, 1:-1],
+    }[edge]
+    rows, cols = np.indices(mask.shape)
+    half = {
+        "left": cols < mask.shape[1] / 2,
+        "right": cols >= mask.shape[1] / 2,
+        "top": rows < mask.shape[0] / 2,
+        "bottom": rows >= mask.shape[0] / 2,
+    }[edge]
+    return mask & ~neighbor & half
+
+
+def _distance_to(seeds: NDArray[bool]) -> NDArray:
+    # euclidean distance in pixels from every pixel to the nearest seed
+    return cv2.distanceTransform(
+        (~seeds).astype(np.uint8), cv2.DIST_L2, cv2.DIST_MASK_PRECISE
+    )
+
+
+def pixels_per_mm(camera_params: dict[str, NDArray]) -> float:
+    # the plate's corners give the average scale of the arena image
+    corners = np.array(
+        (
+            (0.0, 0.0),
+            (PLATE_WIDTH, 0.0),
+            (0.0, PLATE_HEIGHT),
+            (PLATE_WIDTH, PLATE_HEIGHT),
+        )
+    )
+    projected = arenas.project_points(corners, camera_params)
+    across = np.linalg.norm(projected[1] - projected[0]) + np.linalg.norm(
+        projected[3] - projected[2]
+    )
+    down = np.linalg.norm(projected[2] - projected[0]) + np.linalg.norm(
+        projected[3] - projected[1]
+    )
+    return float((across / PLATE_WIDTH + down / PLATE_HEIGHT) / 4)
+
+
+class WallDistances:
+    def __init__(
+        self,
+        labels: NDArray,
+        fields: NDArray,
+        edges: tuple[str, ...],
+        camera_params: dict[str, NDArray],
+        *,
+        contact: float = CONTACT_DISTANCE,
+        batch_size: int = 2_000_000,
+    ):
+        # fields is (field, row, column) in mm: distance to the nearest wall of
+        # each pixel's own arena, then distance to each named edge
+        self.labels = labels
+        self.fields = fields
+        self.edges = edges
+        self.camera_params = camera_params
+        self.contact = contact
+        self.batch_size = batch_size
+
+    @property
+    def field_names(self) -> tuple[str, ...]:
+        return ("WALL", *(edge.upper() for edge in self.edges))
+
+    @classmethod
+    def build(
+        cls, assay: data_utils.Assay, edges: Iterable[str] = (), **kwargs
+    ) -> Self:
+        edges = tuple(edges)
+        labels = arenas.arena_labels(
+            arenas.load_arena_image(assay.arena_bmp_path), assay.total_arenas
+        )
+        camera_params = arenas.load_camera_params(assay.camera_parameters_path)
+
+        # each arena is transformed on its own padded crop, so a neighbouring
+        # arena's walls are never nearer than its own
+        fields = np.zeros((1 + len(edges), *labels.shape), dtype=np.float32)
+        for arena in range(1, assay.total_arenas + 1):
+            rows, cols = np.nonzero(labels == arena)
+            if rows.shape[0] == 0:
+                continue
+            crop = (
+                slice(max(rows.min() - 1, 0), rows.max() + 2),
+                slice(max(cols.min() - 1, 0), cols.max() + 2),
+            )
+            mask = labels[crop] == arena
+            layers = [_distance_to(~mask)]
+            for edge in edges:
+                if arena in assay.mirrored_arenas:
+                    edge = {"left": "right", "right": "left"}.get(edge, edge)
+                layers.append(_distance_to(_edge_pixels(mask, edge)))
+            for field, layer in zip(fields, layers):
+                field[crop][mask] = layer[mask]
+
+        fields /= pixels_per_mm(camera_params)
+        return cls(labels, fields, edges, camera_params, **kwargs)
+
+    @classmethod
+    def cached(
+        cls,
+        assay: data_utils.Assay,
+        edges: Iterable[str] = (),
+        path: str | None = None,
+        **kwargs,
+    ) -> Self:
+        # built once per assay, and again whenever its arenas are recalibrated
+        edges = tuple(edges)
+        if path is None:
+            path = cls.cache_path(assay, edges)
+
+        sources = (assay.arena_bmp_path, assay.camera_parameters_path)
+        if os.path.exists(path) and all(
+            os.path.getmtime(path) >= os.path.getmtime(source) for source in sources
+        ):
+            return cls.load(path, assay, **kwargs)
+
+        walls = cls.build(assay, edges, **kwargs)
+        walls.save(path)
+        return walls
+
+    @staticmethod
+    def cache_path(assay: data_utils.Assay, edges: tuple[str, ...] = ()) -> str:
+        return f"data/cache/walls/{'_'.join((assay.name, *edges))}.npz"
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temp_path,
+            labels=self.labels,
+            fields=self.fields,
+            edges=np.asarray(self.edges, dtype=str),
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, assay: data_utils.Assay, **kwargs) -> Self:
+        with np.load(path) as f:
+            labels, fields, edges = f["labels"], f["fields"], f["edges"]
+        return cls(
+            labels,
+            fields,
+            tuple(edges.tolist()),
+            arenas.load_camera_params(assay.camera_parameters_path),
+            **kwargs,
+        )
+
+    def lookup(self, points: NDArray) -> tuple[NDArray, NDArray]:
+        # the arena under each point and its distance to every field, (field, point)
+        labels = np.empty(points.shape[0], dtype=self.labels.dtype)
+        distances = np.empty((self.fields.shape[0], points.shape[0]), dtype=np.float32)
+        raster = np.concatenate((self.fields, self.labels[None].astype(np.float32)))
+        for start in range(0, points.shape[0], self.batch_size):
+            batch = points[start : start + self.batch_size]
+            pixel_points = arenas.project_points(batch, self.camera_params)
+            gathered = arenas.gather(raster, pixel_points, fill=np.nan)
+            distances[:, start : start + self.batch_size] = gathered[:-1]
+            labels[start : start + self.batch_size] = np.nan_to_num(gathered[-1])
+
+        # lost tracking isn't near or far from anything
+        lost = np.all(points == 0.0, axis=1) | np.any(np.isnan(points), axis=1)
+        labels[lost] = 0
+        return labels, distances
+
+    def measure(self, xy_data: pl.DataFrame) -> pl.DataFrame:
+        points = xy_data.select("X", "Y").to_numpy().astype(float)
+        labels, distances = self.lookup(points)
+
+        # points outside of their own arena have no distance, like zones
+        in_arena = labels == xy_data["ARENA"].to_numpy()
+        distances[:, ~in_arena] = np.nan
+        columns = [
+            pl.Series(f"{name}_DISTANCE", distance, dtype=pl.Float64).fill_nan(None)
+            for name, distance in zip(self.field_names, distances)
+        ]
+        return xy_data.with_columns(columns).with_columns(
+            (pl.col("WALL_DISTANCE") <= self.contact).alias("WALL_CONTACT")
+        )
+
+    def summarize(self, xy_data: pl.DataFrame) -> pl.DataFrame:
+        measured = self.measure(xy_data).sort("ARENA", "RUNTIME")
+
+        # each sample counts until the next one, the last gets the usual frame time
+        measured = measured.with_columns(
+            (pl.col("RUNTIME").shift(-1).over("ARENA") - pl.col("RUNTIME")).alias("DT")
+        ).with_columns(pl.col("DT").fill_null(pl.col("DT").median().over("ARENA")))
+
+        # samples off the arena are dropped first so a dropout doesn't count as
+        # leaving the wall and touching it again
+        measured = measured.drop_nulls("WALL_CONTACT")
+        contacts = (
+            measured.with_columns(
+                pl.col("WALL_CONTACT").rle_id().over("ARENA").alias("BOUT")
+            )
+            .group_by("ARENA", "BOUT")
+            .agg(pl.first("WALL_CONTACT"), pl.sum("DT"))
+            .filter(pl.col("WALL_CONTACT"))
+            .group_by("ARENA")
+            .agg(
+                pl.len().cast(pl.Int64).alias("WALL_CONTACTS"),
+                pl.mean("DT").alias("MEAN_CONTACT_TIME"),
+            )
+        )
+
+        by_genotype = ("Cluster",) if "Cluster" in measured.columns else ()
+        distances = [
+            ((pl.col(f"{name}_DISTANCE") * pl.col("DT")).sum() / pl.sum("DT")).alias(
+                f"MEAN_{name}_DISTANCE"
+            )
+            for name in self.field_names
+        ]
+        return (
+            measured.group_by("ARENA", *by_genotype)
+            .agg(
+                *distances,
+                # thigmotaxis: the share of time spent against the wall
+                (
+                    pl.col("DT").filter(pl.col("WALL_CONTACT")).sum() / pl.sum("DT")
+                ).alias("THIGMOTAXIS"),
+            )
+            .join(contacts, on="ARENA", how="left")
+            .with_columns(pl.col("WALL_CONTACTS").fill_null(0))
+            .sort("ARENA")
+        )
+
+
+if __name__ == "__main__":
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=(
+            "mirror_biting",
+            "social_preference",
+            "light_dark_preference_6dpf",
+        ),
+        data_type="position",
+    )
+    for zantiks_data in dataloader.load_all():
+        walls = WallDistances.cached(zantiks_data.info.assay_type, ("left", "right"))
+        print(walls.summarize(zantiks_data.data))
@@ -0,0 +1,239 @@
+#!/usr/bin/env uv run
+
+import argparse
+import json
+import os
+import time
+
+import data_utils
+import qc
+from batch import (
+    JOB_KINDS,
+    BatchRunner,
+    discover_configs,
+    plan,
+    write_config_summaries,
+)
+from cache import _write_atomic
+from occupancy import OccupancyPyramid
+
+
+class DataTree:
+    def __init__(self, root: str = "data"):
+        # directory -> (mtime, subdirectories, data files)
+        self.root = root
+        self.listings: dict[str, tuple[int, list[str], list[str]]] = {}
+
+    def _list(self, directory: str) -> tuple[list[str], list[str]]:
+        # adding or removing a file changes its directory's mtime, so a
+        # directory is only listed again when that changes
+        mtime = os.stat(directory).st_mtime_ns
+        listing = self.listings.get(directory)
+        if listing is not None and listing[0] == mtime:
+            return listing[1], listing[2]
+
+        directories, files = [], []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    directories.append(entry.path)
+                elif data_utils.strip_compression(entry.name).endswith(".csv"):
+                    files.append(entry.path)
+        self.listings[directory] = (mtime, directories, files)
+        return directories, files
+
+    def files(self) -> list[str]:
+        # only the dated folders hold runs, not the caches and outputs next to
+        # them in data/
+        directories, _ = self._list(self.root)
+        stack = [path for path in directories if os.path.basename(path).isdigit()]
+        files = []
+        while stack:
+            try:
+                directories, directory_files = self._list(stack.pop())
+            except FileNotFoundError:
+                continue  # removed since its parent was listed
+            stack += directories
+            files += directory_files
+        return sorted(files)
+
+
+class Watcher:
+    def __init__(
+        self,
+        root: str = "data",
+        configs_directory: str = "configs",
+        *,
+        settle: int = 2,
+        kinds: tuple[str, ...] = JOB_KINDS,
+        max_workers: int | None = None,
+        journal_path: str = "data/batch/journal.jsonl",
+        output: str = "data/batch/summaries",
+        state_directory: str = "data/watch",
+    ):
+        # a file is ready once its size and mtime haven't changed for settle
+        # polls in a row, and binned files also need their footer
+        self.tree = DataTree(root)
+        self.configs_directory = configs_directory
+        self.settle = settle
+        self.kinds = kinds
+        self.max_workers = max_workers
+        self.journal_path = journal_path
+        self.output = output
+        self.state_directory = state_directory
+
+        self.stats: dict[str, tuple[int, int, int]] = {}
+        self.unfinished: dict[str, tuple[int, int]] = {}
+        self.waiting: set[str] = set()
+        self.configs_mtime = self._configs_mtime()
+        self.seen_path = f"{state_directory}/seen.json"
+        self.seen: dict[str, list[int]] = {}
+        if os.path.exists(self.seen_path):
+            with open(self.seen_path, "r") as f:
+                self.seen = json.load(f)
+
+    def _configs_mtime(self) -> float:
+        return max(
+            (
+                os.path.getmtime(path)
+                for path in discover_configs(self.configs_directory)
+            ),
+            default=0.0,
+        )
+
+    def _is_complete(self, path: str) -> bool:
+        filename = os.path.basename(path)
+        if "xy" in filename or "XY" in filename or qc.assay_type_of(path) is None:
+            return True
+        return qc.has_footer(path)
+
+    def ready(self) -> list[str]:
+        ready = []
+        for path in self.tree.files():
+            if path in self.waiting:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            key = (stat.st_size, stat.st_mtime_ns)
+            if (
+                tuple(self.seen.get(path, ())) == key
+                or self.unfinished.get(path) == key
+            ):
+                continue
+
+            previous = self.stats.get(path)
+            polls = previous[2] + 1 if previous and previous[:2] == key else 0
+            self.stats[path] = (*key, polls)
+            if polls < self.settle:
+                continue
+
+            del self.stats[path]
+            if self._is_complete(path):
+                ready.append(path)
+            else:
+                # still checked again if it grows, but not read every poll
+                self.unfinished[path] = key
+                print(f"waiting for the footer of {path}")
+        return ready
+
+    def _mark_seen(self, paths: list[str]) -> None:
+        for path in paths:
+            stat = os.stat(path)
+            self.seen[path] = [stat.st_size, stat.st_mtime_ns]
+            self.unfinished.pop(path, None)
+
+        os.makedirs(self.state_directory, exist_ok=True)
+
+        def write(temp_path: str) -> None:
+            with open(temp_path, "w") as f:
+                json.dump(self.seen, f)
+
+        _write_atomic(self.seen_path, write)
+
+    def _affected_configs(self, config_paths: set[str]) -> list[str]:
+        # configs that pool their wild type fish from a changed config change too
+        affected = set(config_paths)
+        for config_path in discover_configs(self.configs_directory):
+            config = data_utils.ConfigParser().parse(config_path)
+            if config.data.get("wildtype_file", "") in config_paths:
+                affected.add(config_path)
+        return sorted(affected)
+
+    def _accumulate(self, zantiks_file: data_utils.ZantiksFile) -> None:
+        # each assay keeps one running total of every run's occupancy, and the
+        # runs already in it are never added again
+        path = f"{self.state_directory}/occupancy/{zantiks_file.assay_type.name}.npz"
+        pyramid = OccupancyPyramid.cached(zantiks_file)
+        if os.path.exists(path):
+            total = OccupancyPyramid.load(path)
+            if zantiks_file.path in total.runs:
+                return
+            pyramid = OccupancyPyramid.combine((total, pyramid))
+        pyramid.save(path)
+
+    def process(self, paths: list[str]) -> None:
+        # genotypes come from whichever configs list the run
+        jobs, _ = plan(discover_configs(self.configs_directory), self.kinds)
+        wanted = {os.path.realpath(path) for path in paths}
+        jobs = [job for job in jobs if os.path.realpath(job.path) in wanted]
+        found = {os.path.realpath(job.path) for job in jobs}
+        done = [path for path in paths if os.path.realpath(path) in found]
+
+        # everything else waits for a config, including genotype files and
+        # anything else that never will be in one
+        for path in paths:
+            if path in done:
+                continue
+            if path not in self.waiting and qc.assay_type_of(path) is not None:
+                print(f"{path} isn't in a config yet")
+            self.waiting.add(path)
+        if not done:
+            return
+
+        BatchRunner(jobs, self.journal_path, max_workers=self.max_workers).run()
+        if "summarize" in self.kinds:
+            configs = self._affected_configs({job.config_path for job in jobs})
+            write_config_summaries(configs, self.output)
+        if "heatmap" in self.kinds:
+            for job in jobs:
+                if job.kind == "heatmap":
+                    self._accumulate(
+                        data_utils.ZantiksFile(
+                            job.path, job.config_path, job.assay_name
+                        )
+                    )
+
+        self.waiting -= set(done)
+        self._mark_seen(done)
+
+    def poll(self) -> None:
+        paths = self.ready()
+        # runs that weren't in a config are tried again once a config changes
+        configs_mtime = self._configs_mtime()
+        if self.waiting and configs_mtime > self.configs_mtime:
+            paths += sorted(self.waiting - set(paths))
+        self.configs_mtime = configs_mtime
+        if paths:
+            self.process(paths)
+
+    def run(self, interval: float = 30.0) -> None:
+        print(f"watching {self.tree.root} every {interval:g}s")
+        while True:
+            self.poll()
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process new runs as they arrive")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--configs", default="configs")
+    parser.add_argument("--interval", type=float, default=30.0)
+    parser.add_argument("--settle", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    Watcher(args.data, args.configs, settle=args.settle, max_workers=args.workers).run(
+        args.interval
+    )
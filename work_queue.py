@@ -0,0 +1,407 @@
+#!/usr/bin/env uv run
+
+import argparse
+import glob
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from typing import Callable
+
+import polars as pl
+
+import data_utils
+from batch import (
+    JOB_KINDS,
+    Job,
+    discover_configs,
+    plan,
+    run_identity,
+    run_job,
+    write_config_summaries,
+)
+from cache import _write_atomic
+
+# every file for a job sits next to its record in the queue directory:
+#   <job_id>.json            the job
+#   <job_id>.lock            held by the worker running it, touched to renew the lease
+#   <job_id>.done.json       the result
+#   <job_id>.summary.parquet the run's summary, for summarize jobs
+#   <job_id>.failed-<n>.json one per failed attempt
+#   <job_id>.failed-lease-<lock>.json
+#                            one per lease that ran out, e.g. when the job killed
+#                            its worker; these count as attempts too
+
+
+def _write_json(path: str, record: dict) -> None:
+    def write(temp_path: str) -> None:
+        with open(temp_path, "w") as f:
+            json.dump(record, f)
+
+    _write_atomic(path, write)
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    def __init__(self, lock_path: str, seconds: float):
+        # the lock's mtime is the lease, so a worker that dies stops renewing it
+        # and another worker can take the job over once it runs out
+        self.lock_path = lock_path
+        self.seconds = seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._renew, daemon=True)
+
+    def _renew(self) -> None:
+        while not self._stop.wait(self.seconds / 3):
+            try:
+                os.utime(self.lock_path)
+            except FileNotFoundError:
+                return  # taken over after all
+
+    def __enter__(self) -> "Lease":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        directory: str = "data/queue",
+        *,
+        lease: float = 600.0,
+        max_attempts: int = 3,
+    ):
+        # the directory can be on a share that every machine mounts; claims only
+        # rely on O_EXCL creates and renames, which are atomic there too
+        self.directory = directory
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return f"{self.directory}/{job_id}{suffix}"
+
+    def submit(self, jobs: list[Job], config_paths: list[str]) -> int:
+        os.makedirs(self.directory, exist_ok=True)
+        added = 0
+        for job in jobs:
+            path = self._path(job.job_id, ".json")
+            if not os.path.exists(path):
+                _write_json(path, asdict(job))
+                added += 1
+
+        configs_path = f"{self.directory}/configs.json"
+        if os.path.exists(configs_path):
+            with open(configs_path, "r") as f:
+                config_paths = sorted(set(config_paths) | set(json.load(f)))
+        _write_json(configs_path, sorted(config_paths))
+        return added
+
+    def jobs(self) -> list[Job]:
+        jobs = []
+        for path in glob.glob(f"{self.directory}/*.json"):
+            name = os.path.basename(path)
+            if name == "configs.json" or name.count(".") > 1:
+                continue  # results, not jobs
+            with open(path, "r") as f:
+                jobs.append(Job(**json.load(f)))
+        # largest first, like the batch
+        return sorted(jobs, key=lambda job: job.size, reverse=True)
+
+    def attempts(self, job_id: str) -> int:
+        return len(glob.glob(self._path(job_id, ".failed-*.json")))
+
+    def _latest_failure(self, job_id: str) -> str:
+        return max(
+            glob.glob(self._path(job_id, ".failed-*.json")), key=os.path.getmtime
+        )
+
+    def state(self, job_id: str) -> str:
+        if os.path.exists(self._path(job_id, ".done.json")):
+            return "done"
+        if self.attempts(job_id) >= self.max_attempts:
+            return "failed"
+        if os.path.exists(self._path(job_id, ".lock")):
+            return "expired" if self._expired(job_id) else "running"
+        return "pending"
+
+    def _expired(self, job_id: str) -> bool:
+        try:
+            modified = os.path.getmtime(self._path(job_id, ".lock"))
+        except FileNotFoundError:
+            return False
+        return time.time() - modified > self.lease
+
+    def _take_over(self, job_id: str) -> bool:
+        # the stale lock is recorded as a failed attempt in a file named after
+        # that exact lock (inode and mtime), so of all the workers that saw it
+        # expire only the one that creates the record gets to remove it, and a
+        # fresh lock taken since then is never mistaken for it
+        lock_path = self._path(job_id, ".lock")
+        try:
+            seen = os.stat(lock_path)
+            with open(lock_path, "r") as f:
+                stale = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if time.time() - seen.st_mtime <= self.lease:
+            return False  # already taken over and claimed again
+        lock = f"{seen.st_ino}-{seen.st_mtime_ns}"
+        record_path = self._path(job_id, f".failed-lease-{lock}.json")
+        try:
+            fd = os.open(record_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                stale
+                | {
+                    "status": "failed",
+                    "error": f"lease expired, taken over by {worker_id()}",
+                },
+                f,
+            )
+
+        # still the lock that expired, not renewed by a worker that was only slow
+        try:
+            current = os.stat(lock_path)
+        except FileNotFoundError:
+            return True
+        if (current.st_ino, current.st_mtime_ns) != (seen.st_ino, seen.st_mtime_ns):
+            os.remove(record_path)
+            return False
+        os.remove(lock_path)
+        return True
+
+    def claim(self, job_id: str) -> bool:
+        lock_path = self._path(job_id, ".lock")
+        if self.state(job_id) in ("done", "failed"):
+            return False
+        if self._expired(job_id):
+            if not self._take_over(job_id):
+                return False
+            # the attempt that died may have been the last one
+            if self.attempts(job_id) >= self.max_attempts:
+                return False
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump({"worker": worker_id(), "claimed": time.time()}, f)
+
+        # finished by someone else between the check and the claim
+        if os.path.exists(self._path(job_id, ".done.json")):
+            os.remove(lock_path)
+            return False
+        return True
+
+    def _release(self, job_id: str) -> None:
+        # a lock taken over after an expired lease belongs to the new worker
+        lock_path = self._path(job_id, ".lock")
+        try:
+            with open(lock_path, "r") as f:
+                if json.load(f)["worker"] == worker_id():
+                    os.remove(lock_path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def run(self, job: Job) -> dict:
+        start = time.perf_counter()
+        record = {"worker": worker_id(), "attempt": self.attempts(job.job_id) + 1}
+        with Lease(self._path(job.job_id, ".lock"), self.lease):
+            try:
+                result = {"status": "done"} | run_job(
+                    job, self._path(job.job_id, ".summary.parquet")
+                )
+            except data_utils.DATA_ERRORS as e:
+                result = {
+                    "status": "failed",
+                    "error": repr(e),
+                    "traceback": traceback.format_exc(),
+                }
+
+        result = record | result | {"seconds": time.perf_counter() - start}
+        if result["status"] == "done":
+            _write_json(self._path(job.job_id, ".done.json"), result)
+        else:
+            _write_json(
+                self._path(job.job_id, f".failed-{result['attempt']}.json"), result
+            )
+        self._release(job.job_id)
+        return result
+
+    def work(self, *, wait: bool = False, poll: float = 10.0) -> int:
+        # claims jobs until there are none left to claim; with wait it also
+        # waits out jobs running elsewhere, in case their workers die
+        finished = 0
+        while True:
+            claimed = False
+            active = False
+            for job in self.jobs():
+                state = self.state(job.job_id)
+                if state == "running":
+                    active = True
+                if state not in ("pending", "expired") or not self.claim(job.job_id):
+                    continue
+                claimed = True
+                result = self.run(job)
+                finished += 1
+                print(
+                    f"{result['status']:<7} {job.kind:<10} {job.path} "
+                    f"{result['seconds']:.2f}s {result.get('error', '')}"
+                )
+
+            # another pass picks up retries and jobs submitted in the meantime
+            if claimed:
+                continue
+            if not (wait and active):
+                return finished
+            time.sleep(poll)
+
+    def status(self) -> dict[str, int]:
+        counts = dict.fromkeys(("pending", "running", "expired", "done", "failed"), 0)
+        for job in self.jobs():
+            counts[self.state(job.job_id)] += 1
+        return counts
+
+    def failures(self) -> list[dict]:
+        failures = []
+        for job in self.jobs():
+            if self.state(job.job_id) == "failed":
+                with open(self._latest_failure(job.job_id), "r") as f:
+                    failures.append(asdict(job) | json.load(f))
+        return failures
+
+    def config_paths(self) -> list[str]:
+        with open(f"{self.directory}/configs.json", "r") as f:
+            return json.load(f)
+
+
+class QueueSummaries:
+    def __init__(self, queue: WorkQueue):
+        # the summaries the workers left in the queue, found the way
+        # SummaryCache is asked for them, so collecting doesn't depend on
+        # this machine's cache or recompute anything
+        self.paths: dict[tuple, str] = {}
+        for job in queue.jobs():
+            path = queue._path(job.job_id, ".summary.parquet")
+            if job.kind == "summarize" and os.path.exists(path):
+                zantiks_file = data_utils.ZantiksFile(
+                    job.path, job.config_path, job.assay_name
+                )
+                self.paths[run_identity(zantiks_file)] = path
+
+    def get_or_compute(
+        self,
+        zantiks_file: data_utils.ZantiksFile,
+        name: str,
+        params: dict,
+        compute: Callable[[], pl.DataFrame],
+    ) -> pl.DataFrame:
+        path = self.paths.get(run_identity(zantiks_file))
+        if path is None:
+            raise FileNotFoundError(f"no summary of {zantiks_file.path} in the queue")
+        return pl.read_parquet(path)
+
+    def save(self) -> None:
+        pass
+
+
+def _work(directory: str, lease: float, max_attempts: int, wait: bool) -> int:
+    return WorkQueue(directory, lease=lease, max_attempts=max_attempts).work(wait=wait)
+
+
+def work_locally(
+    directory: str,
+    *,
+    workers: int = 1,
+    lease: float = 600.0,
+    max_attempts: int = 3,
+    wait: bool = False,
+) -> int:
+    # separate processes claim jobs exactly as separate machines would
+    if workers == 1:
+        return _work(directory, lease, max_attempts, wait)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_work, directory, lease, max_attempts, wait)
+            for _ in range(workers)
+        ]
+        return sum(future.result() for future in futures)
+
+
+ACTIONS = ("submit", "work", "status", "collect")
+
+
+def run_queue(
+    action: str,
+    directory: str = "data/queue",
+    *,
+    configs_directory: str = "configs",
+    kinds: tuple[str, ...] = JOB_KINDS,
+    workers: int = 1,
+    lease: float = 600.0,
+    max_attempts: int = 3,
+    wait: bool = False,
+    output: str = "data/batch/summaries",
+) -> None:
+    queue = WorkQueue(directory, lease=lease, max_attempts=max_attempts)
+    if action == "submit":
+        config_paths = discover_configs(configs_directory)
+        jobs, problems = plan(config_paths, kinds)
+        for problem in problems:
+            print(f"skipping {problem}")
+        print(f"{queue.submit(jobs, config_paths)} of {len(jobs)} jobs added")
+    elif action == "work":
+        work_locally(
+            directory,
+            workers=workers,
+            lease=lease,
+            max_attempts=max_attempts,
+            wait=wait,
+        )
+    elif action == "status":
+        print(queue.status())
+        for failure in queue.failures():
+            print(f"failed  {failure['kind']:<10} {failure['path']} {failure['error']}")
+    elif action == "collect":
+        write_config_summaries(queue.config_paths(), output, QueueSummaries(queue))
+    else:
+        raise ValueError(f"unknown queue action {action}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Share a batch between machines")
+    parser.add_argument("action", choices=ACTIONS)
+    parser.add_argument("--queue", default="data/queue")
+    parser.add_argument("--configs", default="configs")
+    parser.add_argument("--kind", action="append", choices=JOB_KINDS, default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--lease", type=float, default=600.0)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--wait", action="store_true")
+    parser.add_argument("--output", default="data/batch/summaries")
+    args = parser.parse_args()
+
+    run_queue(
+        args.action,
+        args.queue,
+        configs_directory=args.configs,
+        kinds=tuple(args.kind or JOB_KINDS),
+        workers=args.workers,
+        lease=args.lease,
+        max_attempts=args.max_attempts,
+        wait=args.wait,
+        output=args.output,
+    )
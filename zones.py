@@ -0,0 +1,113 @@
+#!/usr/bin/env uv run
+
+from typing import Sequence
+
+import numpy as np
+import polars as pl
+from numpy.typing import NDArray
+
+import arenas
+import data_utils
+
+
+def load_zone_masks(filepath: str) -> list[NDArray[bool]]:
+    # one mask per distinct non-black color in the image, in color order
+    labels = arenas.color_labels(arenas.load_arena_image(filepath))
+    return [labels == zone for zone in range(1, labels.max() + 1)]
+
+
+class ZoneClassifier:
+    def __init__(
+        self,
+        assay: data_utils.Assay,
+        zone_masks: Sequence[NDArray[bool]] | None = None,
+        *,
+        batch_size: int = 2_000_000,
+    ):
+        self.assay = assay
+        self.batch_size = batch_size
+
+        arena_labels = arenas.arena_labels(
+            arenas.load_arena_image(assay.arena_bmp_path), assay.total_arenas
+        )
+        zone_labels = (arena_labels > 0).astype(np.int32)
+        if zone_masks:
+            zone_labels[:] = 0
+            for zone, mask in enumerate(zone_masks, start=1):
+                zone_labels[mask] = zone
+        self.num_zones = max(len(zone_masks or ()), 1)
+
+        # arena and zone share one raster so each point is a single lookup
+        self.zone_stride = self.num_zones + 1
+        self.labels = arena_labels.astype(np.int32) * self.zone_stride + zone_labels
+        self.camera_params = arenas.load_camera_params(assay.camera_parameters_path)
+
+    def lookup(self, points: NDArray) -> tuple[NDArray, NDArray]:
+        labels = np.empty(points.shape[0], dtype=np.int32)
+        for start in range(0, points.shape[0], self.batch_size):
+            batch = points[start : start + self.batch_size]
+            pixel_points = arenas.project_points(batch, self.camera_params)
+            labels[start : start + self.batch_size] = arenas.gather(
+                self.labels, pixel_points
+            )
+
+        # lost tracking shouldn't be counted as a zone even if (0, 0) projects
+        # somewhere inside the image
+        labels[np.all(points == 0.0, axis=1) | np.any(np.isnan(points), axis=1)] = 0
+        return np.divmod(labels, self.zone_stride)
+
+    def classify(self, xy_data: pl.DataFrame) -> pl.DataFrame:
+        points = xy_data.select("X", "Y").to_numpy().astype(float)
+        arena, zone = self.lookup(points)
+
+        # points outside of their own arena don't belong to any zone
+        return xy_data.with_columns(
+            pl.Series("PIXEL_ARENA", arena, dtype=pl.Int32),
+            pl.Series("ZONE", zone, dtype=pl.Int32),
+        ).with_columns(
+            pl.when((pl.col("PIXEL_ARENA") == pl.col("ARENA")) & (pl.col("ZONE") > 0))
+            .then(pl.col("ZONE"))
+            .alias("ZONE")
+        )
+
+    def summarize(self, xy_data: pl.DataFrame) -> pl.DataFrame:
+        classified = self.classify(xy_data).sort("ARENA", "RUNTIME")
+
+        # each sample counts until the next one, the last gets the usual frame time
+        classified = classified.with_columns(
+            (pl.col("RUNTIME").shift(-1).over("ARENA") - pl.col("RUNTIME")).alias("DT")
+        ).with_columns(pl.col("DT").fill_null(pl.col("DT").median().over("ARENA")))
+
+        by_genotype = ("Cluster",) if "Cluster" in classified.columns else ()
+        time_in_zone = (
+            classified.drop_nulls("ZONE")
+            .group_by("ARENA", "ZONE", *by_genotype)
+            .agg(pl.sum("DT").alias("TIME_IN_ZONE"))
+        )
+
+        # unclassified samples are dropped first so a dropout doesn't count as
+        # leaving and coming back into the same zone
+        entries = (
+            classified.drop_nulls("ZONE")
+            .with_columns(pl.col("ZONE").rle_id().over("ARENA").alias("VISIT"))
+            .group_by("ARENA", "VISIT")
+            .agg(pl.first("ZONE"))
+            .filter(pl.col("VISIT") > 0)  # starting in a zone isn't an entry
+            .group_by("ARENA", "ZONE")
+            .agg(pl.len().cast(pl.Int64).alias("ENTRIES"))
+        )
+
+        return (
+            time_in_zone.join(entries, on=("ARENA", "ZONE"), how="left")
+            .with_columns(pl.col("ENTRIES").fill_null(0))
+            .sort("ARENA", "ZONE")
+        )
+
+
+if __name__ == "__main__":
+    dataloader = data_utils.DataLoader().add_by_filter(
+        assay_types=("light_dark_preference_3wpf",), data_type="position"
+    )
+    for zantiks_data in dataloader.load_all():
+        classifier = ZoneClassifier(zantiks_data.info.assay_type)
+        print(classifier.summarize(zantiks_data.data))